@@ -0,0 +1,82 @@
+import os
+import re
+import threading
+from typing import Iterable, List, Optional
+
+import pandas as pd
+
+from app.core.storage import KEY_COLUMN
+
+# 申请日期为空或无法解析的记录归入这个分区
+UNDATED_PARTITION = "undated"
+PARTITION_SUFFIX = ".csv.gz"
+
+
+def partition_of(dates: pd.Series) -> pd.Series:
+    """按申请日期得到各行所属的冷分区（年份），日期无效的为UNDATED_PARTITION"""
+    years = pd.to_datetime(dates, errors="coerce").dt.year
+    return years.map(lambda year: UNDATED_PARTITION if pd.isna(year) else str(int(year)))
+
+
+class ArchiveStore:
+    """冷数据分区：已归档的记录按申请日期的年份分别保存为gzip压缩的CSV文件
+
+    分区文件只在需要时读取；同一分区的追加写入先写临时文件再原子替换。
+    所有值按文本保存和读取，列类型由apply_schema统一解析。
+    """
+
+    def __init__(self, directory: str, columns: List[str]):
+        self.directory = directory
+        self.columns = list(columns)
+        self._lock = threading.Lock()
+
+    def path(self, partition: str) -> str:
+        return os.path.join(self.directory, partition + PARTITION_SUFFIX)
+
+    def partitions(self) -> List[str]:
+        """已有的分区名（年份升序，未注明日期的在最后）"""
+        if not os.path.isdir(self.directory):
+            return []
+        names = [name[:-len(PARTITION_SUFFIX)] for name in os.listdir(self.directory)
+                 if name.endswith(PARTITION_SUFFIX)]
+        years = sorted(name for name in names if re.fullmatch(r"\d{4}", name))
+        return years + [name for name in names if name == UNDATED_PARTITION]
+
+    def version(self) -> tuple:
+        """各分区文件的修改时间和大小，任何分区变化后都会改变，用作缓存键"""
+        stats = []
+        for partition in self.partitions():
+            stat = os.stat(self.path(partition))
+            stats.append((partition, stat.st_mtime_ns, stat.st_size))
+        return tuple(stats)
+
+    def load(self, partition: str) -> pd.DataFrame:
+        """读取一个分区的全部记录，分区不存在时返回空表"""
+        path = self.path(partition)
+        if not os.path.exists(path):
+            return pd.DataFrame(columns=self.columns)
+        return pd.read_csv(path, dtype=object, keep_default_na=False, na_values=[""], compression="gzip")
+
+    def load_many(self, partitions: Optional[Iterable[str]] = None) -> pd.DataFrame:
+        """读取多个分区并合并，partitions为None时读取全部"""
+        partitions = self.partitions() if partitions is None else list(partitions)
+        frames = [self.load(partition) for partition in partitions]
+        frames = [frame for frame in frames if not frame.empty]
+        if not frames:
+            return pd.DataFrame(columns=self.columns)
+        return pd.concat(frames, ignore_index=True)
+
+    def append(self, records: pd.DataFrame):
+        """把记录追加到各自的分区；同一编号在分区中已存在时以新写入的为准"""
+        os.makedirs(self.directory, exist_ok=True)
+        records = records.reindex(columns=self.columns)
+        with self._lock:
+            for partition, rows in records.groupby(partition_of(records["申请日期"]), sort=False):
+                existing = self.load(partition)
+                merged = pd.concat([existing, rows.astype(object)], ignore_index=True)
+                keyed = merged[KEY_COLUMN].notna()
+                # 归档中途失败后重试时，分区里可能已有同一编号的旧副本
+                merged = merged[~keyed | ~merged[KEY_COLUMN].astype(str).duplicated(keep="last")]
+                tmp_path = self.path(partition) + ".writing"
+                merged.to_csv(tmp_path, index=False, compression="gzip")
+                os.replace(tmp_path, self.path(partition))
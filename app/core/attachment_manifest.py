@@ -0,0 +1,226 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set
+
+from config.constants import ATTACHMENT_CHUNK_SIZE
+
+
+def file_checksum(path: str, chunk_size: int = ATTACHMENT_CHUNK_SIZE) -> str:
+    """分块计算文件的SHA-256"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class AttachmentManifest:
+    """附件清单：记录每个测试申请单的附件文件名、大小、修改时间和校验和，替代逐目录列举
+
+    blob=1 的附件内容保存在按内容寻址的存储中，blobs表记录每份内容被引用的次数；
+    blob=0 的是旧版直接保存在测试申请单目录下的文件。
+    status为 pending（已登记、后台尚未保存完成，mtime为登记时间）、ready 或 failed；preview为预览的类型（image / text），没有预览时为NULL。
+    """
+
+    def __init__(self, path: str, attachments_dir: str, pending_timeout: float):
+        self.path = path
+        self.attachments_dir = attachments_dir
+        self.pending_timeout = pending_timeout
+        self._ready = False
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def connect(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    def ensure_ready(self):
+        """首次使用时建表，清单文件不存在时扫描附件目录生成"""
+        if self._ready:
+            return
+        with self._lock:
+            if self._ready:
+                return
+            is_new = not os.path.exists(self.path)
+            with self.connect() as conn:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS attachments ("
+                    "application TEXT NOT NULL, name TEXT NOT NULL, size INTEGER, mtime REAL, checksum TEXT, "
+                    "blob INTEGER NOT NULL DEFAULT 0, status TEXT NOT NULL DEFAULT 'ready', preview TEXT, "
+                    "error TEXT, PRIMARY KEY (application, name))"
+                )
+                columns = {row[1] for row in conn.execute("PRAGMA table_info(attachments)")}
+                if "blob" not in columns:
+                    conn.execute("ALTER TABLE attachments ADD COLUMN blob INTEGER NOT NULL DEFAULT 0")
+                if "status" not in columns:
+                    conn.execute("ALTER TABLE attachments ADD COLUMN status TEXT NOT NULL DEFAULT 'ready'")
+                    conn.execute("ALTER TABLE attachments ADD COLUMN preview TEXT")
+                    conn.execute("ALTER TABLE attachments ADD COLUMN error TEXT")
+                # 登记已久仍未完成的附件属于已退出的进程，无法再完成；共用数据目录的其他进程正在处理的附件不受影响
+                conn.execute(
+                    "UPDATE attachments SET status = 'failed', error = '处理被中断' "
+                    "WHERE status = 'pending' AND mtime < ?",
+                    (time.time() - self.pending_timeout,)
+                )
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS blobs (checksum TEXT PRIMARY KEY, size INTEGER, refcount INTEGER NOT NULL)"
+                )
+            if is_new:
+                self.rebuild()
+            self._ready = True
+
+    def scan(self) -> List[tuple]:
+        """一次遍历附件目录，返回 (编号, 文件名, 大小, 修改时间, 校验和) 列表"""
+        rows = []
+        if not os.path.isdir(self.attachments_dir):
+            return rows
+        with os.scandir(self.attachments_dir) as folders:
+            for folder in folders:
+                # 以'.'开头的是内部目录（如内容寻址存储）
+                if not folder.is_dir() or folder.name.startswith("."):
+                    continue
+                with os.scandir(folder.path) as entries:
+                    for entry in entries:
+                        if entry.is_file():
+                            stat = entry.stat()
+                            rows.append((folder.name, entry.name, stat.st_size, stat.st_mtime,
+                                         file_checksum(entry.path)))
+        return rows
+
+    def rebuild(self):
+        """按磁盘上的实际文件重建旧版目录中的附件条目，内容寻址存储的引用不受影响"""
+        rows = self.scan()
+        with self.connect() as conn:
+            conn.execute("DELETE FROM attachments WHERE blob = 0")
+            conn.executemany(
+                "INSERT OR REPLACE INTO attachments (application, name, size, mtime, checksum, blob) "
+                "VALUES (?, ?, ?, ?, ?, 0)",
+                rows
+            )
+
+    def reserve(self, application: str, name: str, size: int, mtime: float):
+        """登记一个尚未保存完成的附件（status为pending），内容写入后由complete补全校验和"""
+        self.ensure_ready()
+        with self.connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO attachments (application, name, size, mtime, checksum, blob, status) "
+                "VALUES (?, ?, ?, ?, NULL, 1, 'pending')",
+                (str(application), name, size, mtime)
+            )
+
+    def complete(self, application: str, name: str, size: int, checksum: str) -> bool:
+        """把pending附件标记为ready并增加内容的引用计数；附件在处理期间已被删除时返回False"""
+        self.ensure_ready()
+        with self.connect() as conn:
+            updated = conn.execute(
+                "UPDATE attachments SET size = ?, checksum = ?, status = 'ready', error = NULL "
+                "WHERE application = ? AND name = ? AND status = 'pending'",
+                (size, checksum, str(application), name)
+            ).rowcount
+            if updated:
+                conn.execute(
+                    "INSERT INTO blobs (checksum, size, refcount) VALUES (?, ?, 1) "
+                    "ON CONFLICT(checksum) DO UPDATE SET refcount = refcount + 1",
+                    (checksum, size)
+                )
+        return bool(updated)
+
+    def fail(self, application: str, name: str, error: str):
+        """后台处理失败的附件标记为failed"""
+        self.ensure_ready()
+        with self.connect() as conn:
+            conn.execute(
+                "UPDATE attachments SET status = 'failed', error = ? WHERE application = ? AND name = ?",
+                (error, str(application), name)
+            )
+
+    def set_preview(self, checksum: str, preview: str):
+        """登记某份内容的预览类型，引用同一内容的附件共用一份预览"""
+        self.ensure_ready()
+        with self.connect() as conn:
+            conn.execute("UPDATE attachments SET preview = ? WHERE checksum = ? AND blob = 1", (preview, checksum))
+
+    def get(self, application: str, name: str) -> Optional[Dict[str, Any]]:
+        """查询单个附件的元数据"""
+        self.ensure_ready()
+        with self.connect() as conn:
+            row = conn.execute(
+                "SELECT size, mtime, checksum, blob, status, preview, error FROM attachments "
+                "WHERE application = ? AND name = ?",
+                (str(application), name)
+            ).fetchone()
+        if row is None:
+            return None
+        return {"name": name, "size": row[0], "mtime": row[1], "checksum": row[2], "blob": bool(row[3]),
+                "status": row[4], "preview": row[5], "error": row[6]}
+
+    def remove(self, application: str, name: str) -> Optional[str]:
+        """移除一个附件；若其内容的引用计数降为0，返回该内容的校验和以便删除实际文件"""
+        self.ensure_ready()
+        with self.connect() as conn:
+            row = conn.execute(
+                "SELECT checksum, blob FROM attachments WHERE application = ? AND name = ?",
+                (str(application), name)
+            ).fetchone()
+            conn.execute("DELETE FROM attachments WHERE application = ? AND name = ?", (str(application), name))
+            # 旧版文件和尚未保存完成的附件没有内容引用
+            if row is None or not row[1] or row[0] is None:
+                return None
+            checksum = row[0]
+            conn.execute("UPDATE blobs SET refcount = refcount - 1 WHERE checksum = ?", (checksum,))
+            remaining = conn.execute("SELECT refcount FROM blobs WHERE checksum = ?", (checksum,)).fetchone()
+            if remaining is not None and remaining[0] > 0:
+                return None
+            conn.execute("DELETE FROM blobs WHERE checksum = ?", (checksum,))
+            return checksum
+
+    def has_blob(self, checksum: str) -> bool:
+        """是否仍有附件引用这份内容"""
+        self.ensure_ready()
+        with self.connect() as conn:
+            return conn.execute("SELECT 1 FROM blobs WHERE checksum = ?", (checksum,)).fetchone() is not None
+
+    def names(self, application: str) -> Set[str]:
+        """某个测试申请单已有的附件文件名"""
+        self.ensure_ready()
+        with self.connect() as conn:
+            rows = conn.execute("SELECT name FROM attachments WHERE application = ?", (str(application),))
+            return {row[0] for row in rows}
+
+    def applications(self) -> Set[str]:
+        """所有有附件的测试申请单编号"""
+        self.ensure_ready()
+        with self.connect() as conn:
+            return {row[0] for row in conn.execute("SELECT DISTINCT application FROM attachments")}
+
+    def list_bulk(self, applications: Optional[Iterable[str]] = None) -> Dict[str, List[Dict[str, Any]]]:
+        """批量查询附件元数据，applications为None时返回全部"""
+        self.ensure_ready()
+        query = "SELECT application, name, size, mtime, checksum, status, preview, error FROM attachments"
+        params: List[str] = []
+        if applications is not None:
+            params = [str(application) for application in applications]
+            if not params:
+                return {}
+            query += f" WHERE application IN ({', '.join('?' for _ in params)})"
+        result: Dict[str, List[Dict[str, Any]]] = {}
+        with self.connect() as conn:
+            for application, name, size, mtime, checksum, status, preview, error in conn.execute(
+                    query + " ORDER BY application, name", params):
+                result.setdefault(application, []).append(
+                    {"name": name, "size": size, "mtime": mtime, "checksum": checksum, "status": status,
+                     "preview": preview, "error": error}
+                )
+        return result
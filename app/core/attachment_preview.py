@@ -0,0 +1,113 @@
+import os
+import re
+import zipfile
+from typing import Optional
+from xml.etree import ElementTree
+
+from config.constants import PREVIEW_THUMBNAIL_SIZE, PREVIEW_TEXT_LENGTH
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png"}
+# 预览类型 -> 预览文件的扩展名
+PREVIEW_EXTENSIONS = {"image": ".png", "text": ".txt"}
+
+
+def _image_thumbnail(source: str, target: str) -> bool:
+    try:
+        from PIL import Image
+    except ImportError:
+        return False
+    with Image.open(source) as image:
+        image.thumbnail(PREVIEW_THUMBNAIL_SIZE)
+        if image.mode not in ("RGB", "RGBA", "L"):
+            image = image.convert("RGB")
+        image.save(target, "PNG")
+    return True
+
+
+def _pdf_thumbnail(source: str, target: str) -> bool:
+    # 渲染PDF首页需要PyMuPDF，未安装时退回到提取文字
+    try:
+        import fitz
+    except ImportError:
+        return False
+    with fitz.open(source, filetype="pdf") as document:
+        if document.page_count == 0:
+            return False
+        page = document[0]
+        zoom = min(PREVIEW_THUMBNAIL_SIZE[0] / page.rect.width, PREVIEW_THUMBNAIL_SIZE[1] / page.rect.height)
+        page.get_pixmap(matrix=fitz.Matrix(zoom, zoom)).save(target)
+    return True
+
+
+def _pdf_text(source: str) -> Optional[str]:
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        return None
+    reader = PdfReader(source)
+    return reader.pages[0].extract_text() if reader.pages else None
+
+
+def _docx_text(source: str) -> Optional[str]:
+    # docx是zip包，正文在word/document.xml中，按段落提取文字即可，不需要额外的库
+    namespace = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+    with zipfile.ZipFile(source) as archive:
+        root = ElementTree.fromstring(archive.read("word/document.xml"))
+    paragraphs = []
+    length = 0
+    for paragraph in root.iter(f"{namespace}p"):
+        text = "".join(node.text or "" for node in paragraph.iter(f"{namespace}t"))
+        if text:
+            paragraphs.append(text)
+            length += len(text)
+            if length >= PREVIEW_TEXT_LENGTH:
+                break
+    return "\n".join(paragraphs)
+
+
+def _xlsx_text(source: str) -> Optional[str]:
+    from openpyxl import load_workbook
+
+    # 附件内容文件没有扩展名，openpyxl会拒绝这样的路径，改为传入文件对象
+    with open(source, "rb") as f:
+        return _workbook_text(load_workbook(f, read_only=True, data_only=True))
+
+
+def _workbook_text(workbook) -> str:
+    try:
+        lines = []
+        length = 0
+        for row in workbook.active.iter_rows(values_only=True):
+            line = "\t".join("" if value is None else str(value) for value in row).rstrip()
+            lines.append(line)
+            length += len(line)
+            if length >= PREVIEW_TEXT_LENGTH:
+                break
+        return "\n".join(lines)
+    finally:
+        workbook.close()
+
+
+TEXT_EXTRACTORS = {".pdf": _pdf_text, ".docx": _docx_text, ".xlsx": _xlsx_text}
+
+
+def make_preview(source: str, filename: str, target_base: str) -> Optional[str]:
+    """为附件生成轻量预览：图片和PDF首页生成缩略图，PDF、Word、Excel提取开头的文字
+
+    预览写入 target_base 加对应扩展名的文件，返回预览类型（image / text）；无法生成时返回None。
+    缩略图依赖Pillow（PDF还需要PyMuPDF），PDF文字提取依赖pypdf，未安装时跳过。
+    """
+    extension = os.path.splitext(filename.lower())[1]
+    image_target = target_base + PREVIEW_EXTENSIONS["image"]
+    if extension in IMAGE_EXTENSIONS and _image_thumbnail(source, image_target):
+        return "image"
+    if extension == ".pdf" and _pdf_thumbnail(source, image_target):
+        return "image"
+    extractor = TEXT_EXTRACTORS.get(extension)
+    text = extractor(source) if extractor else None
+    if not text or not text.strip():
+        return None
+    text = re.sub(r"\n{3,}", "\n\n", text.strip())[:PREVIEW_TEXT_LENGTH]
+    with open(target_base + PREVIEW_EXTENSIONS["text"], "w", encoding="utf-8") as f:
+        f.write(text)
+    return "text"
@@ -0,0 +1,141 @@
+from typing import Any, BinaryIO, Callable, Dict, Iterable, Iterator, List, Set, Tuple
+
+import pandas as pd
+
+from config.constants import EXCEL_FORMAT, REQUIRED_FIELDS, ATTACHMENT_COLUMNS, CATEGORY_VALUES, IMPORT_CHUNK_SIZE
+from app.core.schema import column_type
+from app.core.storage import KEY_COLUMN
+
+ERROR_COLUMNS = ["行号", "字段", "错误"]
+# 可导入的列：附件列只能通过上传文件填写
+IMPORT_COLUMNS = [col for col in EXCEL_FORMAT if col not in ATTACHMENT_COLUMNS]
+
+
+def template_csv() -> bytes:
+    """批量导入模板（仅表头），使用带BOM的UTF-8以便Excel正确显示中文"""
+    return pd.DataFrame(columns=IMPORT_COLUMNS).to_csv(index=False).encode("utf-8-sig")
+
+
+def _frame(rows: List[tuple], columns: List[str], first_row: int) -> pd.DataFrame:
+    width = len(columns)
+    rows = [tuple(row[:width]) + (None,) * (width - len(row)) for row in rows]
+    return pd.DataFrame(rows, columns=columns, index=pd.RangeIndex(first_row, first_row + len(rows)), dtype=object)
+
+
+def _read_xlsx(file: BinaryIO, chunk_size: int) -> Iterator[pd.DataFrame]:
+    # 只读模式逐行读取，不把整个工作簿载入内存；openpyxl只在导入xlsx时才导入
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(file, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        columns = ["" if col is None else str(col).strip() for col in header]
+        buffer: List[tuple] = []
+        first_row = 2
+        for row in rows:
+            buffer.append(row)
+            if len(buffer) >= chunk_size:
+                yield _frame(buffer, columns, first_row)
+                first_row += len(buffer)
+                buffer = []
+        if buffer:
+            yield _frame(buffer, columns, first_row)
+    finally:
+        workbook.close()
+
+
+def _read_csv(file: BinaryIO, chunk_size: int) -> Iterator[pd.DataFrame]:
+    first_row = 2
+    for chunk in pd.read_csv(file, dtype=object, chunksize=chunk_size, encoding="utf-8-sig"):
+        chunk.columns = [str(col).strip() for col in chunk.columns]
+        chunk.index = pd.RangeIndex(first_row, first_row + len(chunk))
+        first_row += len(chunk)
+        yield chunk
+
+
+def read_chunks(file: BinaryIO, file_name: str, chunk_size: int = IMPORT_CHUNK_SIZE) -> Iterator[pd.DataFrame]:
+    """按块解析上传的xlsx或csv文件，行索引为该行在文件中的行号（表头为第1行），整行为空的行被跳过"""
+    if file_name.lower().endswith(".csv"):
+        chunks = _read_csv(file, chunk_size)
+    elif file_name.lower().endswith(".xlsx"):
+        chunks = _read_xlsx(file, chunk_size)
+    else:
+        raise ValueError(f"不支持的导入文件格式: {file_name}")
+    for chunk in chunks:
+        chunk = chunk.dropna(how="all")
+        if not chunk.empty:
+            yield chunk
+
+
+def _errors(mask: pd.Series, field: str, message: str) -> pd.DataFrame:
+    # 可空类型的比较结果中缺失值视为不满足
+    rows = mask.index[mask.fillna(False).astype(bool).to_numpy()]
+    return pd.DataFrame({"行号": rows, "字段": field, "错误": message})
+
+
+def validate_chunk(chunk: pd.DataFrame, seen_keys: Set[str],
+                   existing_keys: Callable[[Iterable[Any]], Set[str]]) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """对一块数据按列整体校验必填、类型、枚举取值和编号重复，返回 (规范化后的合格行, 逐行错误)
+
+    seen_keys为之前各块已出现的编号，用于发现文件内跨块的重复，本块的编号会加入其中。
+    """
+    # 缺少的列按空值处理，由必填校验报告
+    data = chunk.reindex(columns=IMPORT_COLUMNS)
+    texts = data.astype("string").apply(lambda series: series.str.strip())
+    texts = texts.mask(texts == "")
+    normalized = {}
+    errors = []
+    for col in IMPORT_COLUMNS:
+        text = texts[col]
+        kind = column_type(col)
+        missing = text.isna()
+        if kind in ("int", "float"):
+            numbers = pd.to_numeric(text, errors="coerce")
+            errors.append(_errors(text.notna() & numbers.isna(), col, "不是有效的数字"))
+            if kind == "int":
+                errors.append(_errors(numbers.notna() & (numbers != numbers.round()), col, "应为整数"))
+            missing = missing | (numbers == 0)
+            normalized[col] = numbers.round().astype("Int64") if kind == "int" else numbers
+        elif kind == "date":
+            dates = pd.to_datetime(text, errors="coerce")
+            errors.append(_errors(text.notna() & dates.isna(), col, "不是有效的日期"))
+            normalized[col] = dates.dt.strftime("%Y-%m-%d")
+        else:
+            if col in CATEGORY_VALUES:
+                allowed = CATEGORY_VALUES[col]
+                errors.append(_errors(text.notna() & ~text.isin(allowed), col, f"取值应为: {'、'.join(allowed)}"))
+            normalized[col] = text
+        if col in REQUIRED_FIELDS:
+            errors.append(_errors(missing, col, "必填字段为空"))
+
+    keys = texts[KEY_COLUMN]
+    present = keys.notna()
+    errors.append(_errors(present & (keys.duplicated(keep="first") | keys.isin(seen_keys)), KEY_COLUMN,
+                          "文件中编号重复"))
+    found = existing_keys(keys[present].unique().tolist())
+    errors.append(_errors(present & keys.isin(found), KEY_COLUMN, "编号已存在"))
+    seen_keys.update(keys[present].tolist())
+
+    errors = pd.concat(errors, ignore_index=True)
+    valid = pd.DataFrame(normalized, index=data.index)[~data.index.isin(errors["行号"])]
+    return valid, errors
+
+
+def parse_import(file: BinaryIO, file_name: str, existing_keys: Callable[[Iterable[Any]], Set[str]],
+                 chunk_size: int = IMPORT_CHUNK_SIZE) -> Tuple[List[Dict[str, Any]], pd.DataFrame, int]:
+    """逐块解析并校验导入文件，返回 (合格的记录, 全部错误, 数据行总数)"""
+    seen_keys: Set[str] = set()
+    records: List[Dict[str, Any]] = []
+    errors = [pd.DataFrame(columns=ERROR_COLUMNS)]
+    total = 0
+    for chunk in read_chunks(file, file_name, chunk_size):
+        total += len(chunk)
+        valid, chunk_errors = validate_chunk(chunk, seen_keys, existing_keys)
+        errors.append(chunk_errors)
+        valid = valid.astype(object).where(valid.notna(), None)
+        records.extend(valid.to_dict("records"))
+    errors = pd.concat(errors, ignore_index=True).sort_values(["行号", "字段"], kind="stable")
+    return records, errors.reset_index(drop=True), total
@@ -1,52 +1,591 @@
-# app/core/data_manager.py
 import pandas as pd
 import os
-from datetime import datetime
-from typing import List, Dict, Any
-from config.settings import DATABASE_FILE
+import logging
+import threading
+from datetime import date, datetime, timedelta
+from typing import List, Dict, Any, Optional, Tuple, Iterator
+from config.settings import (DATABASE_FILE, SQLITE_DATABASE_FILE, STORAGE_BACKEND, RECORD_CACHE_MAX_VERSIONS,
+                             WRITE_BATCH_WINDOW, WRITE_BATCH_MAX, ARCHIVE_DIR, ARCHIVE_AFTER_DAYS,
+                             FILTER_CACHE_SIZE, QUERY_CACHE_SIZE, HISTORY_SNAPSHOT_EVERY)
+from config.constants import (DATE_COLUMNS, SEARCH_FIELDS, EXPORT_CHUNK_SIZE, EXCEL_FORMAT, ARCHIVE_STATUSES,
+                              HISTORY_COLUMNS)
+from app.core.storage import (StorageEngine, ChangeSet, Replacement, Ranges, create_storage, page_frame,
+                              project_frame, KEY_COLUMN)
+from app.core.archive import ArchiveStore, UNDATED_PARTITION
+from app.core.rollups import compute_rollup
+from app.core.query import run_query, keys_for_query
+from app.core.schedule import DUE_COLUMN
+from app.core.history import OP_LABELS
+from app.core.record_cache import RecordCache
+from app.core.search_index import SearchIndex
+from app.core.schema import apply_schema, memory_report, column_type
+from app.core.exporter import export_chunks
+from app.core.write_queue import WriteQueue
+from app.core.bulk_import import parse_import
+from app.core.metrics import timed, stage, increment
+
+logger = logging.getLogger(__name__)
 
 
 class DataManager:
-    """数据管理器，负责处理Excel数据的读写操作"""
+    """数据管理器，负责处理测试数据的读写操作，具体存储由StorageEngine实现"""
+
+    _storage: Optional[StorageEngine] = None
+    _cache = RecordCache(RECORD_CACHE_MAX_VERSIONS)
+    _search_index = SearchIndex(SEARCH_FIELDS)
+    _rollup_cache = RecordCache(RECORD_CACHE_MAX_VERSIONS)
+    _write_queue: Optional[WriteQueue] = None
+    # 冷数据分区及其缓存，只在明确要求包含归档数据时才读取
+    _archive = ArchiveStore(ARCHIVE_DIR, EXCEL_FORMAT)
+    _archive_cache = RecordCache(RECORD_CACHE_MAX_VERSIONS)
+    _archive_search_index = SearchIndex(SEARCH_FIELDS)
+    # 筛选结果缓存：键为 (数据版本, 筛选条件)，只保留最近使用的若干组
+    _filter_cache = RecordCache(FILTER_CACHE_SIZE)
+    # 聚合查询结果缓存：键为 (数据版本, 筛选条件, 查询参数)
+    _query_cache = RecordCache(QUERY_CACHE_SIZE)
+    # 同一时间最多一个后台线程保存修改历史快照
+    _snapshot_lock = threading.Lock()
+
+    @staticmethod
+    def get_storage() -> StorageEngine:
+        """获取当前配置的存储引擎"""
+        if DataManager._storage is None:
+            DataManager._storage = create_storage(STORAGE_BACKEND, SQLITE_DATABASE_FILE, DATABASE_FILE)
+        return DataManager._storage
 
     @staticmethod
+    @timed
     def init_database():
-        """初始化数据库文件"""
-        if not os.path.exists(DATABASE_FILE):
-            df = pd.DataFrame()
-            df.to_excel(DATABASE_FILE, index=False)
+        """初始化数据库，首次使用SQLite时从旧的Excel文件迁移数据"""
+        storage = DataManager.get_storage()
+        if storage.exists():
+            storage.init_storage()
+        elif storage.migrates_from_excel and os.path.exists(DATABASE_FILE):
+            storage.migrate_from_excel(DATABASE_FILE)
+            DataManager._cache.invalidate()
+            DataManager._rollup_cache.invalidate()
+            DataManager._filter_cache.invalidate()
+            DataManager._query_cache.invalidate()
+        else:
+            storage.init_storage()
+
+    @staticmethod
+    @timed
+    def load_frame(archive: Optional[List[str]] = None, columns: Optional[List[str]] = None) -> pd.DataFrame:
+        """加载全部数据为按列类型配置解析好的DataFrame，结果按数据版本在进程内共享
+
+        默认只包含热数据；archive为冷分区名列表时追加这些分区中的已归档记录。
+        columns为需要的列时只读取这些列：完整数据已缓存时从缓存中取，否则只从存储读取这些列，不写入缓存。
+        返回的是缓存的浅拷贝，可以增删列，但不要原地修改单元格。
+        """
+        version = DataManager.get_storage().version()
+        if columns is None:
+            frame = DataManager._frame_for(version).copy(deep=False)
+        else:
+            frame = DataManager._select(version, columns)
+        if archive is None:
+            return frame
+        return DataManager._with_archive(frame, project_frame(DataManager.load_archive(archive), columns))
+
+    @staticmethod
+    def _select(version, columns: List[str], filters: Optional[Dict[str, List[Any]]] = None,
+                ranges: Optional[Ranges] = None) -> pd.DataFrame:
+        # 完整数据已在缓存中时直接投影和筛选，否则把列投影和筛选条件交给存储引擎
+        cached = DataManager._cache.peek(version)
+        if cached is not None:
+            frame, _ = page_frame(cached, 0, None, filters, ranges=ranges)
+            return project_frame(frame, columns)
+        increment("projected_reads")
+        with stage("storage.select_frame"):
+            frame = DataManager.get_storage().select_frame(columns, filters, ranges)
+        return project_frame(apply_schema(frame), columns)
+
+    @staticmethod
+    def header() -> List[str]:
+        """存储中的列名，只读取表头"""
+        return DataManager.get_storage().header()
+
+    @staticmethod
+    def schema() -> Dict[str, str]:
+        """各列的声明类型（text / category / date / int / float），只读取表头"""
+        return {col: column_type(col) for col in DataManager.header()}
+
+    @staticmethod
+    def data_version(archive: Optional[List[str]] = None) -> tuple:
+        """热数据版本，以及archive中各冷分区文件的版本；任何数据变化后都会改变，用作缓存键"""
+        version = DataManager.get_storage().version()
+        if archive is None:
+            return (version,)
+        return (version, tuple(archive), DataManager._archive.version())
+
+    @staticmethod
+    def filter_frame(df: pd.DataFrame, departments: Optional[List[str]], progress: Optional[List[str]],
+                     date_range: Optional[Tuple[date, date]]) -> pd.DataFrame:
+        """按部门、进度和申请日期范围筛选，条件为空时不筛选；明细数据和汇总数据共用"""
+        mask = pd.Series(True, index=df.index)
+        if departments:
+            mask &= df["申请部门"].isin(departments)
+        if progress:
+            mask &= df["测试进度"].isin(progress)
+        if date_range and len(date_range) == 2 and "申请日期" in df.columns:
+            start_date, end_date = date_range
+            mask &= (df["申请日期"] >= pd.Timestamp(start_date)) & (df["申请日期"] <= pd.Timestamp(end_date))
+        return df if mask.all() else df[mask]
+
+    @staticmethod
+    @timed
+    def load_filtered(departments: Optional[List[str]], progress: Optional[List[str]],
+                      date_range: Optional[Tuple[date, date]], archive: Optional[List[str]] = None,
+                      columns: Optional[List[str]] = None) -> pd.DataFrame:
+        """读取并筛选明细记录，结果按 (数据版本, 部门, 进度, 日期范围, 列) 缓存在有界的LRU中
+
+        同一组筛选条件重复读取（如只修改图表选项的重新运行）直接返回缓存的结果，不再复制和筛选全表。
+        columns为需要的列时只返回这些列；只读热数据且完整数据未缓存时，列投影和筛选条件下推到存储引擎。
+        返回的是共享的结果，不要原地修改。
+        """
+        columns = None if columns is None else list(dict.fromkeys(col for col in columns if col))
+        key = (DataManager.data_version(archive), DataManager._filter_key(departments, progress, date_range),
+               None if columns is None else tuple(columns))
+
+        def compute() -> pd.DataFrame:
+            increment("filter_cache_miss")
+            if columns is not None and archive is None:
+                filters = {"申请部门": departments, "测试进度": progress}
+                ranges = {"申请日期": tuple(date_range)} if date_range and len(date_range) == 2 else None
+                return DataManager._select(DataManager.get_storage().version(), columns, filters, ranges)
+            frame = DataManager.filter_frame(DataManager.load_frame(archive), departments, progress, date_range)
+            return project_frame(frame, columns)
+        return DataManager._filter_cache.get(key, compute)
 
     @staticmethod
-    def load_data() -> List[Dict[str, Any]]:
-        """从Excel文件加载数据"""
-        if os.path.exists(DATABASE_FILE):
+    def _filter_key(departments: Optional[List[str]], progress: Optional[List[str]],
+                    date_range: Optional[Tuple[date, date]]) -> tuple:
+        # 选项的先后顺序不影响筛选结果
+        return tuple(sorted(departments or [])), tuple(sorted(progress or [])), tuple(date_range or ())
+
+    @staticmethod
+    @timed
+    def query(dimensions: List[str], measures: List[str], aggregation: str = "sum",
+              filters: Optional[Tuple] = None, time_bucket: Optional[str] = None, top_n: Optional[int] = None,
+              pivot_columns: Optional[List[str]] = None, archive: Optional[List[str]] = None) -> pd.DataFrame:
+        """对筛选后的明细数据做分组聚合（透视、时间分桶、前N项，参数见run_query）
+
+        filters为 (部门, 进度, 日期范围)，为None时不筛选。结果按 (数据版本, 筛选条件, 查询参数) 缓存在有界的LRU中，
+        各会话重复的查询直接返回缓存的结果。返回的是共享的结果，不要原地修改。
+        """
+        departments, progress, date_range = filters or (None, None, None)
+        key = (DataManager.data_version(archive), DataManager._filter_key(departments, progress, date_range),
+               tuple(dimensions), tuple(measures), aggregation, time_bucket, top_n or 0, tuple(pivot_columns or ()))
+
+        def compute() -> pd.DataFrame:
+            increment("query_cache_miss")
+            frame = DataManager.load_filtered(departments, progress, date_range, archive,
+                                              keys_for_query(dimensions, measures, pivot_columns))
+            return run_query(frame, dimensions, measures, aggregation, time_bucket, top_n, pivot_columns)
+        return DataManager._query_cache.get(key, compute)
+
+    @staticmethod
+    def _with_archive(frame: pd.DataFrame, archived: pd.DataFrame) -> pd.DataFrame:
+        if archived.empty:
+            return frame
+        if frame.empty:
+            return archived
+        return pd.concat([frame, archived], ignore_index=True)
+
+    @staticmethod
+    @timed
+    def archive_expired(days: int = ARCHIVE_AFTER_DAYS) -> int:
+        """把已完成或取消、结束超过days天的记录移入按申请年份划分的冷分区，返回移出的行数；days不大于0时不归档"""
+        storage = DataManager.get_storage()
+        # 归档依赖按行删除和已归档编号表，旧的Excel存储不支持
+        if days <= 0 or not storage.supports_archive:
+            return 0
+        cutoff = (datetime.now() - timedelta(days=days)).strftime('%Y-%m-%d')
+        moved = storage.archive_records(cutoff, ARCHIVE_STATUSES, DataManager._archive.append)
+        if moved:
+            DataManager._cache.invalidate()
+            DataManager._rollup_cache.invalidate()
+            DataManager._filter_cache.invalidate()
+            DataManager._query_cache.invalidate()
+            DataManager._search_index.invalidate()
+            DataManager._archive_cache.invalidate()
+        return moved
+
+    @staticmethod
+    def archive_partitions(start: Optional[date] = None, end: Optional[date] = None) -> List[str]:
+        """与申请日期范围 [start, end] 有交集的冷分区；不限范围时返回全部，包括没有申请日期的分区"""
+        partitions = DataManager._archive.partitions()
+        if start is None and end is None:
+            return partitions
+        return [partition for partition in partitions if partition != UNDATED_PARTITION
+                and (start is None or int(partition) >= start.year) and (end is None or int(partition) <= end.year)]
+
+    @staticmethod
+    def archive_date_range() -> Optional[Tuple[date, date]]:
+        """冷分区覆盖的申请日期范围（按整年），没有归档数据时返回None"""
+        years = [int(partition) for partition in DataManager._archive.partitions() if partition != UNDATED_PARTITION]
+        if not years:
+            return None
+        return date(min(years), 1, 1), date(max(years), 12, 31)
+
+    @staticmethod
+    @timed
+    def load_archive(partitions: Optional[List[str]] = None) -> pd.DataFrame:
+        """读取冷分区中的已归档记录并按列类型解析，partitions为None时读取全部；结果按分区文件的版本缓存"""
+        partitions = DataManager.archive_partitions() if partitions is None else list(partitions)
+        if not partitions:
+            return pd.DataFrame()
+        archive = DataManager._archive
+        frame = DataManager._archive_cache.get((tuple(partitions), archive.version()),
+                                               lambda: apply_schema(archive.load_many(partitions)))
+        return frame.copy(deep=False)
+
+    @staticmethod
+    def _frame_for(version) -> pd.DataFrame:
+        try:
+            return DataManager._cache.get(version, DataManager._load_typed_frame)
+        except Exception as e:
+            raise Exception(f"读取数据文件时出错: {str(e)}")
+
+    @staticmethod
+    def _load_typed_frame() -> pd.DataFrame:
+        # 缓存未命中时读取全表并解析列类型，分别计时
+        increment("record_cache_miss")
+        with stage("storage.load_frame"):
+            df = DataManager.get_storage().load_frame()
+        with stage("schema.apply_schema"):
+            return apply_schema(df)
+
+    @staticmethod
+    @timed
+    def load_page(page: int, page_size: int, filters: Optional[Dict[str, List[Any]]] = None,
+                  sort_by: Optional[str] = None, ascending: bool = True,
+                  search: str = "", ranges: Optional[Ranges] = None) -> Tuple[pd.DataFrame, int]:
+        """读取一页数据（page从1开始），返回 (该页数据, 满足条件的总行数)
+
+        没有检索词时筛选、排序和分页由存储引擎完成；有检索词时在检索结果上分页。
+        ranges为日期列的范围条件 {列名: (起始日期, 结束日期)}，两端都包含。
+        """
+        offset = (max(page, 1) - 1) * page_size
+        if search.strip():
+            return page_frame(DataManager.search(search), offset, page_size, filters, sort_by, ascending, ranges)
+        page_df, total = DataManager.get_storage().query_page(offset, page_size, filters, sort_by, ascending, ranges)
+        return apply_schema(page_df), total
+
+    @staticmethod
+    @timed
+    def query_schedule(due_from: Optional[date] = None, due_before: Optional[date] = None,
+                       limit: Optional[int] = None) -> Tuple[pd.DataFrame, int]:
+        """待启动和进行中的申请单中计划结束日期在 [due_from, due_before) 内的记录，返回 (按计划结束日期升序的最多limit行, 总行数)
+
+        计划结束日期优先取预计结束日期，未填写时为测试开始日期加预计时长。
+        SQLite存储的计划结束日期索引随每次写入维护，耗时只与结果行数有关。
+        """
+        rows, total = DataManager.get_storage().query_schedule(
+            None if due_from is None else due_from.strftime('%Y-%m-%d'),
+            None if due_before is None else due_before.strftime('%Y-%m-%d'),
+            limit
+        )
+        rows = apply_schema(rows)
+        rows[DUE_COLUMN] = pd.to_datetime(rows[DUE_COLUMN], errors='coerce')
+        return rows, total
+
+    @staticmethod
+    def overdue(today: Optional[date] = None, limit: Optional[int] = None) -> Tuple[pd.DataFrame, int]:
+        """已逾期：计划结束日期早于今天仍未完成的申请单"""
+        return DataManager.query_schedule(None, today or date.today(), limit)
+
+    @staticmethod
+    def due_within(days: int, today: Optional[date] = None, limit: Optional[int] = None) -> Tuple[pd.DataFrame, int]:
+        """即将到期：计划结束日期在今天到days天后（含）之间的未完成申请单"""
+        today = today or date.today()
+        return DataManager.query_schedule(today, today + timedelta(days=days + 1), limit)
+
+    @staticmethod
+    def history_supported() -> bool:
+        """存储引擎是否记录修改历史（SQLite由触发器记录，旧的Excel存储不支持）"""
+        return DataManager.get_storage().supports_history
+
+    @staticmethod
+    @timed
+    def record_history(test_app_number: str) -> pd.DataFrame:
+        """一条申请单的修改历史，每个变更字段一行：时间、操作（新增/修改/删除/归档）、字段、原值、新值
+
+        原值和新值按存储中的文本显示，空值为空字符串。
+        """
+        if not DataManager.history_supported() or not str(test_app_number).strip():
+            return pd.DataFrame(columns=HISTORY_COLUMNS)
+        history = DataManager.get_storage().record_history(str(test_app_number).strip())
+        return pd.DataFrame({
+            "时间": history["ts"].str.slice(0, 19),
+            "操作": history["op"].map(OP_LABELS),
+            "字段": history["field"].fillna(""),
+            "原值": history["old"].map(DataManager._history_text),
+            "新值": history["value"].map(DataManager._history_text),
+        }, columns=HISTORY_COLUMNS)
+
+    @staticmethod
+    def _history_text(value: Any) -> str:
+        return "" if value is None or pd.isna(value) else str(value)
+
+    @staticmethod
+    @timed
+    def load_as_of(when: datetime) -> pd.DataFrame:
+        """重建某一时刻的全部（未归档）记录并按列类型解析；传入日期时取当天结束时的数据
+
+        从该时刻之前最近的快照开始重放字段增量，耗时与表大小和快照间隔有关，与历史总长度无关。
+        """
+        if not DataManager.history_supported():
+            return pd.DataFrame(columns=EXCEL_FORMAT)
+        if not isinstance(when, datetime):
+            when = datetime.combine(when, datetime.max.time())
+        frame = DataManager.get_storage().frame_as_of(when.strftime('%Y-%m-%d %H:%M:%S.%f')[:23])
+        return apply_schema(frame)
+
+    @staticmethod
+    def snapshot_history(min_changes: int = HISTORY_SNAPSHOT_EVERY) -> Optional[int]:
+        """上次快照后的字段变更达到min_changes条时保存修改历史的快照，返回快照中的记录数，未保存时返回None"""
+        if min_changes <= 0 or not DataManager.history_supported():
+            return None
+        snapshot = DataManager.get_storage().snapshot_history(min_changes)
+        if snapshot is not None:
+            increment("history_snapshots")
+        return snapshot
+
+    @staticmethod
+    def request_snapshot():
+        """在后台线程中按需保存修改历史快照，不占用调用方（如写线程）；已有一次在进行时直接返回
+
+        快照只是加速按时间点重建的辅助数据，保存失败时记录日志，下次再试。
+        """
+        if not DataManager.history_supported() or not DataManager._snapshot_lock.acquire(blocking=False):
+            return
+
+        def run():
             try:
-                df = pd.read_excel(DATABASE_FILE)
-                return df.to_dict('records')
-            except Exception as e:
-                raise Exception(f"读取数据文件时出错: {str(e)}")
-        return []
+                DataManager.snapshot_history()
+            except Exception:
+                increment("history_snapshot_errors")
+                logger.exception("保存修改历史快照失败")
+            finally:
+                DataManager._snapshot_lock.release()
+
+        threading.Thread(target=run, name="history-snapshot", daemon=True).start()
+
+    @staticmethod
+    @timed
+    def memory_report() -> pd.DataFrame:
+        """当前缓存的完整数据各列的类型和内存占用；完整数据尚未缓存时返回空表，不会为此读取全表"""
+        cached = DataManager._cache.peek(DataManager.get_storage().version())
+        return memory_report(cached if cached is not None else pd.DataFrame())
+
+    @staticmethod
+    @timed
+    def load_data(columns: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """加载全部数据，columns为需要的列时只读取这些列"""
+        return DataManager.load_frame(columns=columns).to_dict('records')
+
+    @staticmethod
+    @timed
+    def load_rollup(archive: Optional[List[str]] = None) -> pd.DataFrame:
+        """按 (申请部门, 测试进度, 申请日期) 汇总的项目数和预计费用，随每次写入增量维护
+
+        archive为冷分区名列表时，再加上由这些分区计算的汇总（同一维度可能出现多行，使用时需再求和）。
+        """
+        storage = DataManager.get_storage()
+        rollup = DataManager._rollup_cache.get(
+            storage.version(),
+            lambda: DataManager._prepare_rollup(storage.load_rollup())
+        )
+        if not archive:
+            return rollup.copy(deep=False)
+        archived = DataManager._prepare_rollup(compute_rollup(DataManager.load_archive(archive)))
+        return pd.concat([rollup, archived], ignore_index=True)
+
+    @staticmethod
+    def _prepare_rollup(rollup: pd.DataFrame) -> pd.DataFrame:
+        # 汇总表中用''表示的空维度还原为缺失值
+        for col in ["申请部门", "测试进度"]:
+            rollup[col] = rollup[col].replace("", None)
+        return DataManager._parse_dates(rollup)
+
+    @staticmethod
+    def _parse_dates(df: pd.DataFrame) -> pd.DataFrame:
+        for col in DATE_COLUMNS:
+            if col in df.columns:
+                df[col] = pd.to_datetime(df[col], errors='coerce')
+        return df
+
+    @staticmethod
+    def get_write_queue() -> WriteQueue:
+        """获取进程内唯一的写队列，所有会话的写入都经由它串行提交"""
+        if DataManager._write_queue is None:
+            DataManager._write_queue = WriteQueue(DataManager._commit_batch, WRITE_BATCH_WINDOW, WRITE_BATCH_MAX)
+        return DataManager._write_queue
+
+    @staticmethod
+    @timed
+    def _commit_batch(changesets: List[ChangeSet]) -> List[Any]:
+        """在写线程中执行：一次提交整批变更，然后使缓存失效并增量更新检索索引"""
+        storage = DataManager.get_storage()
+        before = storage.version()
+        try:
+            results = storage.apply_batch(changesets)
+        finally:
+            DataManager._cache.invalidate()
+            DataManager._rollup_cache.invalidate()
+            DataManager._filter_cache.invalidate()
+            DataManager._query_cache.invalidate()
+        # 优先使用写事务内读取的版本：其他进程在读取before之后、本批提交之前的写入会使两者不连续，索引随之重建
+        versions = storage.last_write_versions()
+        if versions is not None:
+            before, after = versions
+        else:
+            after = storage.version()
+        increment("write_batches")
+        increment("write_requests", len(changesets))
+        applied = [changeset for changeset, result in zip(changesets, results) if not isinstance(result, Exception)]
+        if any(isinstance(changeset, Replacement) for changeset in applied):
+            # 整体替换后下次检索时重建索引
+            DataManager._search_index.invalidate()
+        else:
+            # 整批只产生一个新版本，按顺序把各组变更应用到索引上
+            for position, (inserted, updated, deleted) in enumerate(applied or [([], {}, [])]):
+                DataManager._search_index.apply_changes(before if position == 0 else after, after,
+                                                        inserted, updated, deleted)
+        # 变更积累到一定数量后保存快照，使按时间点重建只需重放有限的增量；在后台进行，不阻塞后续写入
+        DataManager.request_snapshot()
+        return results
+
+    @staticmethod
+    @timed
+    def _write(inserted: List[Dict[str, Any]], updated: Dict[str, Dict[str, Any]], deleted: List[str]) -> int:
+        # 提交到写队列并等待数据落盘，返回受影响的行数；该组变更失败时抛出对应异常
+        return DataManager.get_write_queue().submit((inserted, updated, deleted)).result()
 
     @staticmethod
+    @timed
     def save_data(data: List[Dict[str, Any]]):
-        """将数据保存到Excel文件"""
-        df = pd.DataFrame(data)
-        df.to_excel(DATABASE_FILE, index=False)
+        """用给定数据整体替换存储内容；与其他写入一样经写队列提交，缓存和检索索引由写线程更新"""
+        DataManager.get_write_queue().submit(Replacement(list(data))).result()
+
+    @staticmethod
+    def insert_record(record: Dict[str, Any]):
+        """新增一条记录"""
+        DataManager._write([record], {}, [])
+
+    @staticmethod
+    def update_record(test_app_number: str, fields: Dict[str, Any]) -> bool:
+        """按测试申请单编号更新记录的部分字段"""
+        return DataManager._write([], {test_app_number: fields}, []) > 0
+
+    @staticmethod
+    def delete_record(test_app_number: str) -> bool:
+        """按测试申请单编号删除记录"""
+        return DataManager._write([], {}, [test_app_number]) > 0
+
+    @staticmethod
+    def apply_changes(inserted: Optional[List[Dict[str, Any]]] = None,
+                      updated: Optional[Dict[str, Dict[str, Any]]] = None,
+                      deleted: Optional[List[str]] = None) -> int:
+        """应用增量变更集：inserted为新增记录，updated为{测试申请单编号: 变更字段}，deleted为待删除的编号"""
+        return DataManager._write(inserted or [], updated or {}, deleted or [])
+
+    @staticmethod
+    @timed
+    def bulk_import(file, file_name: str, skip_invalid: bool = True) -> Dict[str, Any]:
+        """批量导入xlsx或csv文件：逐块按列校验，合格的记录在一次事务中提交
+
+        skip_invalid为False时只要存在错误就不导入任何记录。
+        返回 {"total": 数据行数, "imported": 导入的行数, "errors": 逐行错误}。
+        """
+        records, errors, total = parse_import(file, file_name, DataManager.get_storage().existing_keys)
+        imported = 0
+        if records and (skip_invalid or errors.empty):
+            DataManager.apply_changes(inserted=records)
+            imported = len(records)
+        return {"total": total, "imported": imported, "errors": errors}
+
+    @staticmethod
+    @timed
+    def search(query: str, archive: Optional[List[str]] = None) -> pd.DataFrame:
+        """全文检索，返回匹配的记录；索引按数据版本构建，本进程的写入会增量更新索引
+
+        archive为冷分区名列表时，结果中追加这些分区里匹配的已归档记录。
+        """
+        version = DataManager.get_storage().version()
+        matched = DataManager._search_frame(DataManager._frame_for(version), version, DataManager._search_index, query)
+        if archive is None:
+            return matched
+        return DataManager._with_archive(matched, DataManager.search_archive(query, archive))
+
+    @staticmethod
+    @timed
+    def search_archive(query: str, partitions: Optional[List[str]] = None) -> pd.DataFrame:
+        """在冷分区的已归档记录中全文检索，partitions为None时检索全部分区"""
+        partitions = DataManager.archive_partitions() if partitions is None else list(partitions)
+        frame = DataManager.load_archive(partitions)
+        version = (tuple(partitions), DataManager._archive.version())
+        return DataManager._search_frame(frame, version, DataManager._archive_search_index, query)
+
+    @staticmethod
+    def _search_frame(frame: pd.DataFrame, version, index: SearchIndex, query: str) -> pd.DataFrame:
+        if not query.strip() or frame.empty:
+            return frame.copy(deep=False)
+        if index.version != version:
+            index.rebuild(frame, version)
+        matched = index.search(query)
+        keys = frame[KEY_COLUMN] if KEY_COLUMN in frame.columns else pd.Series(index=frame.index, dtype=object)
+        if not pd.api.types.is_string_dtype(keys):
+            keys = keys.astype(str)
+        mask = keys.isin({doc_id for doc_id in matched if isinstance(doc_id, str)})
+        positions = [doc_id for doc_id in matched if isinstance(doc_id, int)]
+        if positions:
+            mask.iloc[positions] = True
+        return frame[mask.values]
+
+    @staticmethod
+    def iter_export_chunks(search: str = "", filters: Optional[Dict[str, List[Any]]] = None,
+                           chunk_size: int = EXPORT_CHUNK_SIZE, include_archive: bool = False) -> Iterator[pd.DataFrame]:
+        """按块产生待导出的记录；有检索词时只导出检索结果，include_archive为True时包含全部冷分区"""
+        archive = DataManager.archive_partitions() if include_archive else None
+        if search.strip():
+            matched, total = page_frame(DataManager.search(search, archive), 0, None, filters)
+            for start in range(0, total, chunk_size):
+                yield matched.iloc[start:start + chunk_size].copy()
+            return
+        for chunk in DataManager.get_storage().iter_frames(chunk_size, filters):
+            yield apply_schema(chunk)
+        if archive:
+            # 冷分区整体压缩保存，按分区读入后再分块
+            for partition in archive:
+                archived, total = page_frame(DataManager.load_archive([partition]), 0, None, filters)
+                for start in range(0, total, chunk_size):
+                    yield archived.iloc[start:start + chunk_size].copy()
+
+    @staticmethod
+    @timed
+    def export(target, fmt: str = "xlsx", search: str = "", filters: Optional[Dict[str, List[Any]]] = None,
+               include_archive: bool = False):
+        """流式导出为xlsx、csv或parquet，target可以是文件路径或二进制流"""
+        export_chunks(DataManager.iter_export_chunks(search, filters, include_archive=include_archive), target, fmt)
 
     @staticmethod
     def convert_date_columns(df: pd.DataFrame) -> pd.DataFrame:
         """转换日期列格式"""
-        date_columns = ["申请日期", "送样日期", "测试开始日期", "预计结束日期", "出厂日期"]
-        for col in date_columns:
+        for col in DATE_COLUMNS:
             if col in df.columns:
                 df[col] = pd.to_datetime(df[col], errors='coerce').dt.date
         return df
 
     @staticmethod
+    @timed
+    def get_record(test_app_number: str) -> Optional[Dict[str, Any]]:
+        """按测试申请单编号读取单条记录"""
+        return DataManager.get_storage().get_record(test_app_number)
+
+    @staticmethod
+    @timed
     def check_duplicate_application(test_app_number: str) -> bool:
-        """检查测试申请单编号是否已存在"""
-        data = DataManager.load_data()
-        for record in data:
-            if record.get("测试申请单编号") == test_app_number:
-                return True
-        return False
+        """检查测试申请单编号是否已存在（走编号索引，无需加载全表）"""
+        return DataManager.get_storage().has_key(test_app_number)
@@ -0,0 +1,105 @@
+from typing import List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from config.settings import CHART_POINT_BUDGET
+
+# 每条序列至少保留的点数，LTTB需要首尾两点再加至少一个桶
+MIN_SERIES_POINTS = 3
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """Largest-Triangle-Three-Buckets降采样，x须已升序，返回保留点的下标（含首尾两点）
+
+    每个桶内选出与上一个选中点、下一个桶均值点构成三角形面积最大的点，能保留曲线的形状和峰谷。
+    """
+    n = len(x)
+    if threshold >= n or threshold < MIN_SERIES_POINTS:
+        return np.arange(n)
+    every = (n - 2) / (threshold - 2)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = 0
+    a = 0
+    for i in range(threshold - 2):
+        # 下一个桶的均值点
+        avg_start = int((i + 1) * every) + 1
+        avg_end = min(int((i + 2) * every) + 1, n)
+        avg_x = x[avg_start:avg_end].mean()
+        avg_y = y[avg_start:avg_end].mean()
+        # 当前桶内面积最大的点
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        area = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(np.argmax(area))
+        selected[i + 1] = a
+    selected[-1] = n - 1
+    return selected
+
+
+def minmax_indices(y: np.ndarray, buckets: int) -> np.ndarray:
+    """按位置等分为buckets个桶，每桶保留最小值和最大值两个点，返回升序的下标"""
+    n = len(y)
+    if buckets * 2 >= n or buckets < 1:
+        return np.arange(n)
+    series = pd.Series(y)
+    bucket = np.arange(n) * buckets // n
+    grouped = series.groupby(bucket)
+    return np.unique(np.concatenate([grouped.idxmin().to_numpy(), grouped.idxmax().to_numpy()]))
+
+
+def _as_float(values: pd.Series) -> np.ndarray:
+    # 日期按时间戳参与面积计算
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values.astype("int64").to_numpy(dtype=float)
+    return values.to_numpy(dtype=float, na_value=np.nan)
+
+
+def _is_categorical(values: pd.Series) -> bool:
+    return not (pd.api.types.is_numeric_dtype(values) or pd.api.types.is_datetime64_any_dtype(values))
+
+
+def _series_groups(df: pd.DataFrame, color: Optional[str]) -> List[pd.DataFrame]:
+    if color is None:
+        return [df]
+    return [group for _, group in df.groupby(color, observed=True, dropna=False, sort=False)]
+
+
+def prepare_chart_data(df: pd.DataFrame, kind: str, x: str, y: str, color: Optional[str] = None,
+                       budget: int = CHART_POINT_BUDGET) -> Tuple[pd.DataFrame, Optional[str]]:
+    """把明细数据缩减为适合绘图的点，返回 (绘图数据, 缩减说明)；未缩减时说明为None
+
+    kind为 bar / line / scatter / area。X轴为分类时按 (X, 颜色) 对Y求和；
+    柱状图同一X值的多行本来就会堆叠显示，同样先求和。
+    数值或日期X轴的点数超过budget时，折线图和面积图按序列做LTTB降采样，柱状图和散点图按桶保留最小最大值。
+    """
+    columns = list(dict.fromkeys(col for col in [x, y, color] if col))
+    data = df[columns].dropna(subset=list(dict.fromkeys([x, y])))
+    total = len(data)
+    note = None
+
+    keys = list(dict.fromkeys(col for col in [x, color] if col))
+    if y not in keys and (_is_categorical(data[x]) or kind == "bar"):
+        aggregated = data.groupby(keys, observed=True, dropna=False, sort=True)[y].sum().reset_index()
+        if len(aggregated) < total:
+            note = f"已按 {' / '.join(keys)} 对 {y} 求和：{total:,} 行汇总为 {len(aggregated):,} 个点"
+        data = aggregated
+        if _is_categorical(data[x]):
+            return data, note
+
+    if len(data) <= budget:
+        return data, note
+
+    groups = _series_groups(data.sort_values(x, kind="stable"), color)
+    per_series = max(budget // len(groups), MIN_SERIES_POINTS)
+    parts = []
+    for group in groups:
+        if kind in ("line", "area"):
+            positions = lttb_indices(_as_float(group[x]), _as_float(group[y]), per_series)
+        else:
+            positions = minmax_indices(_as_float(group[y]), per_series // 2)
+        parts.append(group.iloc[positions])
+    reduced = pd.concat(parts) if parts else data.iloc[:0]
+    method = "LTTB" if kind in ("line", "area") else "分桶最小/最大值"
+    note = f"已降采样（{method}）：显示 {len(reduced):,} / {len(data):,} 个点" + (f"；{note}" if note else "")
+    return reduced, note
@@ -0,0 +1,117 @@
+import importlib.util
+import itertools
+from contextlib import contextmanager
+from typing import Any, BinaryIO, Dict, Iterable, Iterator, List, Union
+
+import pandas as pd
+
+from config.constants import DATE_COLUMNS, EXCEL_FORMAT
+from app.core.schema import column_type, decategorize
+
+# 导出格式：格式名 -> (显示名称, 文件扩展名, MIME类型)
+EXPORT_FORMATS = {
+    "xlsx": ("Excel", "xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+    "csv": ("CSV", "csv", "text/csv"),
+    "parquet": ("Parquet", "parquet", "application/octet-stream"),
+}
+
+
+def available_formats() -> List[str]:
+    """当前环境可用的导出格式，Parquet需要安装pyarrow"""
+    return [fmt for fmt in EXPORT_FORMATS if fmt != "parquet" or importlib.util.find_spec("pyarrow") is not None]
+
+
+@contextmanager
+def _open_target(target: Union[str, BinaryIO]) -> Iterator[BinaryIO]:
+    if isinstance(target, str):
+        with open(target, "wb") as f:
+            yield f
+    else:
+        yield target
+
+
+def _peek(chunks: Iterable[pd.DataFrame]):
+    # 取出第一块用于确定表头，返回 (第一块, 包含第一块在内的全部块)
+    chunks = iter(chunks)
+    first = next(chunks, None)
+    if first is None:
+        return None, iter([])
+    return first, itertools.chain([first], chunks)
+
+
+def write_xlsx(chunks: Iterable[pd.DataFrame], target: Union[str, BinaryIO]):
+    """用openpyxl的只写模式逐行写入xlsx，工作表内容不在内存中累积"""
+    # openpyxl导入较慢，只在真正导出xlsx时导入
+    from openpyxl import Workbook
+
+    first, chunks = _peek(chunks)
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append(list(first.columns) if first is not None else EXCEL_FORMAT)
+    for chunk in chunks:
+        _append_rows(sheet, chunk)
+    with _open_target(target) as f:
+        workbook.save(f)
+
+
+def _append_rows(sheet, chunk: pd.DataFrame):
+    chunk = decategorize(chunk)
+    for col in DATE_COLUMNS:
+        if col in chunk.columns and pd.api.types.is_datetime64_any_dtype(chunk[col]):
+            # 转为日期对象，单元格显示为 yyyy-mm-dd
+            chunk[col] = chunk[col].dt.date
+    # openpyxl不认识pandas的缺失值，统一替换为None
+    values = chunk.astype(object).where(chunk.notna(), None)
+    for row in values.itertuples(index=False, name=None):
+        sheet.append(row)
+
+
+def write_csv(chunks: Iterable[pd.DataFrame], target: Union[str, BinaryIO]):
+    """逐块追加写入CSV，使用带BOM的UTF-8以便Excel正确显示中文"""
+    first, chunks = _peek(chunks)
+    with _open_target(target) as f:
+        if first is None:
+            f.write(pd.DataFrame(columns=EXCEL_FORMAT).to_csv(index=False).encode("utf-8-sig"))
+            return
+        for position, chunk in enumerate(chunks):
+            header = position == 0
+            text = chunk.to_csv(index=False, header=header, date_format="%Y-%m-%d")
+            f.write(text.encode("utf-8-sig" if header else "utf-8"))
+
+
+def _arrow_schema(columns: List[str]):
+    import pyarrow as pa
+
+    types: Dict[str, Any] = {"int": pa.int64(), "float": pa.float64(), "date": pa.timestamp("ms")}
+    return pa.schema([(col, types.get(column_type(col), pa.string())) for col in columns])
+
+
+def write_parquet(chunks: Iterable[pd.DataFrame], target: Union[str, BinaryIO]):
+    """逐块写入Parquet的行组，各块按声明的列类型统一为同一结构"""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("导出Parquet需要安装pyarrow")
+    first, chunks = _peek(chunks)
+    columns = list(first.columns) if first is not None else EXCEL_FORMAT
+    schema = _arrow_schema(columns)
+    with _open_target(target) as f:
+        writer = pq.ParquetWriter(f, schema)
+        try:
+            for chunk in chunks:
+                writer.write_table(pa.Table.from_pandas(decategorize(chunk), schema=schema, preserve_index=False,
+                                                        safe=False))
+        finally:
+            writer.close()
+
+
+WRITERS = {"xlsx": write_xlsx, "csv": write_csv, "parquet": write_parquet}
+
+
+def export_chunks(chunks: Iterable[pd.DataFrame], target: Union[str, BinaryIO], fmt: str = "xlsx"):
+    """把按块产生的数据写入指定格式，target可以是文件路径或二进制流"""
+    writer = WRITERS.get(fmt)
+    if writer is None:
+        raise ValueError(f"不支持的导出格式: {fmt}")
+    writer(chunks, target)
@@ -1,61 +1,278 @@
 # app/core/file_manager.py
+import io
 import os
-from typing import Optional, List
-from config.settings import ATTACHMENTS_DIR
-from config.constants import ALLOWED_EXTENSIONS, MAX_FILE_SIZE
+import time
+import hashlib
+import tempfile
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Optional, List, Dict, Any, Set, BinaryIO, Iterable, Tuple, Union
+from config.settings import (ATTACHMENTS_DIR, ATTACHMENT_MANIFEST_FILE, ATTACHMENT_BLOBS_DIR, ATTACHMENT_PREVIEWS_DIR,
+                             ATTACHMENT_WORKERS, ATTACHMENT_QUEUE_MAX, ATTACHMENT_PENDING_TIMEOUT)
+from config.constants import ALLOWED_EXTENSIONS, MAX_FILE_SIZE, ATTACHMENT_CHUNK_SIZE
+from app.core.attachment_manifest import AttachmentManifest
+from app.core.attachment_preview import PREVIEW_EXTENSIONS, make_preview
+from app.core.metrics import timed
 
 
 class FileManager:
     """文件管理器，负责处理附件的上传、下载和删除操作"""
 
+    manifest = AttachmentManifest(ATTACHMENT_MANIFEST_FILE, ATTACHMENTS_DIR, ATTACHMENT_PENDING_TIMEOUT)
+    # 保护"内容是否已存在"与引用计数变化之间的竞争
+    _blob_lock = threading.Lock()
+    # 保护"文件名是否已被占用"与登记附件之间的竞争
+    _name_lock = threading.Lock()
+    # 后台处理附件的线程池，排队的附件数受信号量限制
+    _pool: Optional[ThreadPoolExecutor] = None
+    _pool_lock = threading.Lock()
+    _slots = threading.BoundedSemaphore(ATTACHMENT_QUEUE_MAX)
+
     @staticmethod
-    def save_uploaded_file(uploaded_file, test_application_number: str, filename: str) -> Optional[str]:
-        """保存上传的文件"""
-        if uploaded_file is not None:
-            folder_name = f"{ATTACHMENTS_DIR}/{test_application_number}"
-            if not os.path.exists(folder_name):
-                os.makedirs(folder_name)
+    def blob_path(checksum: str) -> str:
+        """内容寻址存储中某份内容的路径"""
+        return os.path.join(ATTACHMENT_BLOBS_DIR, checksum[:2], checksum)
+
+    @staticmethod
+    def _write_temp(stream: BinaryIO) -> Tuple[str, str, int]:
+        """分块把内容写入临时文件并同时计算SHA-256，返回 (临时文件路径, 校验和, 大小)；不持有锁，多个附件可并行写入"""
+        os.makedirs(ATTACHMENT_BLOBS_DIR, exist_ok=True)
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=ATTACHMENT_BLOBS_DIR, prefix=".upload-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                for chunk in iter(lambda: stream.read(ATTACHMENT_CHUNK_SIZE), b""):
+                    digest.update(chunk)
+                    f.write(chunk)
+                    size += len(chunk)
+            return tmp_path, digest.hexdigest(), size
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    @staticmethod
+    def _store_blob(tmp_path: str, checksum: str):
+        """把临时文件改名为内容寻址存储中的文件，内容已存在时丢弃临时文件；须持有_blob_lock"""
+        target = FileManager.blob_path(checksum)
+        if os.path.exists(target):
+            os.remove(tmp_path)
+        else:
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            os.replace(tmp_path, target)
+
+    @staticmethod
+    def preview_path(checksum: str, preview: str) -> str:
+        """某份内容的预览文件路径，preview为预览类型（image / text）"""
+        return os.path.join(ATTACHMENT_PREVIEWS_DIR, checksum[:2], checksum + PREVIEW_EXTENSIONS[preview])
 
+    @staticmethod
+    def _reserve(test_application_number: str, filename: str, size: int) -> str:
+        """选出该测试申请单下未被占用的文件名并登记为pending，返回实际使用的文件名"""
+        with FileManager._name_lock:
+            # 从清单中查找可用的文件名，不再逐个探测磁盘
+            existing = FileManager.manifest.names(test_application_number)
             base_name, extension = os.path.splitext(filename)
             counter = 1
             unique_filename = filename
-            file_path = os.path.join(folder_name, unique_filename)
-
-            while os.path.exists(file_path):
+            while unique_filename in existing:
                 unique_filename = f"{base_name}_{counter}{extension}"
-                file_path = os.path.join(folder_name, unique_filename)
                 counter += 1
+            FileManager.manifest.reserve(test_application_number, unique_filename, size, time.time())
+        return unique_filename
 
-            with open(file_path, "wb") as f:
-                f.write(uploaded_file.getbuffer())
-            return file_path
+    @staticmethod
+    def _persist(stream: BinaryIO, test_application_number: str, filename: str) -> Optional[str]:
+        """写入已登记附件的内容、补全校验和并生成预览，返回校验和；处理期间附件已被删除时返回None"""
+        try:
+            tmp_path, checksum, size = FileManager._write_temp(stream)
+            try:
+                # 只有检查内容是否存在、改名和增加引用计数需要互斥
+                with FileManager._blob_lock:
+                    FileManager._store_blob(tmp_path, checksum)
+                    if not FileManager.manifest.complete(test_application_number, filename, size, checksum):
+                        # 没有其他附件引用这份内容时删除刚写入的文件
+                        if not FileManager.manifest.has_blob(checksum):
+                            os.remove(FileManager.blob_path(checksum))
+                        return None
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+        except Exception as e:
+            FileManager.manifest.fail(test_application_number, filename, str(e))
+            raise
+        FileManager._make_preview(checksum, filename)
+        return checksum
+
+    @staticmethod
+    def _make_preview(checksum: str, filename: str):
+        """生成预览（同一内容只生成一次）；预览只是辅助信息，生成失败时不影响附件本身"""
+        for preview in PREVIEW_EXTENSIONS:
+            if os.path.exists(FileManager.preview_path(checksum, preview)):
+                FileManager.manifest.set_preview(checksum, preview)
+                return
+        folder = os.path.dirname(FileManager.preview_path(checksum, "text"))
+        os.makedirs(folder, exist_ok=True)
+        # 先写入临时文件再改名，避免读到不完整的预览
+        tmp_base = os.path.join(folder, f".{checksum}.{threading.get_ident()}")
+        try:
+            preview = make_preview(FileManager.blob_path(checksum), filename, tmp_base)
+        except Exception:
+            preview = None
+        if preview is not None:
+            os.replace(tmp_base + PREVIEW_EXTENSIONS[preview], FileManager.preview_path(checksum, preview))
+            FileManager.manifest.set_preview(checksum, preview)
+        for extension in PREVIEW_EXTENSIONS.values():
+            if os.path.exists(tmp_base + extension):
+                os.remove(tmp_base + extension)
+
+    @staticmethod
+    def _remove_previews(checksum: str):
+        for preview in PREVIEW_EXTENSIONS:
+            path = FileManager.preview_path(checksum, preview)
+            if os.path.exists(path):
+                os.remove(path)
+
+    @staticmethod
+    @timed
+    def save_uploaded_file(uploaded_file, test_application_number: str, filename: str) -> Optional[str]:
+        """保存上传的文件：按内容去重存储，测试申请单只保存对内容的引用，返回附件的逻辑路径"""
+        if uploaded_file is not None:
+            if hasattr(uploaded_file, "seek"):
+                uploaded_file.seek(0)
+            unique_filename = FileManager._reserve(test_application_number, filename, getattr(uploaded_file, "size", 0))
+            FileManager._persist(uploaded_file, test_application_number, unique_filename)
+            return f"{ATTACHMENTS_DIR}/{test_application_number}/{unique_filename}"
         return None
 
+    @staticmethod
+    def _get_pool() -> ThreadPoolExecutor:
+        if FileManager._pool is None:
+            with FileManager._pool_lock:
+                if FileManager._pool is None:
+                    FileManager._pool = ThreadPoolExecutor(max_workers=ATTACHMENT_WORKERS,
+                                                           thread_name_prefix="attachment-worker")
+        return FileManager._pool
+
+    @staticmethod
+    @timed
+    def submit_uploaded_file(uploaded_file, test_application_number: str,
+                             filename: str) -> Tuple[Optional[str], Optional[Future]]:
+        """登记上传的文件并交给后台线程保存、计算校验和、生成预览，立即返回 (附件的逻辑路径, Future)
+
+        附件在处理完成前的状态为pending，Future的结果为内容的校验和。
+        排队的附件达到上限时等待空位，避免上传过快时内存中积压过多文件内容。
+        """
+        if uploaded_file is None:
+            return None, None
+        # 复制一份内容，页面重新运行后上传控件释放的文件对象不会影响后台处理
+        if hasattr(uploaded_file, "getvalue"):
+            content: Union[bytes, bytearray] = uploaded_file.getvalue()
+        else:
+            uploaded_file.seek(0)
+            content = uploaded_file.read()
+        unique_filename = FileManager._reserve(test_application_number, filename, len(content))
+        FileManager._slots.acquire()
+        try:
+            future = FileManager._get_pool().submit(FileManager._persist, io.BytesIO(content),
+                                                    test_application_number, unique_filename)
+        except Exception:
+            FileManager._slots.release()
+            raise
+        future.add_done_callback(lambda _: FileManager._slots.release())
+        return f"{ATTACHMENTS_DIR}/{test_application_number}/{unique_filename}", future
+
+    @staticmethod
+    def resolve_attachment_path(test_application_number: str, filename: str) -> Optional[str]:
+        """附件在磁盘上的实际路径：内容寻址存储中的文件，或旧版目录中的文件"""
+        attachment = FileManager.manifest.get(test_application_number, filename)
+        if attachment is not None and attachment["blob"]:
+            # 尚未保存完成或保存失败的附件没有可读的内容
+            return FileManager.blob_path(attachment["checksum"]) if attachment["checksum"] else None
+        file_path = f"{ATTACHMENTS_DIR}/{test_application_number}/{filename}"
+        return file_path if os.path.isfile(file_path) else None
+
     @staticmethod
     def get_attachment_files(test_application_number: str) -> List[str]:
         """获取指定测试申请单的附件文件列表"""
-        record_folder = f"{ATTACHMENTS_DIR}/{test_application_number}"
-        if os.path.exists(record_folder):
-            return os.listdir(record_folder)
-        return []
+        return sorted(FileManager.manifest.names(test_application_number))
+
+    @staticmethod
+    @timed
+    def get_applications_with_attachments() -> Set[str]:
+        """所有有附件的测试申请单编号（查询附件清单）"""
+        return FileManager.manifest.applications()
+
+    @staticmethod
+    @timed
+    def list_attachments(test_application_number: str) -> List[Dict[str, Any]]:
+        """列出附件元数据（文件名、大小、修改时间、校验和），不读取文件内容"""
+        return FileManager.manifest.list_bulk([test_application_number]).get(str(test_application_number), [])
+
+    @staticmethod
+    @timed
+    def list_attachments_bulk(test_application_numbers: Optional[Iterable[str]] = None) -> Dict[str, List[Dict[str, Any]]]:
+        """一次查询多个测试申请单的附件元数据，参数为None时返回全部"""
+        return FileManager.manifest.list_bulk(test_application_numbers)
+
+    @staticmethod
+    @timed
+    def rebuild_manifest():
+        """按磁盘上的实际文件重建附件清单（手工增删附件后使用）"""
+        FileManager.manifest.ensure_ready()
+        FileManager.manifest.rebuild()
+
+    @staticmethod
+    @timed
+    def open_attachment(test_application_number: str, filename: str) -> Optional[BinaryIO]:
+        """以二进制方式打开附件，由调用方负责关闭"""
+        file_path = FileManager.resolve_attachment_path(test_application_number, filename)
+        if file_path and os.path.isfile(file_path):
+            return open(file_path, "rb")
+        return None
 
     @staticmethod
+    def read_preview(test_application_number: str, filename: str) -> Optional[Tuple[str, Union[bytes, str]]]:
+        """读取附件的预览，返回 (预览类型, 缩略图字节或文字)；没有预览时返回None"""
+        attachment = FileManager.manifest.get(test_application_number, filename)
+        if attachment is None or not attachment["preview"] or not attachment["checksum"]:
+            return None
+        path = FileManager.preview_path(attachment["checksum"], attachment["preview"])
+        if not os.path.isfile(path):
+            return None
+        if attachment["preview"] == "text":
+            with open(path, encoding="utf-8") as f:
+                return "text", f.read()
+        with open(path, "rb") as f:
+            return attachment["preview"], f.read()
+
+    @staticmethod
+    @timed
     def download_attachment(test_application_number: str, filename: str) -> Optional[bytes]:
         """下载指定附件文件"""
-        file_path = f"{ATTACHMENTS_DIR}/{test_application_number}/{filename}"
-        if os.path.exists(file_path):
-            with open(file_path, "rb") as f:
-                return f.read()
-        return None
+        f = FileManager.open_attachment(test_application_number, filename)
+        if f is None:
+            return None
+        with f:
+            return f.read()
 
     @staticmethod
+    @timed
     def delete_attachment(test_application_number: str, filename: str) -> bool:
-        """删除指定附件文件"""
+        """删除指定附件；内容寻址存储中的内容在最后一个引用删除后才删除"""
+        attachment = FileManager.manifest.get(test_application_number, filename)
+        with FileManager._blob_lock:
+            orphaned = FileManager.manifest.remove(test_application_number, filename)
+            if orphaned and os.path.exists(FileManager.blob_path(orphaned)):
+                os.remove(FileManager.blob_path(orphaned))
+            if orphaned:
+                FileManager._remove_previews(orphaned)
         file_path = f"{ATTACHMENTS_DIR}/{test_application_number}/{filename}"
         if os.path.exists(file_path):
             os.remove(file_path)
             return True
-        return False
+        return attachment is not None
 
     @staticmethod
     def is_valid_file_type(filename: str) -> bool:
@@ -0,0 +1,235 @@
+import json
+import sqlite3
+import zlib
+from typing import Any, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+HISTORY_TABLE = "record_history"
+FIELDS_TABLE = "history_fields"
+SNAPSHOT_TABLE = "history_snapshots"
+# 操作类型：新增、修改、删除、移入冷分区
+OP_INSERT, OP_UPDATE, OP_DELETE, OP_ARCHIVE = "insert", "update", "delete", "archive"
+OP_LABELS = {OP_INSERT: "新增", OP_UPDATE: "修改", OP_DELETE: "删除", OP_ARCHIVE: "归档"}
+# record_history返回的列
+CHANGE_COLUMNS = ["seq", "ts", "op", "field", "value", "old"]
+# 变更时间精确到毫秒，按本地时间记录
+_NOW = "strftime('%Y-%m-%d %H:%M:%f', 'now', 'localtime')"
+
+# 按记录的rowid保存的全部记录
+State = Dict[int, Dict[str, Any]]
+
+
+def _quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _literal(value: str) -> str:
+    return "'" + value.replace("'", "''") + "'"
+
+
+def _field_ids(conn: sqlite3.Connection, columns: List[str]) -> Dict[str, int]:
+    # 日志中的字段用短编号代替列名，编号一经分配不再改变，列顺序调整或新增列不影响旧日志
+    conn.executemany(f"INSERT OR IGNORE INTO {FIELDS_TABLE} (name) VALUES (?)", ((col,) for col in columns))
+    return {name: field_id for field_id, name in conn.execute(f"SELECT id, name FROM {FIELDS_TABLE}")}
+
+
+def _field_names(conn: sqlite3.Connection) -> Dict[str, str]:
+    return {str(field_id): name for field_id, name in conn.execute(f"SELECT id, name FROM {FIELDS_TABLE}")}
+
+
+def _record_json(columns: List[str], ids: Dict[str, int]) -> str:
+    # 删除前的整条记录：{字段编号: 值}
+    return "json_object(" + ", ".join(f"'{ids[col]}', OLD.{_quote(col)}" for col in columns) + ")"
+
+
+def _changed_json(columns: List[str], ids: Dict[str, int]) -> str:
+    # 修改前的值，只包含发生变化的字段
+    selects = " UNION ALL ".join(
+        f"SELECT '{ids[col]}' AS f, OLD.{_quote(col)} AS v WHERE OLD.{_quote(col)} IS NOT NEW.{_quote(col)}"
+        for col in columns
+    )
+    return f"(SELECT json_group_object(f, v) FROM ({selects}))"
+
+
+def _log_sql(row: str, key: str, op: str, data: str) -> str:
+    # row为NEW或OLD，key、op、data均为SQL表达式
+    return (f"INSERT INTO {HISTORY_TABLE} (ts, rid, key, op, data) "
+            f"VALUES ({_NOW}, {row}.rowid, {key}, {op}, {data});")
+
+
+def create_history(conn: sqlite3.Connection, records_table: str, columns: List[str], key_column: str,
+                   archived_keys_table: str):
+    """创建记录变更日志，用触发器把每次写入记录为一行增量
+
+    日志保存变更前的值：新增只记录编号（新值就在数据表中），修改只记录变化字段的原值（JSON，键为字段编号），
+    删除和归档记录删除前的整条记录。从当前数据或之后的快照倒序撤销变更即可得到之前任一时刻的数据，
+    日志大小只与变更有关，与表的大小无关。
+    每行日志按记录的rowid对应到记录，编号为空或重复的记录同样可以重建；与计划表不同，rowid变化后无法重建，
+    因此不能对数据库执行VACUUM。
+    """
+    conn.execute(
+        f"CREATE TABLE IF NOT EXISTS {HISTORY_TABLE} (seq INTEGER PRIMARY KEY AUTOINCREMENT, ts TEXT NOT NULL, "
+        f"rid INTEGER NOT NULL, key TEXT, op TEXT NOT NULL, data TEXT)"
+    )
+    conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{HISTORY_TABLE}_key ON {HISTORY_TABLE} (key, seq)")
+    conn.execute(f"CREATE TABLE IF NOT EXISTS {FIELDS_TABLE} (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE)")
+    # 快照：截至seq的全部记录（按rowid），压缩后整体保存为一行；ts为seq那次变更的时间
+    conn.execute(
+        f"CREATE TABLE IF NOT EXISTS {SNAPSHOT_TABLE} (seq INTEGER PRIMARY KEY, ts TEXT NOT NULL, "
+        f"rows INTEGER NOT NULL, data BLOB NOT NULL)"
+    )
+    ids = _field_ids(conn, columns)
+    key = _quote(key_column)
+    # 触发器中列出了全部字段，每次初始化时重建，使新增的列也能记录
+    for event in ("insert", "delete", "update", "rekey"):
+        conn.execute(f"DROP TRIGGER IF EXISTS {HISTORY_TABLE}_{event}")
+    conn.execute(
+        f"CREATE TRIGGER {HISTORY_TABLE}_insert AFTER INSERT ON {records_table} "
+        f"BEGIN {_log_sql('NEW', f'NEW.{key}', _literal(OP_INSERT), 'NULL')} END"
+    )
+    # 删除前已登记为归档的编号记为移入冷分区
+    removal = (f"CASE WHEN OLD.{key} IN (SELECT key FROM {archived_keys_table}) "
+               f"THEN '{OP_ARCHIVE}' ELSE '{OP_DELETE}' END")
+    conn.execute(
+        f"CREATE TRIGGER {HISTORY_TABLE}_delete AFTER DELETE ON {records_table} "
+        f"BEGIN {_log_sql('OLD', f'OLD.{key}', removal, _record_json(columns, ids))} END"
+    )
+    changed = " OR ".join(f"OLD.{_quote(col)} IS NOT NEW.{_quote(col)}" for col in columns)
+    conn.execute(
+        f"CREATE TRIGGER {HISTORY_TABLE}_update AFTER UPDATE ON {records_table} "
+        f"WHEN OLD.{key} IS NEW.{key} AND ({changed}) "
+        f"BEGIN {_log_sql('NEW', f'NEW.{key}', _literal(OP_UPDATE), _changed_json(columns, ids))} END"
+    )
+    # 编号被修改时视为删除原编号、新增新编号
+    conn.execute(
+        f"CREATE TRIGGER {HISTORY_TABLE}_rekey AFTER UPDATE OF {key} ON {records_table} "
+        f"WHEN OLD.{key} IS NOT NEW.{key} BEGIN "
+        f"{_log_sql('OLD', f'OLD.{key}', _literal(OP_DELETE), _record_json(columns, ids))} "
+        f"{_log_sql('NEW', f'NEW.{key}', _literal(OP_INSERT), 'NULL')} END"
+    )
+
+
+def _current_state(conn: sqlite3.Connection, records_table: str, columns: List[str], key_column: str,
+                   key: Optional[str] = None) -> State:
+    # 数据表中的当前记录（key不为None时只读取该编号的记录）
+    column_list = ", ".join(_quote(col) for col in columns)
+    where, params = (f" WHERE {_quote(key_column)} = ?", (key,)) if key is not None else ("", ())
+    return {values[0]: dict(zip(columns, values[1:]))
+            for values in conn.execute(f"SELECT rowid, {column_list} FROM {records_table}{where}", params)}
+
+
+def read_snapshot(conn: sqlite3.Connection, records_table: str, columns: List[str],
+                  key_column: str) -> Tuple[int, str, bytes, int]:
+    """读取当前全部记录及对应的最新日志序号，返回 (序号, 时间, 压缩后的数据, 记录数)
+
+    须在同一个读事务中调用，使记录与序号对应同一时刻；WAL模式下读事务不阻塞写入。
+    """
+    row = conn.execute(f"SELECT seq, ts FROM {HISTORY_TABLE} ORDER BY seq DESC LIMIT 1").fetchone()
+    seq, ts = row if row is not None else (0, conn.execute(f"SELECT {_NOW}").fetchone()[0])
+    state = _current_state(conn, records_table, columns, key_column)
+    rows = {rid: [record[col] for col in columns] for rid, record in state.items()}
+    data = zlib.compress(json.dumps({"columns": columns, "rows": rows}, ensure_ascii=False).encode("utf-8"))
+    return seq, ts, data, len(rows)
+
+
+def save_snapshot(conn: sqlite3.Connection, seq: int, ts: str, data: bytes, rows: int) -> int:
+    """保存read_snapshot读出的快照，同一序号已有快照时保留原来的，返回快照中的记录数"""
+    conn.execute(
+        f"INSERT OR IGNORE INTO {SNAPSHOT_TABLE} (seq, ts, rows, data) VALUES (?, ?, ?, ?)", (seq, ts, rows, data)
+    )
+    return rows
+
+
+def changes_since_snapshot(conn: sqlite3.Connection) -> int:
+    """最近一次快照之后变更的记录条数"""
+    last = conn.execute(f"SELECT COALESCE(MAX(seq), 0) FROM {SNAPSHOT_TABLE}").fetchone()[0]
+    latest = conn.execute(f"SELECT COALESCE(MAX(seq), 0) FROM {HISTORY_TABLE}").fetchone()[0]
+    return latest - last
+
+
+def _load_snapshot(data: bytes) -> State:
+    snapshot = json.loads(zlib.decompress(data).decode("utf-8"))
+    columns = snapshot["columns"]
+    return {int(rid): dict(zip(columns, values)) for rid, values in snapshot["rows"].items()}
+
+
+def _decode(data: Optional[str], names: Dict[str, str]) -> Dict[str, Any]:
+    return {names[field_id]: value for field_id, value in json.loads(data).items()} if data else {}
+
+
+def _undo(state: State, changes, names: Dict[str, str]) -> State:
+    # changes须按序号倒序
+    for rid, op, data in changes:
+        if op == OP_INSERT:
+            state.pop(rid, None)
+        elif op == OP_UPDATE:
+            state.setdefault(rid, {}).update(_decode(data, names))
+        else:
+            state[rid] = _decode(data, names)
+    return state
+
+
+def state_as_of(conn: sqlite3.Connection, ts: str, records_table: str, columns: List[str],
+                key_column: str) -> pd.DataFrame:
+    """重建截至时间ts（含）的全部记录：从ts之后最早的快照（没有时为当前数据）倒序撤销ts之后的变更
+
+    只扫描该快照与前一份快照之间的日志。早于历史记录开始的时间返回开始记录时的数据。
+    """
+    # 在同一个读事务中读取起点数据和日志
+    conn.execute("BEGIN")
+    try:
+        snapshot = conn.execute(
+            f"SELECT seq, data FROM {SNAPSHOT_TABLE} WHERE ts > ? ORDER BY seq LIMIT 1", (ts,)
+        ).fetchone()
+        if snapshot is not None:
+            upper, state = snapshot[0], _load_snapshot(snapshot[1])
+        else:
+            upper = conn.execute(f"SELECT COALESCE(MAX(seq), 0) FROM {HISTORY_TABLE}").fetchone()[0]
+            state = _current_state(conn, records_table, columns, key_column)
+        # 前一份快照的时间不晚于ts，它之前的变更都不需要撤销
+        lower = conn.execute(
+            f"SELECT COALESCE(MAX(seq), 0) FROM {SNAPSHOT_TABLE} WHERE seq < ? AND ts <= ?", (upper, ts)
+        ).fetchone()[0]
+        changes = conn.execute(
+            f"SELECT rid, op, data FROM {HISTORY_TABLE} WHERE seq > ? AND seq <= ? AND ts > ? ORDER BY seq DESC",
+            (lower, upper, ts)
+        )
+        state = _undo(state, changes, _field_names(conn))
+    finally:
+        conn.commit()
+    # 与数据表一样按rowid排序
+    return pd.DataFrame([state[rid] for rid in sorted(state)], columns=columns)
+
+
+def record_history(conn: sqlite3.Connection, key: str, records_table: str, columns: List[str],
+                   key_column: str) -> pd.DataFrame:
+    """单条记录的全部变更（按时间顺序），每个变化的字段一行：序号、时间、操作、字段、原值、新值
+
+    从当前记录倒序撤销该编号的变更得到每次变更前后的值。新增只列出非空字段，删除和归档只有一行（字段为空）。
+    编号重复时各条记录按rowid分别撤销，变更合并按时间列出。
+    """
+    conn.execute("BEGIN")
+    try:
+        changes = conn.execute(
+            f"SELECT seq, ts, rid, op, data FROM {HISTORY_TABLE} WHERE key = ? ORDER BY seq DESC", (key,)
+        ).fetchall()
+        state = _current_state(conn, records_table, columns, key_column, key)
+        names = _field_names(conn)
+    finally:
+        conn.commit()
+    rows = []
+    for seq, ts, rid, op, data in changes:
+        current, before = state.get(rid, {}), _decode(data, names)
+        if op == OP_INSERT:
+            rows.extend((seq, ts, op, field, value, None)
+                        for field, value in reversed(list(current.items())) if value is not None)
+            state[rid] = {}
+        elif op == OP_UPDATE:
+            rows.extend((seq, ts, op, field, current.get(field), value)
+                        for field, value in reversed(list(before.items())))
+            state[rid] = dict(current, **before)
+        else:
+            rows.append((seq, ts, op, None, None, None))
+            state[rid] = before
+    return pd.DataFrame(rows[::-1], columns=CHANGE_COLUMNS)
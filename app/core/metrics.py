@@ -0,0 +1,193 @@
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from config.settings import METRICS_ENABLED, METRICS_EXPORT, METRICS_PROMETHEUS_FILE, METRICS_JSONL_FILE
+
+# 未启用时所有计时都使用这个空上下文，开销只有一次函数调用
+_NULL_STAGE = nullcontext()
+
+_lock = threading.Lock()
+# 进程内累计值：阶段名 -> [调用次数, 总耗时秒, 最大耗时秒]；计数器名 -> 累计值
+_totals: Dict[str, List[float]] = defaultdict(lambda: [0, 0.0, 0.0])
+_counters: Dict[str, float] = defaultdict(float)
+# 当前线程（即当前会话的脚本运行）的阶段记录
+_local = threading.local()
+
+
+def enabled() -> bool:
+    """是否启用性能指标（环境变量 TESTSYSTEM_METRICS=1）"""
+    return METRICS_ENABLED
+
+
+def memory_usage_mb() -> Optional[float]:
+    """当前进程的常驻内存（MB）；无法读取当前值时返回峰值，都无法获取时返回None"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024 ** 2
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS上ru_maxrss的单位是字节，Linux上是KB
+    return peak / 1024 ** 2 if sys.platform == "darwin" else peak / 1024
+
+
+def _record(name: str, start: float, seconds: float):
+    with _lock:
+        total = _totals[name]
+        total[0] += 1
+        total[1] += seconds
+        total[2] = max(total[2], seconds)
+    stages = getattr(_local, "stages", None)
+    if stages is not None:
+        # offset_ms为相对本次运行开始的时间，用于按开始顺序展示嵌套的阶段
+        stages.append({"stage": name, "offset_ms": (start - _local.started) * 1000, "ms": seconds * 1000,
+                       "depth": getattr(_local, "depth", 0)})
+
+
+@contextmanager
+def _timer(name: str) -> Iterator[None]:
+    _local.depth = getattr(_local, "depth", 0) + 1
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _local.depth -= 1
+        _record(name, start, time.perf_counter() - start)
+
+
+def stage(name: str):
+    """计时上下文：with stage("dashboard.charts"): ..."""
+    if not METRICS_ENABLED:
+        return _NULL_STAGE
+    return _timer(name)
+
+
+def timed(fn: Callable) -> Callable:
+    """计时装饰器，阶段名为函数的限定名（如 DataManager.load_frame）；未启用时直接返回原函数"""
+    if not METRICS_ENABLED:
+        return fn
+    name = fn.__qualname__
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        with _timer(name):
+            return fn(*args, **kwargs)
+    return wrapper
+
+
+def increment(name: str, value: float = 1):
+    """累加计数器，如缓存未命中次数、读取的附件字节数"""
+    if not METRICS_ENABLED:
+        return
+    with _lock:
+        _counters[name] += value
+
+
+def checkpoint(name: str):
+    """页面脚本中的分段计时：记录从上一个分段点（或本次运行开始）到现在的耗时，不需要改变代码缩进"""
+    if not METRICS_ENABLED:
+        return
+    now = time.perf_counter()
+    last = getattr(_local, "last_checkpoint", None)
+    if last is not None:
+        _record(name, last, now - last)
+    _local.last_checkpoint = now
+
+
+def begin_run(page: str):
+    """一次页面运行开始时调用，清空当前线程的阶段记录"""
+    if not METRICS_ENABLED:
+        return
+    _local.page = page
+    _local.stages = []
+    _local.depth = 0
+    _local.started = time.perf_counter()
+    _local.last_checkpoint = _local.started
+
+
+def end_run() -> Optional[Dict[str, Any]]:
+    """一次页面运行结束时调用，返回本次运行的各阶段耗时和内存，并按配置导出"""
+    if not METRICS_ENABLED or getattr(_local, "stages", None) is None:
+        return None
+    run = {
+        "timestamp": time.time(),
+        "page": _local.page,
+        "total_ms": (time.perf_counter() - _local.started) * 1000,
+        "memory_mb": memory_usage_mb(),
+        "stages": _local.stages,
+    }
+    _local.stages = None
+    _local.last_run = run
+    if "jsonl" in METRICS_EXPORT:
+        export_jsonl(run)
+    if "prometheus" in METRICS_EXPORT:
+        export_prometheus()
+    return run
+
+
+def last_run() -> Optional[Dict[str, Any]]:
+    """当前线程最近一次完成的页面运行"""
+    return getattr(_local, "last_run", None)
+
+
+def snapshot() -> Dict[str, Any]:
+    """进程内累计的各阶段耗时和计数器"""
+    with _lock:
+        return {
+            "stages": {name: {"count": int(count), "seconds": seconds, "max_seconds": longest}
+                       for name, (count, seconds, longest) in _totals.items()},
+            "counters": dict(_counters),
+        }
+
+
+def _label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def export_prometheus(path: str = METRICS_PROMETHEUS_FILE):
+    """按Prometheus文本格式写出累计指标，先写临时文件再替换，供node_exporter的textfile采集"""
+    data = snapshot()
+    lines = [
+        "# HELP testsystem_stage_seconds Time spent in instrumented stages.",
+        "# TYPE testsystem_stage_seconds summary",
+    ]
+    for name, stats in sorted(data["stages"].items()):
+        lines.append(f'testsystem_stage_seconds_sum{{stage="{_label(name)}"}} {stats["seconds"]:.6f}')
+        lines.append(f'testsystem_stage_seconds_count{{stage="{_label(name)}"}} {stats["count"]}')
+    lines += [
+        "# HELP testsystem_stage_max_seconds Longest single call of each stage.",
+        "# TYPE testsystem_stage_max_seconds gauge",
+    ]
+    for name, stats in sorted(data["stages"].items()):
+        lines.append(f'testsystem_stage_max_seconds{{stage="{_label(name)}"}} {stats["max_seconds"]:.6f}')
+    lines += ["# HELP testsystem_events_total Instrumented counters.", "# TYPE testsystem_events_total counter"]
+    for name, value in sorted(data["counters"].items()):
+        lines.append(f'testsystem_events_total{{name="{_label(name)}"}} {value:g}')
+    memory = memory_usage_mb()
+    if memory is not None:
+        lines += ["# HELP testsystem_memory_megabytes Resident memory of the app process.",
+                  "# TYPE testsystem_memory_megabytes gauge", f"testsystem_memory_megabytes {memory:.1f}"]
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+    os.replace(tmp_path, path)
+
+
+def export_jsonl(run: Dict[str, Any], path: str = METRICS_JSONL_FILE):
+    """把一次页面运行追加写入JSONL日志，便于做趋势分析"""
+    line = json.dumps(run, ensure_ascii=False)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with _lock, open(path, "a", encoding="utf-8") as f:
+        f.write(line + "\n")
@@ -0,0 +1,86 @@
+from typing import List, Optional
+
+import pandas as pd
+
+# 支持的聚合方式，与pandas的聚合函数同名
+AGGREGATIONS = ("sum", "mean", "count", "min", "max")
+# 日期维度的时间分桶 -> pandas的周期频率，分桶后取每个周期的起始日期
+TIME_BUCKETS = {"day": "D", "week": "W", "month": "M"}
+# 没有选择度量时按行计数，结果列名
+COUNT_COLUMN = "记录数"
+
+
+def _bucket(values: pd.Series, time_bucket: str) -> pd.Series:
+    return values.dt.to_period(TIME_BUCKETS[time_bucket]).dt.start_time
+
+
+def _flatten(columns: pd.Index, drop_measure: bool) -> List[str]:
+    # 透视后的多级列名 (度量, 列维度值...) 拼接为单层，只有一个度量时省略度量名
+    names = []
+    for column in columns:
+        parts = list(column) if isinstance(column, tuple) else [column]
+        if drop_measure:
+            parts = parts[1:]
+        names.append(" / ".join(_label(part) for part in parts))
+    return names
+
+
+def _label(value) -> str:
+    if isinstance(value, pd.Timestamp):
+        return value.strftime('%Y-%m-%d')
+    return "" if pd.isna(value) else str(value)
+
+
+def keys_for_query(dimensions: List[str], measures: List[str], pivot_columns: Optional[List[str]] = None) -> List[str]:
+    """查询需要读取的列：行维度、列维度和度量"""
+    return list(dict.fromkeys(list(dimensions) + list(pivot_columns or []) + list(measures)))
+
+
+def run_query(df: pd.DataFrame, dimensions: List[str], measures: List[str], aggregation: str = "sum",
+              time_bucket: Optional[str] = None, top_n: Optional[int] = None,
+              pivot_columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """按维度分组聚合明细数据，返回汇总结果
+
+    dimensions为行维度，pivot_columns为展开成列的维度（多级透视），measures为参与聚合的数值列，
+    未选择度量时按行计数。time_bucket为 day / week / month 时日期维度按日、周、月分桶。
+    top_n大于0时只保留第一个维度上按第一个度量合计最大的前N项。
+    """
+    if aggregation not in AGGREGATIONS:
+        raise ValueError(f"不支持的聚合方式: {aggregation}")
+    if time_bucket is not None and time_bucket not in TIME_BUCKETS:
+        raise ValueError(f"不支持的时间分桶: {time_bucket}")
+    pivot_columns = [col for col in pivot_columns or [] if col not in dimensions]
+    keys = list(dict.fromkeys(list(dimensions) + pivot_columns))
+    measures = [col for col in dict.fromkeys(measures) if col not in keys]
+    if not keys:
+        raise ValueError("至少需要一个维度")
+
+    data = df[keys + measures].copy()
+    if time_bucket is not None:
+        for col in keys:
+            if pd.api.types.is_datetime64_any_dtype(data[col]):
+                data[col] = _bucket(data[col], time_bucket)
+
+    grouped = data.groupby(keys, observed=True, dropna=False, sort=True)
+    if measures:
+        result = grouped[measures].agg(aggregation).reset_index()
+    else:
+        measures = [COUNT_COLUMN]
+        result = grouped.size().rename(COUNT_COLUMN).reset_index()
+
+    if top_n and top_n > 0:
+        totals = result.groupby(keys[0], observed=True, dropna=False)[measures[0]].sum()
+        top = totals.sort_values(ascending=False, kind="stable").index[:top_n]
+        result = result[result[keys[0]].isin(top)]
+        result = result.sort_values(measures[0], ascending=False, kind="stable").reset_index(drop=True)
+
+    if not pivot_columns or result.empty:
+        return result
+    if dimensions:
+        pivoted = result.set_index(keys)[measures].unstack(pivot_columns)
+        pivoted.columns = _flatten(pivoted.columns, drop_measure=len(measures) == 1)
+        return pivoted.reset_index()
+    # 只有列维度时每个度量为一行
+    pivoted = result.set_index(pivot_columns)[measures].T
+    pivoted.columns = _flatten(pivoted.columns, drop_measure=False)
+    return pivoted.rename_axis("度量").reset_index()
@@ -0,0 +1,38 @@
+import threading
+from collections import OrderedDict
+from typing import Callable, Hashable, Optional
+
+import pandas as pd
+
+
+class RecordCache:
+    """进程级记录缓存：按存储版本缓存DataFrame，所有页面和会话共享"""
+
+    def __init__(self, max_versions: int = 2):
+        self.max_versions = max(1, max_versions)
+        self._entries: "OrderedDict[Hashable, pd.DataFrame]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, version: Hashable, loader: Callable[[], pd.DataFrame]) -> pd.DataFrame:
+        """返回指定版本的数据，未命中时调用loader加载；同一时刻只有一个会话执行加载"""
+        with self._lock:
+            frame = self._entries.get(version)
+            if frame is not None:
+                self._entries.move_to_end(version)
+                return frame
+            frame = loader()
+            self._entries[version] = frame
+            # 只保留最近的几个版本，限制内存占用
+            while len(self._entries) > self.max_versions:
+                self._entries.popitem(last=False)
+            return frame
+
+    def peek(self, version: Hashable) -> Optional[pd.DataFrame]:
+        """已缓存的指定版本数据，未缓存时返回None，不会触发加载"""
+        with self._lock:
+            return self._entries.get(version)
+
+    def invalidate(self):
+        """清空缓存，写入数据后调用"""
+        with self._lock:
+            self._entries.clear()
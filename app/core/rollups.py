@@ -0,0 +1,86 @@
+import sqlite3
+
+import pandas as pd
+
+ROLLUP_TABLE = "daily_rollup"
+ROLLUP_DIMENSIONS = ["申请部门", "测试进度", "申请日期"]
+COUNT_MEASURE = "项目数"
+COST_MEASURE = "预计费用"
+
+_DEPARTMENT, _PROGRESS, _DATE = ('"申请部门"', '"测试进度"', '"申请日期"')
+_COST = '"预计费用"'
+
+
+def _key_exprs(row: str) -> str:
+    # 维度为空时记为''，保证 (部门, 进度, 日期) 上的主键冲突判断有效
+    return (f"COALESCE({row}.{_DEPARTMENT}, ''), COALESCE({row}.{_PROGRESS}, ''), "
+            f"COALESCE(substr({row}.{_DATE}, 1, 10), '')")
+
+
+def _cost_expr(row: str) -> str:
+    return f"COALESCE(CAST({row}.{_COST} AS REAL), 0)"
+
+
+def _add_sql(row: str) -> str:
+    return (
+        f"INSERT INTO {ROLLUP_TABLE} VALUES ({_key_exprs(row)}, 1, {_cost_expr(row)}) "
+        f"ON CONFLICT ({_DEPARTMENT}, {_PROGRESS}, {_DATE}) DO UPDATE SET "
+        f'"{COUNT_MEASURE}" = "{COUNT_MEASURE}" + 1, {_COST} = {_COST} + excluded.{_COST};'
+    )
+
+
+def _subtract_sql(row: str) -> str:
+    match = (f"{_DEPARTMENT} = COALESCE({row}.{_DEPARTMENT}, '') AND {_PROGRESS} = COALESCE({row}.{_PROGRESS}, '') "
+             f"AND {_DATE} = COALESCE(substr({row}.{_DATE}, 1, 10), '')")
+    return (
+        f'UPDATE {ROLLUP_TABLE} SET "{COUNT_MEASURE}" = "{COUNT_MEASURE}" - 1, '
+        f"{_COST} = {_COST} - {_cost_expr(row)} WHERE {match};"
+        f'DELETE FROM {ROLLUP_TABLE} WHERE {match} AND "{COUNT_MEASURE}" <= 0;'
+    )
+
+
+def create_rollups(conn: sqlite3.Connection, records_table: str):
+    """创建按 (申请部门, 测试进度, 申请日期) 汇总的项目数和预计费用表，并用触发器随每次写入增量维护"""
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (ROLLUP_TABLE,)
+    ).fetchone()
+    conn.execute(
+        f"CREATE TABLE IF NOT EXISTS {ROLLUP_TABLE} ({_DEPARTMENT} TEXT NOT NULL, {_PROGRESS} TEXT NOT NULL, "
+        f'{_DATE} TEXT NOT NULL, "{COUNT_MEASURE}" INTEGER NOT NULL, {_COST} REAL NOT NULL, '
+        f"PRIMARY KEY ({_DEPARTMENT}, {_PROGRESS}, {_DATE}))"
+    )
+    conn.execute(
+        f"CREATE TRIGGER IF NOT EXISTS {ROLLUP_TABLE}_insert AFTER INSERT ON {records_table} "
+        f"BEGIN {_add_sql('NEW')} END"
+    )
+    conn.execute(
+        f"CREATE TRIGGER IF NOT EXISTS {ROLLUP_TABLE}_delete AFTER DELETE ON {records_table} "
+        f"BEGIN {_subtract_sql('OLD')} END"
+    )
+    conn.execute(
+        f"CREATE TRIGGER IF NOT EXISTS {ROLLUP_TABLE}_update "
+        f"AFTER UPDATE OF {_DEPARTMENT}, {_PROGRESS}, {_DATE}, {_COST} ON {records_table} "
+        f"BEGIN {_subtract_sql('OLD')} {_add_sql('NEW')} END"
+    )
+    if not exists:
+        # 首次创建时按现有数据回填
+        conn.execute(
+            f"INSERT INTO {ROLLUP_TABLE} SELECT {_key_exprs(records_table)}, COUNT(*), SUM({_cost_expr(records_table)}) "
+            f"FROM {records_table} GROUP BY 1, 2, 3"
+        )
+
+
+def compute_rollup(df: pd.DataFrame) -> pd.DataFrame:
+    """由完整数据计算汇总表，用于不支持增量维护的存储引擎"""
+    columns = ROLLUP_DIMENSIONS + [COUNT_MEASURE, COST_MEASURE]
+    if df.empty:
+        return pd.DataFrame(columns=columns)
+    empty = pd.Series(index=df.index, dtype=object)
+    keys = pd.DataFrame({
+        "申请部门": df.get("申请部门", empty).astype(object).fillna("").astype(str),
+        "测试进度": df.get("测试进度", empty).astype(object).fillna("").astype(str),
+        "申请日期": pd.to_datetime(df.get("申请日期", empty), errors='coerce').dt.strftime('%Y-%m-%d').fillna(""),
+        COST_MEASURE: pd.to_numeric(df.get(COST_MEASURE, empty), errors='coerce').fillna(0),
+    })
+    keys[COUNT_MEASURE] = 1
+    return keys.groupby(ROLLUP_DIMENSIONS, as_index=False)[[COUNT_MEASURE, COST_MEASURE]].sum()[columns]
@@ -0,0 +1,74 @@
+import sqlite3
+
+import pandas as pd
+
+from config.constants import ACTIVE_STATUSES
+
+SCHEDULE_TABLE = "schedule"
+SCHEDULE_INDEX = "idx_schedule_due"
+# 计划结束日期：优先取预计结束日期，未填写时按测试开始日期加预计时长推算
+DUE_COLUMN = "计划结束日期"
+
+_PROGRESS, _END, _START, _DURATION = ('"测试进度"', '"预计结束日期"', '"测试开始日期"', '"预计时长/天"')
+
+
+def _due_expr(row: str) -> str:
+    duration = f"CAST({row}.{_DURATION} AS INTEGER)"
+    computed = f"CASE WHEN {duration} > 0 THEN date(substr({row}.{_START}, 1, 10), '+' || {duration} || ' days') END"
+    return f"COALESCE(date(NULLIF(substr({row}.{_END}, 1, 10), '')), {computed})"
+
+
+def _scheduled(row: str) -> str:
+    # 只登记未结束（待启动、进行中）且能确定计划结束日期的记录
+    statuses = ", ".join(f"'{status}'" for status in ACTIVE_STATUSES)
+    return f"{row}.{_PROGRESS} IN ({statuses}) AND {_due_expr(row)} IS NOT NULL"
+
+
+def _add_sql(row: str) -> str:
+    return f"INSERT INTO {SCHEDULE_TABLE} (rid, due) SELECT {row}.rowid, {_due_expr(row)} WHERE {_scheduled(row)};"
+
+
+def _remove_sql(row: str) -> str:
+    return f"DELETE FROM {SCHEDULE_TABLE} WHERE rid = {row}.rowid;"
+
+
+def create_schedule(conn: sqlite3.Connection, records_table: str):
+    """创建未结束申请单的计划结束日期索引表，并用触发器随每次写入维护
+
+    表中只有 (记录rowid, 计划结束日期)，按日期建索引，按日期范围查询的耗时只与结果行数有关。
+    VACUUM可能改变记录的rowid，因此每次初始化存储时都按现有数据重建。
+    """
+    conn.execute(f"CREATE TABLE IF NOT EXISTS {SCHEDULE_TABLE} (rid INTEGER PRIMARY KEY, due TEXT NOT NULL)")
+    conn.execute(f"CREATE INDEX IF NOT EXISTS {SCHEDULE_INDEX} ON {SCHEDULE_TABLE} (due)")
+    conn.execute(
+        f"CREATE TRIGGER IF NOT EXISTS {SCHEDULE_TABLE}_insert AFTER INSERT ON {records_table} "
+        f"BEGIN {_add_sql('NEW')} END"
+    )
+    conn.execute(
+        f"CREATE TRIGGER IF NOT EXISTS {SCHEDULE_TABLE}_delete AFTER DELETE ON {records_table} "
+        f"BEGIN {_remove_sql('OLD')} END"
+    )
+    conn.execute(
+        f"CREATE TRIGGER IF NOT EXISTS {SCHEDULE_TABLE}_update "
+        f"AFTER UPDATE OF {_PROGRESS}, {_END}, {_START}, {_DURATION} ON {records_table} "
+        f"BEGIN {_remove_sql('OLD')} {_add_sql('NEW')} END"
+    )
+    conn.execute(f"DELETE FROM {SCHEDULE_TABLE}")
+    conn.execute(
+        f"INSERT INTO {SCHEDULE_TABLE} (rid, due) SELECT rowid, {_due_expr(records_table)} FROM {records_table} "
+        f"WHERE {_scheduled(records_table)}"
+    )
+
+
+def compute_schedule(df: pd.DataFrame) -> pd.DataFrame:
+    """由完整数据计算未结束申请单的计划结束日期，按日期升序，用于不支持增量维护的存储引擎"""
+    if df.empty or "测试进度" not in df.columns:
+        return df.assign(**{DUE_COLUMN: pd.Series(dtype="datetime64[ns]")}).iloc[:0]
+    empty = pd.Series(index=df.index, dtype=object)
+    start = pd.to_datetime(df.get("测试开始日期", empty), errors='coerce').dt.normalize()
+    duration = pd.to_numeric(df.get("预计时长/天", empty), errors='coerce')
+    computed = start + pd.to_timedelta(duration.where(duration > 0), unit="D")
+    due = pd.to_datetime(df.get("预计结束日期", empty), errors='coerce').dt.normalize().fillna(computed)
+    active = df["测试进度"].isin(ACTIVE_STATUSES) & due.notna()
+    scheduled = df[active].assign(**{DUE_COLUMN: due[active]})
+    return scheduled.sort_values(DUE_COLUMN, kind="stable")
@@ -0,0 +1,73 @@
+import pandas as pd
+
+from config.constants import EXCEL_FORMAT, COLUMN_TYPES, CATEGORY_VALUES
+
+
+def column_type(column: str) -> str:
+    """列的声明类型，未声明的列按文本处理"""
+    return COLUMN_TYPES.get(column, "text")
+
+
+def _to_text(series: pd.Series) -> pd.Series:
+    # 数值列中的整数（如从Excel读出的1.0）转成"1"，避免出现"1.0"
+    if pd.api.types.is_numeric_dtype(series):
+        series = series.map(
+            lambda v: None if pd.isna(v) else (str(int(v)) if float(v).is_integer() else str(v))
+        )
+    return series.astype("string")
+
+
+def _to_int(series: pd.Series) -> pd.Series:
+    numbers = pd.to_numeric(series, errors='coerce')
+    valid = numbers.dropna()
+    # 含小数的列无法转为整数类型，保留为可空小数
+    if (valid != valid.round()).any():
+        return numbers.astype("Float64")
+    return numbers.round().astype("Int64")
+
+
+def _to_category(series: pd.Series, column: str) -> pd.Series:
+    declared = list(CATEGORY_VALUES.get(column, []))
+    observed = [value for value in series.dropna().astype(str).unique() if value not in declared]
+    return pd.Categorical(series.where(series.isna(), series.astype(str)), categories=declared + sorted(observed))
+
+
+def apply_schema(df: pd.DataFrame) -> pd.DataFrame:
+    """按列类型配置一次性解析整张表：枚举为category，日期为datetime64，数值为可空整数/小数"""
+    typed = {}
+    for column in df.columns:
+        series = df[column]
+        kind = column_type(column)
+        if kind == "date":
+            typed[column] = pd.to_datetime(series, errors='coerce')
+        elif kind == "int":
+            typed[column] = _to_int(series)
+        elif kind == "float":
+            typed[column] = pd.to_numeric(series, errors='coerce').astype("Float64")
+        elif kind == "category":
+            typed[column] = pd.Series(_to_category(series, column), index=df.index)
+        else:
+            typed[column] = _to_text(series)
+    typed_df = pd.DataFrame(typed, index=df.index)
+    # 保证配置中的列都存在且顺序一致
+    ordered = [col for col in EXCEL_FORMAT if col in typed_df.columns]
+    return typed_df[ordered + [col for col in typed_df.columns if col not in ordered]]
+
+
+def decategorize(df: pd.DataFrame) -> pd.DataFrame:
+    """把category列转回普通对象列，供可自由编辑的表格使用"""
+    for column in df.columns:
+        if isinstance(df[column].dtype, pd.CategoricalDtype):
+            df[column] = df[column].astype(object).where(df[column].notna(), None)
+    return df
+
+
+def memory_report(df: pd.DataFrame) -> pd.DataFrame:
+    """各列的类型和内存占用（字节）"""
+    usage = df.memory_usage(deep=True, index=False)
+    report = pd.DataFrame({
+        "列": usage.index,
+        "类型": [str(df[col].dtype) for col in usage.index],
+        "内存占用(KB)": (usage.values / 1024).round(1),
+    })
+    return report
@@ -0,0 +1,157 @@
+import math
+import threading
+from collections import defaultdict
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Set, Tuple
+
+import pandas as pd
+
+from app.core.storage import KEY_COLUMN, key_value
+
+
+def normalize_text(value: Any) -> str:
+    """将字段值转为用于检索的小写文本，整数值的浮点数去掉'.0'"""
+    if value is None or value is pd.NA:
+        return ""
+    if isinstance(value, float):
+        if math.isnan(value):
+            return ""
+        if value.is_integer():
+            value = int(value)
+    return str(value).lower()
+
+
+def bigrams(text: str) -> Set[str]:
+    """文本的字符二元组，中文按字切分，无需分词"""
+    return {text[i:i + 2] for i in range(len(text) - 1)}
+
+
+def grams(text: str) -> Set[str]:
+    """文本的全部一元组和二元组，作为倒排索引的词项"""
+    return set(text) | bigrams(text)
+
+
+class SearchIndex:
+    """基于字符二元组的倒排索引，支持中文、前缀查询（xxx*）和按字段查询（供应商:xxx）
+
+    文档ID为测试申请单编号；没有编号的记录使用其在表中的行号作为ID。
+    一元组和二元组的倒排表本身就是精确结果，更长的查询词用倒排表求交后再逐条核对。
+    """
+
+    def __init__(self, fields: Iterable[str]):
+        self.fields = list(fields)
+        self.version: Optional[Hashable] = None
+        self._docs: Dict[Any, Dict[str, str]] = {}
+        self._joined: Dict[Any, str] = {}
+        self._postings: Dict[str, Set[Any]] = defaultdict(set)
+        self._has_row_ids = False
+        self._lock = threading.Lock()
+
+    def _add(self, doc_id: Any, texts: Dict[str, str]):
+        self._docs[doc_id] = texts
+        # 用不会出现在文本中的分隔符拼接各字段，未限定字段的查询只需一次子串判断
+        self._joined[doc_id] = "\x00" + "\x00".join(texts.values())
+        for gram in set().union(*(grams(text) for text in texts.values())):
+            self._postings[gram].add(doc_id)
+
+    def _remove(self, doc_id: Any) -> Optional[Dict[str, str]]:
+        texts = self._docs.pop(doc_id, None)
+        if texts is None:
+            return None
+        del self._joined[doc_id]
+        for gram in set().union(*(grams(text) for text in texts.values())):
+            postings = self._postings.get(gram)
+            if postings is not None:
+                postings.discard(doc_id)
+                if not postings:
+                    del self._postings[gram]
+        return texts
+
+    def rebuild(self, frame: pd.DataFrame, version: Hashable):
+        """根据整张表重建索引"""
+        with self._lock:
+            self._docs = {}
+            self._joined = {}
+            self._postings = defaultdict(set)
+            self._has_row_ids = False
+            fields = [field for field in self.fields if field in frame.columns]
+            keys = frame[KEY_COLUMN].tolist() if KEY_COLUMN in frame.columns else [None] * len(frame)
+            columns = [frame[field].tolist() for field in fields]
+            for position, key in enumerate(keys):
+                key = key_value(key)
+                if key is None:
+                    key = position
+                    self._has_row_ids = True
+                self._add(key, {field: normalize_text(values[position]) for field, values in zip(fields, columns)})
+            self.version = version
+
+    def apply_changes(self, before: Hashable, after: Hashable, inserted: List[Dict[str, Any]],
+                      updated: Dict[str, Dict[str, Any]], deleted: List[str]):
+        """按写入的变更集增量更新索引；索引版本与写入前版本不一致时标记为失效，下次查询时重建"""
+        with self._lock:
+            if self.version is None or self.version != before:
+                self.version = None
+                return
+            # 删除会改变后续记录的行号，存在以行号为ID的记录时只能重建
+            if deleted and self._has_row_ids:
+                self.version = None
+                return
+            for key in deleted:
+                self._remove(key_value(key))
+            for key, fields in updated.items():
+                texts = self._remove(key_value(key)) or {}
+                texts.update({field: normalize_text(value) for field, value in fields.items() if field in self.fields})
+                new_key = key_value(fields.get(KEY_COLUMN, key))
+                if new_key is None:
+                    self.version = None
+                    return
+                self._add(new_key, texts)
+            for record in inserted:
+                key = key_value(record.get(KEY_COLUMN))
+                if key is None:
+                    self.version = None
+                    return
+                self._add(key, {field: normalize_text(record.get(field)) for field in self.fields})
+            self.version = after
+
+    def invalidate(self):
+        """标记索引失效"""
+        with self._lock:
+            self.version = None
+
+    def parse_query(self, query: str) -> List[Tuple[Optional[str], str, bool]]:
+        """解析查询：空格分隔的多个条件同时满足，每个条件为 (字段, 文本, 是否前缀匹配)"""
+        terms = []
+        for token in query.split():
+            field = None
+            if ":" in token:
+                name, rest = token.split(":", 1)
+                if name in self.fields and rest:
+                    field, token = name, rest
+            prefix = token.endswith("*") and len(token) > 1
+            if prefix:
+                token = token[:-1]
+            terms.append((field, token.lower(), prefix))
+        return terms
+
+    def search(self, query: str) -> Set[Any]:
+        """返回匹配查询的文档ID集合，查询耗时与候选结果数量成正比"""
+        with self._lock:
+            result: Optional[Set[Any]] = None
+            for field, text, prefix in self.parse_query(query):
+                terms = bigrams(text) or {text}
+                postings = sorted((self._postings.get(term, set()) for term in terms), key=len)
+                candidates = set(postings[0]).intersection(*postings[1:])
+                if result is not None:
+                    candidates &= result
+                if field is None and not prefix and len(text) <= 2:
+                    result = candidates
+                elif field is None:
+                    needle = "\x00" + text if prefix else text
+                    result = {doc_id for doc_id in candidates if needle in self._joined[doc_id]}
+                elif prefix:
+                    result = {doc_id for doc_id in candidates if self._docs[doc_id].get(field, "").startswith(text)}
+                else:
+                    result = {doc_id for doc_id in candidates if text in self._docs[doc_id].get(field, "")}
+                if not result:
+                    break
+            return result if result is not None else set(self._docs)
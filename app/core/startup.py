@@ -0,0 +1,63 @@
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from config.settings import DATA_DIR, ATTACHMENTS_DIR
+
+_lock = threading.Lock()
+# 当前一次初始化：完成事件和异常；失败的一次在下次start()时被新的一次取代
+_attempt: Optional[Dict[str, Any]] = None
+_report: Dict[str, Any] = {"started_at": None, "init_seconds": None, "archived": None}
+
+
+def _initialize(attempt: Dict[str, Any]):
+    start = time.perf_counter()
+    try:
+        os.makedirs(DATA_DIR, exist_ok=True)
+        os.makedirs(ATTACHMENTS_DIR, exist_ok=True)
+        # 数据层依赖pandas等较重的库，在后台线程中导入，不阻塞主页的首次渲染
+        from app.core.data_manager import DataManager
+        DataManager.init_database()
+        # 按归档策略把长期不再变动的记录移入冷分区，之后默认只读取热数据
+        _report["archived"] = DataManager.archive_expired()
+        DataManager.request_snapshot()
+    except BaseException as e:
+        attempt["error"] = e
+    finally:
+        _report["init_seconds"] = time.perf_counter() - start
+        attempt["done"].set()
+
+
+def start() -> Dict[str, Any]:
+    """应用启动钩子：每个进程只在第一次调用时启动后台初始化（建数据目录、初始化数据库、归档），之后的调用立即返回
+
+    上一次初始化失败（如数据库被锁定）时重新初始化，不必重启进程。
+    """
+    global _attempt
+    attempt = _attempt
+    if attempt is not None and not _failed(attempt):
+        return attempt
+    with _lock:
+        if _attempt is None or _failed(_attempt):
+            _report["started_at"] = time.time()
+            _attempt = {"done": threading.Event(), "error": None}
+            threading.Thread(target=_initialize, args=(_attempt,), name="app-startup", daemon=True).start()
+        return _attempt
+
+
+def _failed(attempt: Dict[str, Any]) -> bool:
+    return attempt["done"].is_set() and attempt["error"] is not None
+
+
+def wait():
+    """等待启动初始化完成，需要读写数据的页面在使用数据前调用；初始化失败时抛出原来的异常，下次调用时重试"""
+    attempt = start()
+    attempt["done"].wait()
+    if attempt["error"] is not None:
+        raise attempt["error"]
+
+
+def report() -> Dict[str, Any]:
+    """启动初始化的开始时间、耗时（秒）和归档的行数，尚未完成时为None"""
+    return dict(_report)
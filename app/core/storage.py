@@ -0,0 +1,830 @@
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import date, datetime
+from typing import List, Dict, Any, Optional, Iterable, Iterator, Set, Tuple, Callable, NamedTuple, Union
+
+import pandas as pd
+
+from config.constants import EXCEL_FORMAT
+from app.core.rollups import ROLLUP_TABLE, create_rollups, compute_rollup
+from app.core.schedule import SCHEDULE_TABLE, DUE_COLUMN, create_schedule, compute_schedule
+from app.core.history import (CHANGE_COLUMNS, create_history, read_snapshot, save_snapshot, changes_since_snapshot,
+                              state_as_of, record_history)
+
+RECORDS_TABLE = "records"
+KEY_COLUMN = "测试申请单编号"
+KEY_INDEX = "idx_records_key"
+# 已移入冷分区的编号，仍参与查重
+ARCHIVED_KEYS_TABLE = "archived_keys"
+# 按编号批量查询时每条SQL携带的编号数
+KEY_LOOKUP_BATCH = 500
+
+
+class Replacement(NamedTuple):
+    """用records整体替换全部记录，与其他变更一样经写队列提交"""
+    records: List[Dict[str, Any]]
+
+
+# 一组变更: (新增记录, {测试申请单编号: 变更字段}, 待删除的编号)，或整体替换全部记录的Replacement
+ChangeSet = Union[Tuple[List[Dict[str, Any]], Dict[str, Dict[str, Any]], List[str]], Replacement]
+# 日期列的范围条件: {列名: (起始日期, 结束日期)}，两端都包含，为None的一端不限
+Ranges = Dict[str, Tuple[Any, Any]]
+
+
+class DuplicateApplicationError(Exception):
+    """写入的测试申请单编号与已有记录重复"""
+
+
+def quote_identifier(name: str) -> str:
+    """为SQLite列名加引号（列名包含中文及'/'等字符）"""
+    return '"' + name.replace('"', '""') + '"'
+
+
+def key_value(value: Any) -> Any:
+    """测试申请单编号统一按文本存储，避免数字编号与文本编号比较不等；空编号存为NULL"""
+    value = to_db_value(value)
+    if value is None or str(value).strip() == "":
+        return None
+    # xlsx中含空值的数字列读出为浮点数，123.0 与 123 是同一个编号
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value)
+
+
+def to_db_value(value: Any) -> Any:
+    """将pandas/numpy值转换为可写入存储的Python基础类型"""
+    if value is None:
+        return None
+    if isinstance(value, (datetime, date)):
+        if pd.isna(value):
+            return None
+        return value.strftime('%Y-%m-%d')
+    if hasattr(value, "item") and not isinstance(value, (str, bytes)):
+        value = value.item()
+    try:
+        if pd.isna(value):
+            return None
+    except (TypeError, ValueError):
+        pass
+    return value
+
+
+class StorageEngine:
+    """存储引擎基类，定义DataManager所依赖的读写接口
+
+    可选的能力由类属性声明，调用方按属性判断，不依赖具体的存储类：
+    migrates_from_excel 首次使用时从旧的xlsx文件迁移数据，supports_archive 可以把记录移入冷分区，
+    supports_history 记录每条记录的修改历史。
+    """
+
+    migrates_from_excel = False
+    supports_archive = False
+    supports_history = False
+
+    def exists(self) -> bool:
+        """存储文件是否已存在"""
+        raise NotImplementedError
+
+    def version(self) -> tuple:
+        """当前数据版本，任何写入之后都会变化，用作缓存键"""
+        raise NotImplementedError
+
+    def last_write_versions(self) -> Optional[Tuple[tuple, tuple]]:
+        """当前线程最近一次写事务提交前后的数据版本，在写事务内读取；不支持时返回None"""
+        return None
+
+    def init_storage(self):
+        """创建空的存储结构"""
+        raise NotImplementedError
+
+    def load_frame(self) -> pd.DataFrame:
+        """读取全部记录"""
+        raise NotImplementedError
+
+    def header(self) -> List[str]:
+        """存储中的列名（表头），不需要读取数据；默认读取全表后取表头"""
+        return list(self.load_frame().columns)
+
+    def select_frame(self, columns: Optional[List[str]] = None, filters: Optional[Dict[str, List[Any]]] = None,
+                     ranges: Optional[Ranges] = None) -> pd.DataFrame:
+        """只读取columns中的列（为None时读取全部）和满足筛选条件的行；默认读取全表后在内存中筛选"""
+        df, _ = page_frame(self.load_frame(), 0, None, filters, ranges=ranges)
+        return project_frame(df, columns)
+
+    def replace_all(self, records: List[Dict[str, Any]]):
+        """用给定记录整体替换存储内容"""
+        raise NotImplementedError
+
+    def insert_record(self, record: Dict[str, Any]):
+        """插入一条记录"""
+        raise NotImplementedError
+
+    def update_record(self, test_app_number: str, fields: Dict[str, Any]) -> bool:
+        """按测试申请单编号更新一条记录的部分字段"""
+        raise NotImplementedError
+
+    def delete_record(self, test_app_number: str) -> bool:
+        """按测试申请单编号删除一条记录"""
+        raise NotImplementedError
+
+    def has_key(self, test_app_number: str) -> bool:
+        """测试申请单编号是否已存在"""
+        raise NotImplementedError
+
+    def get_record(self, test_app_number: str) -> Optional[Dict[str, Any]]:
+        """按测试申请单编号读取单条记录，不存在时返回None"""
+        raise NotImplementedError
+
+    def existing_keys(self, keys: Iterable[Any]) -> Set[str]:
+        """给定编号中已存在的那些；默认整表读取后比较"""
+        df = self.load_frame()
+        if KEY_COLUMN not in df.columns:
+            return set()
+        stored = {key_value(value) for value in df[KEY_COLUMN].tolist()}
+        return {key for key in (key_value(value) for value in keys) if key is not None and key in stored}
+
+    def apply_changes(self, inserted: List[Dict[str, Any]], updated: Dict[str, Dict[str, Any]],
+                      deleted: List[str]) -> int:
+        """应用一组变更：按编号删除、按编号更新部分字段、插入新记录，返回受影响的行数"""
+        count = sum(self.delete_record(test_app_number) for test_app_number in deleted)
+        count += sum(self.update_record(test_app_number, fields) for test_app_number, fields in updated.items())
+        for record in inserted:
+            self.insert_record(record)
+        return count + len(inserted)
+
+    def apply_batch(self, changesets: List[ChangeSet]) -> List[Any]:
+        """依次应用多组变更，返回每组的结果：受影响的行数，或该组失败时的异常；默认逐组写入"""
+        results: List[Any] = []
+        for changeset in changesets:
+            try:
+                if isinstance(changeset, Replacement):
+                    self.replace_all(changeset.records)
+                    results.append(len(changeset.records))
+                else:
+                    results.append(self.apply_changes(*changeset))
+            except Exception as e:
+                results.append(e)
+        return results
+
+    def load_rollup(self) -> pd.DataFrame:
+        """按 (申请部门, 测试进度, 申请日期) 汇总的项目数和预计费用；默认由全表计算"""
+        return compute_rollup(self.load_frame())
+
+    def query_page(self, offset: int, limit: int, filters: Optional[Dict[str, List[Any]]] = None,
+                   sort_by: Optional[str] = None, ascending: bool = True,
+                   ranges: Optional[Ranges] = None) -> Tuple[pd.DataFrame, int]:
+        """按筛选条件和排序读取一页数据，返回 (该页数据, 满足条件的总行数)；默认在内存中完成"""
+        return page_frame(self.load_frame(), offset, limit, filters, sort_by, ascending, ranges)
+
+    def iter_frames(self, chunk_size: int, filters: Optional[Dict[str, List[Any]]] = None) -> Iterator[pd.DataFrame]:
+        """按筛选条件分块读取记录，每块最多chunk_size行；默认在内存中切分"""
+        df, total = page_frame(self.load_frame(), 0, None, filters)
+        for start in range(0, total, chunk_size):
+            yield df.iloc[start:start + chunk_size]
+
+    def query_schedule(self, due_from: Optional[str] = None, due_before: Optional[str] = None,
+                       limit: Optional[int] = None) -> Tuple[pd.DataFrame, int]:
+        """未结束的申请单中计划结束日期在 [due_from, due_before) 内的记录（按日期升序，最多limit行）及总行数；默认由全表计算"""
+        scheduled = compute_schedule(self.load_frame())
+        due = scheduled[DUE_COLUMN]
+        mask = pd.Series(True, index=scheduled.index)
+        if due_from is not None:
+            mask &= due >= pd.Timestamp(due_from)
+        if due_before is not None:
+            mask &= due < pd.Timestamp(due_before)
+        scheduled = scheduled[mask]
+        columns = [DUE_COLUMN] + [col for col in scheduled.columns if col != DUE_COLUMN]
+        scheduled = scheduled.assign(**{DUE_COLUMN: scheduled[DUE_COLUMN].dt.strftime('%Y-%m-%d')})[columns]
+        return scheduled.iloc[:limit], len(scheduled)
+
+    def archive_records(self, cutoff: str, statuses: List[str], write: Callable[[pd.DataFrame], None]) -> int:
+        """把测试进度属于statuses且结束日期早于cutoff的记录交给write写入冷分区，再从存储中移除，返回移出的行数
+
+        不支持归档（supports_archive为False）的存储不移出任何记录。
+        """
+        return 0
+
+    def migrate_from_excel(self, excel_path: str):
+        """从旧的xlsx文件一次性迁移数据；migrates_from_excel为False的存储不需要迁移"""
+
+    def record_history(self, test_app_number: str) -> pd.DataFrame:
+        """一条记录按字段的全部变更（序号、时间、操作、字段、原值、新值），按发生顺序；不记录历史的存储返回空表"""
+        return pd.DataFrame(columns=CHANGE_COLUMNS)
+
+    def frame_as_of(self, ts: str) -> pd.DataFrame:
+        """重建截至时间ts（YYYY-MM-DD HH:MM:SS，含）的全部记录；不记录历史的存储返回空表"""
+        return pd.DataFrame()
+
+    def snapshot_history(self, min_changes: int) -> Optional[int]:
+        """上次快照后的变更达到min_changes条时保存一份新快照，返回快照中的记录数，未保存时返回None"""
+        return None
+
+
+class ExcelStorage(StorageEngine):
+    """基于单个xlsx文件的存储引擎（旧格式，每次写入都会重写整个文件）"""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def exists(self) -> bool:
+        return os.path.exists(self.path)
+
+    def version(self) -> tuple:
+        if not self.exists():
+            return (self.path, 0, 0)
+        stat = os.stat(self.path)
+        return (self.path, stat.st_mtime_ns, stat.st_size)
+
+    def init_storage(self):
+        if not self.exists():
+            pd.DataFrame().to_excel(self.path, index=False)
+
+    def load_frame(self) -> pd.DataFrame:
+        if not self.exists():
+            return pd.DataFrame()
+        return pd.read_excel(self.path)
+
+    def header(self) -> List[str]:
+        # 只解析表头行
+        if not self.exists():
+            return []
+        return [str(col) for col in pd.read_excel(self.path, nrows=0).columns]
+
+    def select_frame(self, columns: Optional[List[str]] = None, filters: Optional[Dict[str, List[Any]]] = None,
+                     ranges: Optional[Ranges] = None) -> pd.DataFrame:
+        # 只解析需要返回和用于筛选的列
+        if not self.exists():
+            return pd.DataFrame(columns=columns)
+        usecols = None
+        if columns is not None:
+            needed = set(columns) | set((filters or {}).keys()) | set((ranges or {}).keys())
+            usecols = lambda col: col in needed
+        df, _ = page_frame(pd.read_excel(self.path, usecols=usecols), 0, None, filters, ranges=ranges)
+        return project_frame(df, columns)
+
+    def replace_all(self, records: List[Dict[str, Any]]):
+        # 先写入临时文件再原子替换，写入中途失败不会损坏原文件
+        root, ext = os.path.splitext(self.path)
+        tmp_path = f"{root}.writing{ext}"
+        pd.DataFrame(records).to_excel(tmp_path, index=False)
+        os.replace(tmp_path, self.path)
+
+    def insert_record(self, record: Dict[str, Any]):
+        records = self.load_frame().to_dict('records')
+        records.append(record)
+        self.replace_all(records)
+
+    def update_record(self, test_app_number: str, fields: Dict[str, Any]) -> bool:
+        # read_excel把纯数字的编号读成数字，两边都按key_value统一为文本再比较
+        records = self.load_frame().to_dict('records')
+        key = key_value(test_app_number)
+        updated = False
+        for record in records:
+            if key_value(record.get(KEY_COLUMN)) == key:
+                record.update(fields)
+                updated = True
+        if updated:
+            self.replace_all(records)
+        return updated
+
+    def has_key(self, test_app_number: str) -> bool:
+        return self.get_record(test_app_number) is not None
+
+    def get_record(self, test_app_number: str) -> Optional[Dict[str, Any]]:
+        # Excel没有索引，只能整表扫描
+        df = self.load_frame()
+        if KEY_COLUMN not in df.columns:
+            return None
+        matches = df[df[KEY_COLUMN].map(key_value) == key_value(test_app_number)]
+        return matches.iloc[0].to_dict() if not matches.empty else None
+
+    def apply_changes(self, inserted: List[Dict[str, Any]], updated: Dict[str, Dict[str, Any]],
+                      deleted: List[str]) -> int:
+        return self.apply_batch([(inserted, updated, deleted)])[0]
+
+    def apply_batch(self, changesets: List[ChangeSet]) -> List[Any]:
+        # Excel无法按行写入，所有变更在内存中应用后合并为一次整表重写
+        records = self.load_frame().to_dict('records')
+        results: List[Any] = []
+        for changeset in changesets:
+            if isinstance(changeset, Replacement):
+                records = list(changeset.records)
+                results.append(len(records))
+                continue
+            inserted, updated, deleted = changeset
+            deleted_keys = {key_value(key) for key in deleted} - {None}
+            updated_by_key = {key_value(key): fields for key, fields in updated.items()}
+            remaining = [r for r in records if key_value(r.get(KEY_COLUMN)) not in deleted_keys]
+            count = len(records) - len(remaining)
+            for record in remaining:
+                fields = updated_by_key.get(key_value(record.get(KEY_COLUMN)))
+                if fields:
+                    record.update(fields)
+                    count += 1
+            records = remaining + list(inserted)
+            results.append(count + len(inserted))
+        self.replace_all(records)
+        return results
+
+    def delete_record(self, test_app_number: str) -> bool:
+        records = self.load_frame().to_dict('records')
+        key = key_value(test_app_number)
+        remaining = [r for r in records if key is None or key_value(r.get(KEY_COLUMN)) != key]
+        if len(remaining) == len(records):
+            return False
+        self.replace_all(remaining)
+        return True
+
+
+class SQLiteStorage(StorageEngine):
+    """基于嵌入式SQLite的存储引擎，支持按行插入和更新"""
+
+    migrates_from_excel = True
+    supports_archive = True
+    supports_history = True
+
+    def __init__(self, path: str, columns: Optional[List[str]] = None):
+        self.path = path
+        self.columns = list(columns or EXCEL_FORMAT)
+        self._local = threading.local()
+
+    @contextmanager
+    def connect(self) -> Iterator[sqlite3.Connection]:
+        """打开一个连接，正常退出时提交事务，异常时回滚"""
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            yield conn
+            conn.commit()
+        except sqlite3.IntegrityError as e:
+            conn.rollback()
+            raise DuplicateApplicationError(f"测试申请单编号重复: {str(e)}") from e
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """写事务，提交时递增数据版本号"""
+        self._local.versions = None
+        with self.connect() as conn:
+            yield conn
+            conn.execute(
+                "INSERT INTO meta (key, value) VALUES ('generation', 1) "
+                "ON CONFLICT(key) DO UPDATE SET value = value + 1"
+            )
+            # 递增后仍在同一个写事务中读取，前后两个版本之间不会夹着其他进程的提交
+            generation = int(conn.execute("SELECT value FROM meta WHERE key = 'generation'").fetchone()[0])
+            self._local.versions = ((self.path, generation - 1), (self.path, generation))
+
+    def exists(self) -> bool:
+        return os.path.exists(self.path)
+
+    def last_write_versions(self) -> Optional[Tuple[tuple, tuple]]:
+        return getattr(self._local, "versions", None)
+
+    def version(self) -> tuple:
+        if not self.exists():
+            return (self.path, 0)
+        with self.connect() as conn:
+            row = conn.execute("SELECT value FROM meta WHERE key = 'generation'").fetchone()
+        return (self.path, int(row[0]) if row else 0)
+
+    def init_storage(self):
+        with self.connect() as conn:
+            self.create_schema(conn)
+
+    def create_tables(self, conn: sqlite3.Connection):
+        """只创建数据表和元数据表，不建索引和触发器"""
+        column_defs = ", ".join(quote_identifier(col) for col in self.columns)
+        conn.execute(f"CREATE TABLE IF NOT EXISTS {RECORDS_TABLE} ({column_defs})")
+        conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+
+    def create_schema(self, conn: sqlite3.Connection):
+        """创建数据表，并为旧库补齐新增的列"""
+        conn.execute("PRAGMA journal_mode=WAL")
+        self.create_tables(conn)
+        existing = {row[1] for row in conn.execute(f"PRAGMA table_info({RECORDS_TABLE})")}
+        for col in self.columns:
+            if col not in existing:
+                conn.execute(f"ALTER TABLE {RECORDS_TABLE} ADD COLUMN {quote_identifier(col)}")
+        self.create_key_index(conn)
+        self.create_archived_keys(conn)
+        create_rollups(conn, RECORDS_TABLE)
+        create_schedule(conn, RECORDS_TABLE)
+        create_history(conn, RECORDS_TABLE, self.columns, KEY_COLUMN, ARCHIVED_KEYS_TABLE)
+
+    def create_archived_keys(self, conn: sqlite3.Connection):
+        """已归档编号表；插入或改成已归档的编号时由触发器报重复，与唯一索引的行为一致"""
+        key = quote_identifier(KEY_COLUMN)
+        conn.execute(f"CREATE TABLE IF NOT EXISTS {ARCHIVED_KEYS_TABLE} (key TEXT PRIMARY KEY)")
+        for event in ("INSERT", f"UPDATE OF {key}"):
+            name = f"{ARCHIVED_KEYS_TABLE}_{event.split()[0].lower()}"
+            conn.execute(
+                f"CREATE TRIGGER IF NOT EXISTS {name} BEFORE {event} ON {RECORDS_TABLE} "
+                f"WHEN NEW.{key} IN (SELECT key FROM {ARCHIVED_KEYS_TABLE}) "
+                f"BEGIN SELECT RAISE(ABORT, 'UNIQUE constraint failed: archived {KEY_COLUMN}'); END"
+            )
+
+    def create_key_index(self, conn: sqlite3.Connection):
+        """为测试申请单编号建立唯一索引；历史数据存在重复编号时退化为普通索引，下次初始化时重试"""
+        indexes = {row[1]: row[2] for row in conn.execute(f"PRAGMA index_list({RECORDS_TABLE})")}
+        if indexes.get(KEY_INDEX):
+            return
+        key = quote_identifier(KEY_COLUMN)
+        conn.execute(f"DROP INDEX IF EXISTS {KEY_INDEX}")
+        try:
+            conn.execute(
+                f"CREATE UNIQUE INDEX {KEY_INDEX} ON {RECORDS_TABLE} ({key}) "
+                f"WHERE {key} IS NOT NULL"
+            )
+        except sqlite3.IntegrityError:
+            conn.execute(f"CREATE INDEX {KEY_INDEX} ON {RECORDS_TABLE} ({key})")
+
+    def _row_values(self, record: Dict[str, Any]) -> List[Any]:
+        return [key_value(record.get(col)) if col == KEY_COLUMN else to_db_value(record.get(col))
+                for col in self.columns]
+
+    def _insert_many(self, conn: sqlite3.Connection, records: List[Dict[str, Any]], table: str = RECORDS_TABLE):
+        placeholders = ", ".join("?" for _ in self.columns)
+        column_list = ", ".join(quote_identifier(col) for col in self.columns)
+        conn.executemany(
+            f"INSERT INTO {table} ({column_list}) VALUES ({placeholders})",
+            (self._row_values(record) for record in records)
+        )
+
+    def load_frame(self) -> pd.DataFrame:
+        if not self.exists():
+            return pd.DataFrame()
+        column_list = ", ".join(quote_identifier(col) for col in self.columns)
+        with self.connect() as conn:
+            return pd.read_sql_query(
+                f"SELECT {column_list} FROM {RECORDS_TABLE} ORDER BY rowid", conn
+            )
+
+    def header(self) -> List[str]:
+        if not self.exists():
+            return list(self.columns)
+        with self.connect() as conn:
+            return [row[1] for row in conn.execute(f"PRAGMA table_info({RECORDS_TABLE})")]
+
+    def select_frame(self, columns: Optional[List[str]] = None, filters: Optional[Dict[str, List[Any]]] = None,
+                     ranges: Optional[Ranges] = None) -> pd.DataFrame:
+        # 列投影和筛选条件都下推到SQL，只读取需要的列和行
+        columns = self.columns if columns is None else [col for col in columns if col in self.columns]
+        if not self.exists():
+            return pd.DataFrame(columns=columns)
+        where, params = self._where(filters, ranges)
+        column_list = ", ".join(quote_identifier(col) for col in columns)
+        with self.connect() as conn:
+            return pd.read_sql_query(
+                f"SELECT {column_list} FROM {RECORDS_TABLE}{where} ORDER BY rowid", conn, params=params
+            )
+
+    def load_rollup(self) -> pd.DataFrame:
+        # 汇总表由触发器随每次写入增量维护，这里直接读取
+        if not self.exists():
+            return compute_rollup(pd.DataFrame())
+        with self.connect() as conn:
+            return pd.read_sql_query(f"SELECT * FROM {ROLLUP_TABLE}", conn)
+
+    def query_page(self, offset: int, limit: int, filters: Optional[Dict[str, List[Any]]] = None,
+                   sort_by: Optional[str] = None, ascending: bool = True,
+                   ranges: Optional[Ranges] = None) -> Tuple[pd.DataFrame, int]:
+        # 筛选、排序和分页都下推到SQL，只把这一页的数据读入内存
+        if not self.exists():
+            return pd.DataFrame(columns=self.columns), 0
+        where, params = self._where(filters, ranges)
+        order = "rowid"
+        if sort_by in self.columns:
+            order = f"{quote_identifier(sort_by)} {'ASC' if ascending else 'DESC'}, rowid"
+        column_list = ", ".join(quote_identifier(col) for col in self.columns)
+        with self.connect() as conn:
+            total = conn.execute(f"SELECT COUNT(*) FROM {RECORDS_TABLE}{where}", params).fetchone()[0]
+            page = pd.read_sql_query(
+                f"SELECT {column_list} FROM {RECORDS_TABLE}{where} ORDER BY {order} LIMIT ? OFFSET ?",
+                conn, params=params + [limit, offset]
+            )
+        page.index = pd.RangeIndex(offset, offset + len(page))
+        return page, total
+
+    def iter_frames(self, chunk_size: int, filters: Optional[Dict[str, List[Any]]] = None) -> Iterator[pd.DataFrame]:
+        # 游标逐块读取，内存占用只与块大小有关
+        if not self.exists():
+            return
+        where, params = self._where(filters)
+        column_list = ", ".join(quote_identifier(col) for col in self.columns)
+        with self.connect() as conn:
+            yield from pd.read_sql_query(
+                f"SELECT {column_list} FROM {RECORDS_TABLE}{where} ORDER BY rowid",
+                conn, params=params, chunksize=chunk_size
+            )
+
+    def query_schedule(self, due_from: Optional[str] = None, due_before: Optional[str] = None,
+                       limit: Optional[int] = None) -> Tuple[pd.DataFrame, int]:
+        # 计划结束日期表由触发器维护并按日期建有索引，只按范围读取命中的记录
+        if not self.exists():
+            return pd.DataFrame(columns=[DUE_COLUMN] + self.columns), 0
+        conditions, params = [], []
+        if due_from is not None:
+            conditions.append("s.due >= ?")
+            params.append(due_from)
+        if due_before is not None:
+            conditions.append("s.due < ?")
+            params.append(due_before)
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+        column_list = ", ".join(f"r.{quote_identifier(col)}" for col in self.columns)
+        with self.connect() as conn:
+            total = conn.execute(f"SELECT COUNT(*) FROM {SCHEDULE_TABLE} s{where}", params).fetchone()[0]
+            rows = pd.read_sql_query(
+                f"SELECT s.due AS {quote_identifier(DUE_COLUMN)}, {column_list} FROM {SCHEDULE_TABLE} s "
+                f"JOIN {RECORDS_TABLE} r ON r.rowid = s.rid{where} ORDER BY s.due, s.rid LIMIT ?",
+                conn, params=params + [-1 if limit is None else limit]
+            )
+        return rows, total
+
+    def _where(self, filters: Optional[Dict[str, List[Any]]],
+               ranges: Optional[Ranges] = None) -> Tuple[str, List[Any]]:
+        # 每个筛选条件转为 IN 子句，日期范围按前10个字符（YYYY-MM-DD）比较，多个条件同时满足
+        conditions, params = [], []
+        for col, values in (filters or {}).items():
+            if values and col in self.columns:
+                conditions.append(f"{quote_identifier(col)} IN ({', '.join('?' for _ in values)})")
+                params.extend(to_db_value(value) for value in values)
+        for col, (start, end) in (ranges or {}).items():
+            if col not in self.columns:
+                continue
+            for bound, operator in ((start, ">="), (end, "<=")):
+                if bound is not None:
+                    conditions.append(f"substr({quote_identifier(col)}, 1, 10) {operator} ?")
+                    params.append(pd.Timestamp(bound).strftime('%Y-%m-%d'))
+        return (f" WHERE {' AND '.join(conditions)}" if conditions else ""), params
+
+    def _replace(self, conn: sqlite3.Connection, records: List[Dict[str, Any]]) -> int:
+        # 与现有记录比较后只写入有差异的行，触发器维护的汇总表、计划表和修改历史只随真正变化的行更新：
+        # 按编号及同一编号中的先后顺序配对，配对的行只在字段不同时更新，其余的删除或追加到末尾
+        key = quote_identifier(KEY_COLUMN)
+        column_list = ", ".join(quote_identifier(col) for col in self.columns)
+        values = [col for col in self.columns if col != KEY_COLUMN]
+        conn.execute(f"CREATE TEMP TABLE incoming ({column_list})")
+        conn.execute("CREATE TEMP TABLE pairs (rid INTEGER PRIMARY KEY, iid INTEGER NOT NULL UNIQUE)")
+        self._insert_many(conn, records, "temp.incoming")
+        numbered = (f"SELECT rowid AS id, IFNULL({key}, '') AS k, "
+                    f"ROW_NUMBER() OVER (PARTITION BY {key} ORDER BY rowid) AS n FROM {{}}")
+        conn.execute(
+            f"INSERT INTO temp.pairs (rid, iid) SELECT r.id, i.id FROM ({numbered.format(RECORDS_TABLE)}) r "
+            f"JOIN ({numbered.format('temp.incoming')}) i ON i.k = r.k AND i.n = r.n"
+        )
+        conn.execute(f"DELETE FROM {RECORDS_TABLE} WHERE rowid NOT IN (SELECT rid FROM temp.pairs)")
+        if values:
+            differs = " OR ".join(f"r.{quote_identifier(col)} IS NOT i.{quote_identifier(col)}" for col in values)
+            conn.execute(
+                f"UPDATE {RECORDS_TABLE} SET ({', '.join(quote_identifier(col) for col in values)}) = "
+                f"(SELECT {', '.join('i.' + quote_identifier(col) for col in values)} FROM temp.pairs p "
+                f"JOIN temp.incoming i ON i.rowid = p.iid WHERE p.rid = {RECORDS_TABLE}.rowid) "
+                f"WHERE rowid IN (SELECT p.rid FROM temp.pairs p JOIN {RECORDS_TABLE} r ON r.rowid = p.rid "
+                f"JOIN temp.incoming i ON i.rowid = p.iid WHERE {differs})"
+            )
+        conn.execute(
+            f"INSERT INTO {RECORDS_TABLE} ({column_list}) SELECT {column_list} FROM temp.incoming "
+            f"WHERE rowid NOT IN (SELECT iid FROM temp.pairs) ORDER BY rowid"
+        )
+        conn.execute("DROP TABLE temp.pairs")
+        conn.execute("DROP TABLE temp.incoming")
+        return len(records)
+
+    def replace_all(self, records: List[Dict[str, Any]]):
+        with self.transaction() as conn:
+            self._replace(conn, records)
+
+    def insert_record(self, record: Dict[str, Any]):
+        with self.transaction() as conn:
+            self._insert_many(conn, [record])
+
+    def _update(self, conn: sqlite3.Connection, test_app_number: str, fields: Dict[str, Any]) -> bool:
+        fields = {col: value for col, value in fields.items() if col in self.columns}
+        if not fields:
+            return False
+        assignments = ", ".join(f"{quote_identifier(col)} = ?" for col in fields)
+        params = [key_value(value) if col == KEY_COLUMN else to_db_value(value)
+                  for col, value in fields.items()] + [key_value(test_app_number)]
+        cursor = conn.execute(
+            f"UPDATE {RECORDS_TABLE} SET {assignments} WHERE {quote_identifier(KEY_COLUMN)} = ?",
+            params
+        )
+        return cursor.rowcount > 0
+
+    def _delete(self, conn: sqlite3.Connection, test_app_number: str) -> bool:
+        cursor = conn.execute(
+            f"DELETE FROM {RECORDS_TABLE} WHERE {quote_identifier(KEY_COLUMN)} = ?",
+            (key_value(test_app_number),)
+        )
+        return cursor.rowcount > 0
+
+    def update_record(self, test_app_number: str, fields: Dict[str, Any]) -> bool:
+        with self.transaction() as conn:
+            return self._update(conn, test_app_number, fields)
+
+    def delete_record(self, test_app_number: str) -> bool:
+        with self.transaction() as conn:
+            return self._delete(conn, test_app_number)
+
+    def has_key(self, test_app_number: str) -> bool:
+        # 已归档的编号同样视为已存在
+        if not self.exists():
+            return False
+        key = key_value(test_app_number)
+        with self.connect() as conn:
+            row = conn.execute(
+                f"SELECT 1 FROM {RECORDS_TABLE} WHERE {quote_identifier(KEY_COLUMN)} = ? "
+                f"UNION ALL SELECT 1 FROM {ARCHIVED_KEYS_TABLE} WHERE key = ? LIMIT 1",
+                (key, key)
+            ).fetchone()
+            return row is not None
+
+    def existing_keys(self, keys: Iterable[Any]) -> Set[str]:
+        # 分批用 IN 查询走编号索引，每批参数数量低于SQLite的上限
+        if not self.exists():
+            return set()
+        keys = list({key for key in (key_value(value) for value in keys) if key is not None})
+        found: Set[str] = set()
+        with self.connect() as conn:
+            for start in range(0, len(keys), KEY_LOOKUP_BATCH):
+                batch = keys[start:start + KEY_LOOKUP_BATCH]
+                placeholders = ', '.join('?' for _ in batch)
+                rows = conn.execute(
+                    f"SELECT {quote_identifier(KEY_COLUMN)} FROM {RECORDS_TABLE} "
+                    f"WHERE {quote_identifier(KEY_COLUMN)} IN ({placeholders}) "
+                    f"UNION SELECT key FROM {ARCHIVED_KEYS_TABLE} WHERE key IN ({placeholders})",
+                    batch + batch
+                )
+                found.update(row[0] for row in rows)
+        return found
+
+    def get_record(self, test_app_number: str) -> Optional[Dict[str, Any]]:
+        if not self.exists():
+            return None
+        column_list = ", ".join(quote_identifier(col) for col in self.columns)
+        with self.connect() as conn:
+            row = conn.execute(
+                f"SELECT {column_list} FROM {RECORDS_TABLE} WHERE {quote_identifier(KEY_COLUMN)} = ? LIMIT 1",
+                (key_value(test_app_number),)
+            ).fetchone()
+        return dict(zip(self.columns, row)) if row is not None else None
+
+    def _apply(self, conn: sqlite3.Connection, inserted: List[Dict[str, Any]],
+               updated: Dict[str, Dict[str, Any]], deleted: List[str]) -> int:
+        count = sum(self._delete(conn, test_app_number) for test_app_number in deleted)
+        count += sum(self._update(conn, test_app_number, fields) for test_app_number, fields in updated.items())
+        self._insert_many(conn, inserted)
+        return count + len(inserted)
+
+    def apply_changes(self, inserted: List[Dict[str, Any]], updated: Dict[str, Dict[str, Any]],
+                      deleted: List[str]) -> int:
+        # 在同一个事务中完成，任一步失败则整体回滚
+        with self.transaction() as conn:
+            return self._apply(conn, inserted, updated, deleted)
+
+    def apply_batch(self, changesets: List[ChangeSet]) -> List[Any]:
+        # 所有变更在同一个事务中提交；每组变更用保存点隔离，一组失败只回滚该组
+        results: List[Any] = []
+        with self.transaction() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            for changeset in changesets:
+                conn.execute("SAVEPOINT changeset")
+                try:
+                    if isinstance(changeset, Replacement):
+                        results.append(self._replace(conn, changeset.records))
+                    else:
+                        results.append(self._apply(conn, *changeset))
+                except sqlite3.IntegrityError as e:
+                    conn.execute("ROLLBACK TO changeset")
+                    results.append(DuplicateApplicationError(f"测试申请单编号重复: {str(e)}"))
+                except Exception as e:
+                    # 其他错误（如值无法转换）同样只回滚该组，异常作为该组的结果返回给调用方
+                    conn.execute("ROLLBACK TO changeset")
+                    results.append(e)
+                conn.execute("RELEASE changeset")
+        return results
+
+    def archive_records(self, cutoff: str, statuses: List[str], write: Callable[[pd.DataFrame], None]) -> int:
+        # 结束日期取预计结束日期，未填写时用申请日期；先写冷分区，成功后在同一事务中删除并登记编号
+        if not self.exists() or not statuses:
+            return 0
+        end_date = (f"COALESCE(NULLIF(substr({quote_identifier('预计结束日期')}, 1, 10), ''), "
+                    f"substr({quote_identifier('申请日期')}, 1, 10))")
+        column_list = ", ".join(quote_identifier(col) for col in self.columns)
+        condition = (f"{quote_identifier('测试进度')} IN ({', '.join('?' for _ in statuses)}) "
+                     f"AND {end_date} < ?")
+        params = list(statuses) + [cutoff]
+        with self.connect() as conn:
+            if conn.execute(f"SELECT 1 FROM {RECORDS_TABLE} WHERE {condition} LIMIT 1", params).fetchone() is None:
+                return 0
+        with self.transaction() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            rows = pd.read_sql_query(
+                f"SELECT rowid AS _rowid, {column_list} FROM {RECORDS_TABLE} WHERE {condition} ORDER BY rowid",
+                conn, params=params
+            )
+            if rows.empty:
+                return 0
+            records = rows.drop(columns="_rowid")
+            write(records)
+            # 先登记编号再删除，修改历史据此把这次删除记为移入冷分区
+            conn.executemany(
+                f"INSERT OR IGNORE INTO {ARCHIVED_KEYS_TABLE} (key) VALUES (?)",
+                ((key,) for key in (key_value(value) for value in records[KEY_COLUMN]) if key is not None)
+            )
+            conn.executemany(f"DELETE FROM {RECORDS_TABLE} WHERE rowid = ?",
+                             ((int(rowid),) for rowid in rows["_rowid"]))
+        return len(records)
+
+    def record_history(self, test_app_number: str) -> pd.DataFrame:
+        if not self.exists():
+            return pd.DataFrame(columns=CHANGE_COLUMNS)
+        with self.connect() as conn:
+            return record_history(conn, str(key_value(test_app_number)), RECORDS_TABLE, self.columns, KEY_COLUMN)
+
+    def frame_as_of(self, ts: str) -> pd.DataFrame:
+        # 从之后最近的快照（或当前数据）开始倒序撤销变更，不必处理全部历史
+        if not self.exists():
+            return pd.DataFrame(columns=self.columns)
+        with self.connect() as conn:
+            return state_as_of(conn, ts, RECORDS_TABLE, self.columns, KEY_COLUMN)
+
+    def snapshot_history(self, min_changes: int) -> Optional[int]:
+        if not self.exists():
+            return None
+        with self.connect() as conn:
+            if changes_since_snapshot(conn) < min_changes:
+                return None
+            # 在一个读事务中读取全表和最新序号，不阻塞写入；之后只用一个很短的写事务保存
+            conn.execute("BEGIN")
+            snapshot = read_snapshot(conn, RECORDS_TABLE, self.columns, KEY_COLUMN)
+            conn.commit()
+            return save_snapshot(conn, *snapshot)
+
+    def migrate_from_excel(self, excel_path: str):
+        """从旧的xlsx文件一次性迁移数据，先写入临时文件再原子替换
+
+        先写入数据再建索引和触发器：旧数据中有重复编号时编号索引退化为普通索引，汇总表等按已写入的数据回填。
+        """
+        df = pd.read_excel(excel_path) if os.path.exists(excel_path) else pd.DataFrame()
+        tmp_path = self.path + ".migrating"
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        target = SQLiteStorage(tmp_path, self.columns)
+        try:
+            with target.connect() as conn:
+                target.create_tables(conn)
+                target._insert_many(conn, df.to_dict('records'))
+                target.create_schema(conn)
+                conn.execute(
+                    "INSERT OR REPLACE INTO meta (key, value) VALUES ('migrated_from', ?)",
+                    (os.path.basename(excel_path),)
+                )
+                conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('generation', 1)")
+            os.replace(tmp_path, self.path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+
+def page_frame(df: pd.DataFrame, offset: int, limit: Optional[int], filters: Optional[Dict[str, List[Any]]] = None,
+               sort_by: Optional[str] = None, ascending: bool = True,
+               ranges: Optional[Ranges] = None) -> Tuple[pd.DataFrame, int]:
+    """在DataFrame上筛选、排序并截取一页，行索引保持为原表中的行号"""
+    for col, values in (filters or {}).items():
+        if values and col in df.columns:
+            df = df[df[col].isin(values)]
+    for col, (start, end) in (ranges or {}).items():
+        if col in df.columns:
+            dates = pd.to_datetime(df[col], errors='coerce').dt.normalize()
+            if start is not None:
+                df = df[dates >= pd.Timestamp(start)]
+                dates = dates[df.index]
+            if end is not None:
+                df = df[dates <= pd.Timestamp(end)]
+    if sort_by and sort_by in df.columns:
+        df = df.sort_values(sort_by, ascending=ascending, kind="stable")
+    end = None if limit is None else offset + limit
+    return df.iloc[offset:end], len(df)
+
+
+def project_frame(df: pd.DataFrame, columns: Optional[List[str]]) -> pd.DataFrame:
+    """只保留columns中存在的列（按columns的顺序），columns为None时原样返回"""
+    if columns is None:
+        return df
+    return df[[col for col in columns if col in df.columns]]
+
+
+def create_storage(backend: str, sqlite_path: str, excel_path: str) -> StorageEngine:
+    """根据配置创建存储引擎"""
+    if backend == "sqlite":
+        return SQLiteStorage(sqlite_path)
+    if backend == "excel":
+        return ExcelStorage(excel_path)
+    raise ValueError(f"不支持的存储引擎: {backend}")
@@ -0,0 +1,66 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, List, Optional, Tuple
+
+from app.core.storage import ChangeSet
+
+
+class WriteQueue:
+    """单一写线程：汇集所有会话的写请求，把短时间窗口内到达的请求合并为一次原子提交
+
+    调用方通过返回的Future等待结果，数据提交成功后才会得到确认。
+    apply_batch接收一组变更，返回每组的结果（受影响的行数或异常）。
+    """
+
+    def __init__(self, apply_batch: Callable[[List[ChangeSet]], List[Any]], window: float, max_batch: int):
+        self.apply_batch = apply_batch
+        self.window = window
+        self.max_batch = max_batch
+        self._queue: "queue.Queue[Tuple[ChangeSet, Future]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def submit(self, changeset: ChangeSet) -> Future:
+        """提交一组变更，返回在提交完成后得到结果的Future"""
+        future: Future = Future()
+        self._ensure_started()
+        self._queue.put((changeset, future))
+        return future
+
+    def _ensure_started(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="data-writer", daemon=True)
+                self._thread.start()
+
+    def _collect(self) -> List[Tuple[ChangeSet, Future]]:
+        # 阻塞等待第一个请求，再在时间窗口内尽量多收集一些
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            try:
+                results = self.apply_batch([changeset for changeset, _ in batch])
+            except Exception as e:
+                # 整批提交失败时通知该批的所有调用方
+                results = [e] * len(batch)
+            for (_, future), result in zip(batch, results):
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
@@ -0,0 +1,66 @@
+# app/pages/bulk_import.py
+import streamlit as st
+from app.core import startup
+from app.core.data_manager import DataManager
+from app.core.storage import DuplicateApplicationError
+from app.core.bulk_import import template_csv
+from config.constants import REQUIRED_FIELDS
+from app import utils
+
+# 等待应用启动时的数据初始化完成
+startup.wait()
+
+st.title("Bulk Import")
+st.markdown(
+    f"""
+    上传 xlsx 或 csv 文件批量导入测试申请，第一行为表头，列名与新测试页面的字段一致。其中必填项如下：
+    :rainbow[{', '.join(REQUIRED_FIELDS)}]
+
+    报价单、测试数据/报告、结算单等附件请在导入后于管理后台补充。
+    """)
+
+st.download_button(
+    label="下载导入模板",
+    data=template_csv(),
+    file_name="import_template.csv",
+    mime="text/csv"
+)
+
+uploaded_file = st.file_uploader("选择导入文件", type=["xlsx", "csv"])
+skip_invalid = st.checkbox("跳过有错误的行，仅导入校验通过的记录", value=True)
+
+if uploaded_file is not None and st.button("开始导入"):
+    with st.spinner("正在校验并导入..."):
+        try:
+            result = DataManager.bulk_import(uploaded_file, uploaded_file.name, skip_invalid)
+        except DuplicateApplicationError:
+            # 校验之后、提交之前其他用户写入了相同编号，整批回滚
+            result = None
+            st.error("导入期间有相同的测试申请单编号被其他用户提交，本次未导入任何记录，请重新导入")
+        except Exception as e:
+            result = None
+            st.error(f"导入失败: {str(e)}")
+
+    if result is not None:
+        errors = result["errors"]
+        col_total, col_imported, col_failed = st.columns(3)
+        col_total.metric("数据行数", result["total"])
+        col_imported.metric("已导入", result["imported"])
+        col_failed.metric("有错误的行", errors["行号"].nunique())
+
+        if result["imported"]:
+            utils.show_success_message(f"成功导入 {result['imported']} 条记录！")
+        elif result["total"] == 0:
+            st.warning("文件中没有数据行")
+        else:
+            st.warning("没有导入任何记录")
+
+        if not errors.empty:
+            st.subheader("错误明细")
+            st.dataframe(errors, use_container_width=True, hide_index=True)
+            st.download_button(
+                label="下载错误明细",
+                data=errors.to_csv(index=False).encode("utf-8-sig"),
+                file_name="import_errors.csv",
+                mime="text/csv"
+            )
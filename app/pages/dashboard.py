@@ -3,105 +3,86 @@ import streamlit as st
 import pandas as pd
 import plotly.express as px
 from datetime import datetime
+from app.core import startup
 from app.core.data_manager import DataManager
+from app.core.downsample import prepare_chart_data
+from app.core.storage import page_frame
+from app.core.metrics import checkpoint
+from config.constants import DETAIL_PAGE_SIZES, PIVOT_DISPLAY_ROWS
 
+# 图表类型 -> (绘图函数, prepare_chart_data使用的类型)
+XY_CHARTS = {
+    "柱状图": (px.bar, "bar"),
+    "折线图": (px.line, "line"),
+    "散点图": (px.scatter, "scatter"),
+    "面积图": (px.area, "area"),
+}
+# 透视分析的聚合方式和日期分桶 -> 显示名称
+AGGREGATION_LABELS = {"sum": "求和", "mean": "平均值", "count": "计数", "min": "最小值", "max": "最大值"}
+TIME_BUCKET_LABELS = {None: "不分桶", "day": "按日", "week": "按周", "month": "按月"}
 
-def load_data():
-    """读取数据"""
+
+def columns_by_type():
+    """按列类型配置把列分为 (数值列, 日期列, 分类列)，只读取表头，不加载数据"""
+    schema = DataManager.schema()
+    numeric_columns = [col for col, kind in schema.items() if kind in ("int", "float")]
+    date_columns = [col for col, kind in schema.items() if kind == "date"]
+    categorical_columns = [col for col, kind in schema.items() if kind in ("text", "category")]
+    return numeric_columns, date_columns, categorical_columns
+
+
+def load_filtered(filters, archive=None, columns=None):
+    """读取按 (部门, 进度, 日期范围) 筛选后的明细数据，只读取columns中的列，结果按数据版本和筛选条件缓存"""
     try:
-        return DataManager.load_data()
+        return DataManager.load_filtered(*filters, archive, columns)
     except Exception as e:
         st.error(f"读取数据文件时出错: {str(e)}")
-        return []
-
-
-def preprocess_data(data):
-    """预处理数据，转换日期列"""
-    if not data:
         return pd.DataFrame()
 
-    df = pd.DataFrame(data)
-    date_columns = ["申请日期", "送样日期", "测试开始日期", "预计结束日期", "出厂日期"]
-    for col in date_columns:
-        if col in df.columns:
-            df[col] = pd.to_datetime(df[col], errors='coerce')
-    return df
-
-
-# 主页面
-st.set_page_config(page_title="数据分析看板", layout="wide")
-st.title("Summary")
-
-# 加载数据
-raw_data = load_data()
-df = preprocess_data(raw_data)
 
-if df.empty:
-    st.info("暂无数据，请先添加测试项目数据")
-else:
-    # 侧边栏筛选器
-    st.sidebar.header("筛选器")
+def load_detail_page(filters, archive, page, page_size):
+    """读取明细表的一页：只看热数据时筛选和分页由存储引擎完成，包含归档时在筛选结果上分页"""
+    departments, progress, date_range = filters
+    try:
+        if archive is None:
+            ranges = {"申请日期": tuple(date_range)} if date_range and len(date_range) == 2 else None
+            return DataManager.load_page(page, page_size, {"申请部门": departments, "测试进度": progress},
+                                         ranges=ranges)
+        return page_frame(load_filtered(filters, archive), (page - 1) * page_size, page_size)
+    except Exception as e:
+        st.error(f"读取数据文件时出错: {str(e)}")
+        return pd.DataFrame(), 0
 
-    # 按申请部门筛选
-    departments = df["申请部门"].dropna().unique().tolist() if "申请部门" in df.columns else []
-    selected_departments = st.sidebar.multiselect("申请部门", departments, default=departments)
 
-    # 按测试进度筛选
-    progress_options = df["测试进度"].dropna().unique().tolist() if "测试进度" in df.columns else []
-    selected_progress = st.sidebar.multiselect("测试进度", progress_options, default=progress_options)
+def load_query(filters, archive=None, **query):
+    """分组聚合查询，结果按数据版本、筛选条件和查询参数缓存，参数见DataManager.query"""
+    try:
+        return DataManager.query(filters=filters, archive=archive, **query)
+    except Exception as e:
+        st.error(f"查询数据时出错: {str(e)}")
+        return pd.DataFrame()
 
-    # 按日期范围筛选
-    if "申请日期" in df.columns:
-        min_date = df["申请日期"].min()
-        max_date = df["申请日期"].max()
-        if pd.notna(min_date) and pd.notna(max_date):
-            date_range = st.sidebar.date_input(
-                "申请日期范围",
-                value=(min_date.date(), max_date.date()),
-                min_value=min_date.date(),
-                max_value=max_date.date()
-            )
-        else:
-            date_range = None
-    else:
-        date_range = None
 
-    # 应用筛选器
-    filtered_df = df.copy()
-    if selected_departments:
-        filtered_df = filtered_df[filtered_df["申请部门"].isin(selected_departments)]
-    if selected_progress:
-        filtered_df = filtered_df[filtered_df["测试进度"].isin(selected_progress)]
-    if date_range and len(date_range) == 2 and "申请日期" in filtered_df.columns:
-        start_date, end_date = date_range
-        filtered_df = filtered_df[
-            (filtered_df["申请日期"] >= pd.Timestamp(start_date)) &
-            (filtered_df["申请日期"] <= pd.Timestamp(end_date))
-            ]
+def load_rollup(archive=None):
+    """读取按 (申请部门, 测试进度, 申请日期) 预先汇总的统计数据，archive为需要包含的冷分区"""
+    try:
+        return DataManager.load_rollup(archive)
+    except Exception as e:
+        st.error(f"读取汇总数据时出错: {str(e)}")
+        return pd.DataFrame()
 
-    # 显示筛选后的数据概览
-    st.subheader("数据概览")
-    col1, col2, col3, col4 = st.columns(4)
-    col1.metric("总项目数", len(filtered_df))
-    col2.metric("进行中项目",
-                len(filtered_df[filtered_df["测试进度"] == "进行中"]) if "测试进度" in filtered_df.columns else 0)
-    col3.metric("已完成项目",
-                len(filtered_df[filtered_df["测试进度"] == "已完成"]) if "测试进度" in filtered_df.columns else 0)
-    col4.metric("总预计费用", f"¥{filtered_df['预计费用'].sum():,.2f}" if "预计费用" in filtered_df.columns else "N/A")
-
-    # 可视化配置
-    st.subheader("数据可视化")
 
+@st.fragment
+def custom_chart(filters, archive):
+    """自定义图表，作为独立的片段运行：修改图表类型、坐标轴或颜色时只重新运行这一部分"""
     # 图表类型选择
     chart_type = st.selectbox(
         "选择图表类型",
         ["柱状图", "折线图", "饼图", "散点图", "面积图"]
     )
 
-    # X轴和Y轴选择（根据图表类型动态调整）
-    numeric_columns = filtered_df.select_dtypes(include=['number']).columns.tolist()
-    date_columns = filtered_df.select_dtypes(include=['datetime']).columns.tolist()
-    categorical_columns = filtered_df.select_dtypes(include=['object']).columns.tolist()
+    # X轴和Y轴选择（根据图表类型动态调整），可选的列由表头和列类型配置得出
+    numeric_columns, date_columns, categorical_columns = columns_by_type()
 
     all_columns = numeric_columns + date_columns + categorical_columns
 
@@ -113,63 +94,186 @@ else:
         col_x = st.selectbox("选择分类维度", categorical_columns, index=0 if categorical_columns else 0)
         col_y = st.selectbox("选择数值维度", numeric_columns, index=0 if numeric_columns else 0)
 
-    # 生成图表
-    if chart_type in ["柱状图", "折线图", "散点图", "面积图"] and col_x and col_y:
-        if chart_type == "柱状图":
-            if color_col != "无":
-                fig = px.bar(filtered_df, x=col_x, y=col_y, color=color_col, title=f"{col_y} 按 {col_x} 分组")
-            else:
-                fig = px.bar(filtered_df, x=col_x, y=col_y, title=f"{col_y} 按 {col_x} 分组")
-        elif chart_type == "折线图":
-            if color_col != "无":
-                fig = px.line(filtered_df, x=col_x, y=col_y, color=color_col, title=f"{col_y} 趋势图")
-            else:
-                fig = px.line(filtered_df, x=col_x, y=col_y, title=f"{col_y} 趋势图")
-        elif chart_type == "散点图":
-            if color_col != "无":
-                fig = px.scatter(filtered_df, x=col_x, y=col_y, color=color_col, title=f"{col_y} vs {col_x}")
-            else:
-                fig = px.scatter(filtered_df, x=col_x, y=col_y, title=f"{col_y} vs {col_x}")
-        elif chart_type == "面积图":
-            if color_col != "无":
-                fig = px.area(filtered_df, x=col_x, y=col_y, color=color_col, title=f"{col_y} 面积图")
-            else:
-                fig = px.area(filtered_df, x=col_x, y=col_y, title=f"{col_y} 面积图")
-
+    # 生成图表：只把汇总或降采样后的点交给Plotly，避免把全部明细行发送到浏览器
+    if chart_type in XY_CHARTS and col_x and col_y:
+        plot, kind = XY_CHARTS[chart_type]
+        titles = {
+            "柱状图": f"{col_y} 按 {col_x} 分组",
+            "折线图": f"{col_y} 趋势图",
+            "散点图": f"{col_y} vs {col_x}",
+            "面积图": f"{col_y} 面积图",
+        }
+        color = None if color_col == "无" else color_col
+        # 只读取图表用到的列
+        filtered_df = load_filtered(filters, archive, [col_x, col_y, color])
+        chart_df, reduced_note = prepare_chart_data(filtered_df, kind, col_x, col_y, color)
+        title = titles[chart_type] + ("（已汇总/降采样）" if reduced_note else "")
+        fig = plot(chart_df, x=col_x, y=col_y, color=color, title=title)
         st.plotly_chart(fig, use_container_width=True)
+        if reduced_note:
+            st.caption(reduced_note)
 
     elif chart_type == "饼图" and col_x and col_y:
-        grouped_data = filtered_df.groupby(col_x)[col_y].sum().reset_index()
+        grouped_data = load_query(filters, archive, dimensions=[col_x], measures=[col_y], aggregation="sum")
         fig = px.pie(grouped_data, values=col_y, names=col_x, title=f"{col_y} 按 {col_x} 分布")
         st.plotly_chart(fig, use_container_width=True)
 
+
+@st.fragment
+def pivot_analysis(filters, archive):
+    """透视分析，作为独立的片段运行：按所选维度和度量分组聚合，结果在各会话间共享缓存"""
+    numeric_columns, date_columns, categorical_columns = columns_by_type()
+    dimension_columns = date_columns + categorical_columns
+
+    col1, col2 = st.columns(2)
+    rows = col1.multiselect("行维度", dimension_columns, key="pivot_rows")
+    columns = col2.multiselect("列维度", [col for col in dimension_columns if col not in rows], key="pivot_columns")
+    measures = col1.multiselect("度量（不选时统计记录数）", numeric_columns, key="pivot_measures")
+    aggregation = col2.selectbox("聚合方式", list(AGGREGATION_LABELS), format_func=AGGREGATION_LABELS.get)
+    time_bucket = col1.selectbox("日期维度分桶", list(TIME_BUCKET_LABELS), format_func=TIME_BUCKET_LABELS.get)
+    top_n = col2.number_input("只保留前N项（按第一个维度，0为不限）", min_value=0, step=1, value=0)
+    if not rows and not columns:
+        st.caption("请选择至少一个行维度或列维度")
+        return
+
+    result = load_query(filters, archive, dimensions=rows, measures=measures, aggregation=aggregation,
+                        time_bucket=time_bucket, top_n=int(top_n), pivot_columns=columns)
+    if len(result) > PIVOT_DISPLAY_ROWS:
+        st.caption(f"共 {len(result)} 行，显示前 {PIVOT_DISPLAY_ROWS} 行")
+    st.dataframe(result.head(PIVOT_DISPLAY_ROWS), use_container_width=True, hide_index=True)
+
+
+@st.fragment
+def detail_table(filters, archive):
+    """明细表，作为独立的片段运行：翻页或修改每页行数时只重新运行这一部分，每次只发送当前页"""
+    page_size = st.selectbox("每页行数", DETAIL_PAGE_SIZES)
+    page = st.session_state.get("detail_page", 1)
+    page_df, total = load_detail_page(filters, archive, page, page_size)
+    page_count = max(1, (total - 1) // page_size + 1)
+    if page > page_count:
+        page = page_count
+        st.session_state["detail_page"] = page
+        page_df, total = load_detail_page(filters, archive, page, page_size)
+    st.dataframe(page_df, use_container_width=True)
+    st.number_input(f"页码（共 {page_count} 页，{total} 条记录）", min_value=1, max_value=page_count,
+                    step=1, key="detail_page")
+
+
+# 主页面
+st.set_page_config(page_title="数据分析看板", layout="wide")
+startup.wait()
+st.title("Summary")
+
+# 加载汇总数据：筛选器、指标和固定统计图表都由汇总表得出，不需要扫描全表
+rollup = load_rollup()
+archive_range = DataManager.archive_date_range()
+checkpoint("dashboard.load_rollup")
+
+if rollup.empty and archive_range is None:
+    st.info("暂无数据，请先添加测试项目数据")
+else:
+    # 侧边栏筛选器
+    st.sidebar.header("筛选器")
+
+    # 默认只统计热数据；包含归档时按所选日期范围只读取对应年份的冷分区
+    include_archive = st.sidebar.checkbox(
+        "包含归档数据", value=rollup.empty, disabled=archive_range is None,
+        help="已完成或取消较久的记录已移入按年份划分的归档分区"
+    )
+
+    # 按日期范围筛选
+    min_date = rollup["申请日期"].min()
+    max_date = rollup["申请日期"].max()
+    if include_archive and archive_range is not None:
+        archive_start, archive_end = (pd.Timestamp(day) for day in archive_range)
+        min_date = archive_start if pd.isna(min_date) else min(min_date, archive_start)
+        max_date = archive_end if pd.isna(max_date) else max(max_date, archive_end)
+    if pd.notna(min_date) and pd.notna(max_date):
+        date_range = st.sidebar.date_input(
+            "申请日期范围",
+            value=(min_date.date(), max_date.date()),
+            min_value=min_date.date(),
+            max_value=max_date.date()
+        )
+    else:
+        date_range = None
+
+    # 需要的冷分区：日期范围覆盖到的年份
+    archive = None
+    if include_archive:
+        if date_range and len(date_range) == 2:
+            archive = DataManager.archive_partitions(*date_range)
+        else:
+            archive = DataManager.archive_partitions()
+        rollup = load_rollup(archive)
+
+    # 按申请部门筛选（部门和进度的选项取自已读取的数据，包含归档时才会出现已归档的状态）
+    departments = rollup["申请部门"].dropna().unique().tolist()
+    selected_departments = st.sidebar.multiselect("申请部门", departments, default=departments)
+
+    # 按测试进度筛选
+    progress_options = rollup["测试进度"].dropna().unique().tolist()
+    selected_progress = st.sidebar.multiselect("测试进度", progress_options, default=progress_options)
+
+    # 应用筛选器
+    filters = (selected_departments, selected_progress, date_range)
+    filtered_rollup = DataManager.filter_frame(rollup, *filters)
+
+    # 显示筛选后的数据概览
+    st.subheader("数据概览")
+    progress_totals = filtered_rollup.groupby("测试进度")["项目数"].sum()
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("总项目数", int(filtered_rollup["项目数"].sum()))
+    col2.metric("进行中项目", int(progress_totals.get("进行中", 0)))
+    col3.metric("已完成项目", int(progress_totals.get("已完成", 0)))
+    col4.metric("总预计费用", f"¥{filtered_rollup['预计费用'].sum():,.2f}")
+    checkpoint("dashboard.filters_and_metrics")
+
+    # 可视化配置：自定义图表和明细表需要逐行数据，筛选结果按数据版本和筛选条件缓存，由各片段共用
+    st.subheader("数据可视化")
+    custom_chart(filters, archive)
+    checkpoint("dashboard.custom_chart")
+
+    # 透视分析
+    st.subheader("透视分析")
+    pivot_analysis(filters, archive)
+    checkpoint("dashboard.pivot_analysis")
+
     # 统计分析
     st.subheader("统计分析")
 
     # 测试进度分布
-    if "测试进度" in filtered_df.columns:
-        st.write("### 测试进度分布")
-        progress_counts = filtered_df["测试进度"].value_counts()
-        fig_progress = px.pie(values=progress_counts.values, names=progress_counts.index,
-                              title="测试进度分布")
-        st.plotly_chart(fig_progress, use_container_width=True)
-
-    # 预计费用趋势（如果有申请日期）
-    if "申请日期" in filtered_df.columns and "预计费用" in filtered_df.columns:
-        st.write("### 预计费用趋势")
-        cost_trend = filtered_df.groupby(filtered_df["申请日期"].dt.date)["预计费用"].sum().reset_index()
-        fig_cost = px.line(cost_trend, x="申请日期", y="预计费用", title="预计费用时间趋势")
-        st.plotly_chart(fig_cost, use_container_width=True)
+    st.write("### 测试进度分布")
+    progress_counts = progress_totals[progress_totals > 0].sort_values(ascending=False)
+    fig_progress = px.pie(values=progress_counts.values, names=progress_counts.index,
+                          title="测试进度分布")
+    st.plotly_chart(fig_progress, use_container_width=True)
+
+    # 预计费用趋势
+    st.write("### 预计费用趋势")
+    cost_trend = filtered_rollup.groupby(filtered_rollup["申请日期"].dt.date)["预计费用"].sum().reset_index()
+    fig_cost = px.line(cost_trend, x="申请日期", y="预计费用", title="预计费用时间趋势")
+    st.plotly_chart(fig_cost, use_container_width=True)
 
     # 申请部门项目数量
-    if "申请部门" in filtered_df.columns:
-        st.write("### 各部门项目数量")
-        dept_counts = filtered_df["申请部门"].value_counts()
-        fig_dept = px.bar(x=dept_counts.index, y=dept_counts.values,
-                          labels={'x': '申请部门', 'y': '项目数量'},
-                          title="各部门项目数量")
-        st.plotly_chart(fig_dept, use_container_width=True)
-
-    # 数据表格
+    st.write("### 各部门项目数量")
+    dept_counts = filtered_rollup.groupby("申请部门")["项目数"].sum().sort_values(ascending=False)
+    fig_dept = px.bar(x=dept_counts.index, y=dept_counts.values,
+                      labels={'x': '申请部门', 'y': '项目数量'},
+                      title="各部门项目数量")
+    st.plotly_chart(fig_dept, use_container_width=True)
+    checkpoint("dashboard.summary_charts")
+
+    # 数据表格：分页显示
     st.subheader("详细数据")
-    st.dataframe(filtered_df, use_container_width=True)
+    detail_table(filters, archive)
+    checkpoint("dashboard.detail_table")
+
+    with st.expander("数据内存占用"):
+        # 只报告已缓存的完整数据，本页按需读取列，不会为此加载全表
+        report = DataManager.memory_report()
+        if report.empty:
+            st.caption("完整数据尚未载入缓存")
+        else:
+            st.caption(f"合计 {report['内存占用(KB)'].sum():,.1f} KB")
+            st.dataframe(report, use_container_width=True, hide_index=True)
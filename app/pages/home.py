@@ -10,6 +10,7 @@ st.markdown("""
         <p>本系统用于测试数据管理，请根据提示进行操作。</p>
         <ul>
             <li>📝 <strong>新测试</strong> - 创建新的测试申请</li>
+            <li>📥 <strong>批量导入</strong> - 从Excel/CSV文件批量导入测试申请</li>
             <li>⚙️ <strong>管理后台</strong> - 编辑和管理现有数据</li>
             <li>📊 <strong>结果汇总</strong> - 数据分析和可视化</li>
         </ul>
@@ -2,9 +2,20 @@
 import streamlit as st
 import pandas as pd
 import io
+import os
+from datetime import datetime, date
+from app.core import startup
 from app.core.data_manager import DataManager
 from app.core.file_manager import FileManager
-from config.constants import DEPARTMENTS, TEST_PROGRESS
+from app.core.storage import DuplicateApplicationError
+from app.core.schema import decategorize
+from app.core.exporter import EXPORT_FORMATS, available_formats
+from app.core.metrics import checkpoint
+from app.core.storage import page_frame
+from app.core.schedule import DUE_COLUMN
+from config.constants import (DEPARTMENTS, TEST_PROGRESS, ATTACHMENT_PAGE_SIZE, EXCEL_FORMAT, MANAGE_PAGE_SIZES,
+                              SCHEDULE_DUE_SOON_DAYS, SCHEDULE_PANEL_LIMIT, SCHEDULE_COLUMNS, HISTORY_AS_OF_LIMIT)
+from app import utils
 
 def show_success_message(message):
     """显示成功消息"""
@@ -16,52 +27,146 @@ def show_error_message(message):
     st.error(message)
     st.snow()
 
-def search_data(data, search_term):
-    """搜索数据"""
-    if not search_term:
-        return data
+def compute_changes(original_df, edited_df):
+    """对比编辑前后的表格，按测试申请单编号计算新增、修改和删除的记录"""
+    key = "测试申请单编号"
+    columns = [col for col in original_df.columns if col != '记录ID']
 
-    filtered_data = []
-    search_term = search_term.lower()
+    # 记录ID为空的行是在编辑器中新增的
+    new_rows = edited_df[edited_df['记录ID'].isna()]
+    inserted = new_rows[columns].to_dict('records')
 
-    for record in data:
-        for value in record.values():
-            if isinstance(value, str) and search_term in value.lower():
-                filtered_data.append(record)
-                break
-            elif isinstance(value, (int, float)) and search_term in str(value):
-                filtered_data.append(record)
-                break
+    kept = edited_df[edited_df['记录ID'].notna()].set_index('记录ID')
+    kept.index = kept.index.astype(int)
+    original = original_df.set_index('记录ID')
 
-    return filtered_data
+    deleted_ids = original.index.difference(kept.index)
+    deleted = [original.at[i, key] for i in deleted_ids if pd.notna(original.at[i, key])]
 
-# 初始化数据
-DataManager.init_database()
+    before = original.loc[kept.index, columns].astype(object)
+    after = kept[columns].astype(object)
+    # 与缺失值比较的结果为NA，视为有变化；两边都缺失的视为未变化
+    changed_mask = (before != after).fillna(True).astype(bool) & ~(before.isna() & after.isna())
+
+    updated = {}
+    skipped = []
+    for record_id in changed_mask.index[changed_mask.any(axis=1)]:
+        old_key = original.at[record_id, key]
+        if pd.isna(old_key):
+            skipped.append(record_id)
+            continue
+        changed_columns = changed_mask.columns[changed_mask.loc[record_id]]
+        updated[old_key] = after.loc[record_id, changed_columns].to_dict()
+
+    return inserted, updated, deleted, skipped
+
+@st.fragment
+def build_export(fmt, search_term, filters, include_archive):
+    """按块从存储读取并生成导出文件的内容，导出范围与当前的检索和筛选条件一致"""
+    buffer = io.BytesIO()
+    DataManager.export(buffer, fmt, search_term, filters, include_archive)
+    return buffer.getvalue()
+
+def schedule_panel():
+    """进度提醒：已逾期和即将到期的未完成申请单，按计划结束日期索引只读取需要显示的行"""
+    with st.expander("进度提醒", expanded=True):
+        days = st.number_input("提醒天数", min_value=0, max_value=365, value=SCHEDULE_DUE_SOON_DAYS, step=1)
+        overdue, overdue_total = DataManager.overdue(limit=SCHEDULE_PANEL_LIMIT)
+        due_soon, due_soon_total = DataManager.due_within(int(days), limit=SCHEDULE_PANEL_LIMIT)
+        tab_overdue, tab_due_soon = st.tabs([f"已逾期（{overdue_total}）", f"{int(days)}天内到期（{due_soon_total}）"])
+        for tab, rows, total in [(tab_overdue, overdue, overdue_total), (tab_due_soon, due_soon, due_soon_total)]:
+            with tab:
+                if rows.empty:
+                    st.caption("没有符合条件的申请单")
+                    continue
+                if total > len(rows):
+                    st.caption(f"共 {total} 条，显示计划结束日期最早的 {len(rows)} 条")
+                st.dataframe(
+                    decategorize(rows[[DUE_COLUMN] + SCHEDULE_COLUMNS]),
+                    column_config={DUE_COLUMN: st.column_config.DateColumn(DUE_COLUMN)},
+                    use_container_width=True, hide_index=True
+                )
+
+@st.fragment
+def history_panel():
+    """修改历史：单条申请单的字段变更记录，以及某一天结束时的全部数据"""
+    with st.expander("修改历史"):
+        if not DataManager.history_supported():
+            st.caption("当前存储引擎不记录修改历史")
+            return
+        tab_record, tab_as_of = st.tabs(["单条记录", "按日期查看"])
+        with tab_record:
+            test_app_number = st.text_input("测试申请单编号", key="history_key")
+            if test_app_number.strip():
+                history = DataManager.record_history(test_app_number)
+                if history.empty:
+                    st.caption("没有该编号的修改记录")
+                else:
+                    st.dataframe(history, use_container_width=True, hide_index=True)
+        with tab_as_of:
+            as_of = st.date_input("日期", value=None, max_value=date.today(), key="history_as_of",
+                                  help="显示该日结束时的全部未归档记录")
+            if as_of is not None:
+                frame = DataManager.load_as_of(as_of)
+                if len(frame) > HISTORY_AS_OF_LIMIT:
+                    st.caption(f"共 {len(frame)} 条，显示前 {HISTORY_AS_OF_LIMIT} 条")
+                st.dataframe(decategorize(frame.head(HISTORY_AS_OF_LIMIT)), use_container_width=True, hide_index=True)
+
+# 等待应用启动时的数据初始化完成
+startup.wait()
 st.title("Update Application")
 
-# 加载数据
-data = DataManager.load_data()
+schedule_panel()
+checkpoint("manage.schedule_panel")
+history_panel()
+checkpoint("manage.history_panel")
+
+# 在显示数据前添加搜索框，按检索索引加载数据
+search_term = st.text_input("搜索数据", "", help="多个关键词用空格分隔；xxx* 为前缀匹配；供应商:xxx 为按字段查询")
 
-# 在显示数据前添加搜索框
-search_term = st.text_input("搜索数据", "")
+# 筛选、排序和分页条件，由存储层只取出当前页
+col_dept, col_progress = st.columns(2)
+filters = {
+    "申请部门": col_dept.multiselect("申请部门", DEPARTMENTS),
+    "测试进度": col_progress.multiselect("测试进度", TEST_PROGRESS),
+}
+col_size, col_sort, col_order = st.columns(3)
+page_size = col_size.selectbox("每页行数", MANAGE_PAGE_SIZES)
+sort_choice = col_sort.selectbox("排序字段", ["默认顺序"] + EXCEL_FORMAT)
+sort_by = None if sort_choice == "默认顺序" else sort_choice
+ascending = col_order.radio("排序方式", ["升序", "降序"], horizontal=True) == "升序"
+# 已归档的记录保存在冷分区中，只在勾选时读取，且只能查看和导出
+include_archive = st.checkbox("包含归档数据（只读）", disabled=not DataManager.archive_partitions(),
+                              help="已完成或取消较久的记录已移入按年份划分的归档分区")
+
+page = st.session_state.get("manage_page", 1)
+df, total = DataManager.load_page(page, page_size, filters, sort_by, ascending, search_term)
+page_count = max(1, (total - 1) // page_size + 1)
+if page > page_count:
+    page = page_count
+    st.session_state["manage_page"] = page
+    df, total = DataManager.load_page(page, page_size, filters, sort_by, ascending, search_term)
 if search_term:
-    data = search_data(data, search_term)
-    st.info(f"找到 {len(data)} 条匹配记录")
+    st.info(f"找到 {total} 条匹配记录")
+checkpoint("manage.load_page")
 
-# 使用data_editor进行数据管理
-if data:
-    df = pd.DataFrame(data)
+# 使用data_editor进行数据管理，每次只编辑并提交当前页
+if not df.empty:
 
-    # 转换日期列格式
+    # 转换日期列格式，枚举列转回普通列以便编辑
     df = DataManager.convert_date_columns(df)
+    df = decategorize(df)
 
     # 添加索引列以便识别记录
     df_with_index = df.reset_index()
     df_with_index.rename(columns={'index': '记录ID'}, inplace=True)
 
     st.subheader("编辑数据")
+    # 翻页或改变条件时使用新的编辑器状态，避免把上一页的编辑带到本页
+    editor_key = f"editor_{search_term}_{filters}_{page_size}_{sort_by}_{ascending}_{page}"
     edited_df = st.data_editor(
         df_with_index,
+        key=editor_key,
         use_container_width=True,
         num_rows="dynamic",
         hide_index=True,
@@ -81,66 +186,108 @@ if data:
             "出厂日期": st.column_config.DateColumn("出厂日期"),
         }
     )
+    st.number_input(f"页码（共 {page_count} 页，{total} 条记录）", min_value=1, max_value=page_count,
+                    step=1, key="manage_page")
+    checkpoint("manage.editor")
 
-    # 显示附件信息
+    # 显示附件信息：只列出元数据，点击"准备下载"后才读取对应文件
     st.subheader("附件信息")
-    for idx, record in enumerate(data):
-        # 获取测试申请单编号
-        test_application_number = record.get("测试申请单编号")
-        if test_application_number:
-            # 检查该测试申请单是否有附件
-            attachment_files = FileManager.get_attachment_files(test_application_number)
-
-            if attachment_files:
-                with st.expander(f"记录 {idx} ({test_application_number}) 的附件"):
-                    for filename in attachment_files:
-                        file_data = FileManager.download_attachment(test_application_number, filename)
-                        if file_data:
-                            st.download_button(
-                                label=f"下载附件: {filename}",
-                                data=file_data,
-                                file_name=filename,
-                                key=f"download_{idx}_{filename}"
-                            )
-                        else:
-                            st.warning(f"附件: {filename} (文件未找到)")
+    with_attachments = FileManager.get_applications_with_attachments()
+    attachment_records = [
+        (idx, number) for idx, number in zip(df.index, df["测试申请单编号"].tolist())
+        if pd.notna(number) and str(number) in with_attachments
+    ]
 
-    # 保存更改
-    if st.button("保存更改"):
-        # 移除索引列
-        updated_df = edited_df.drop(columns=['记录ID'])
-
-        # 将日期对象转换回字符串格式以便保存
-        date_columns = ["申请日期", "送样日期", "测试开始日期", "预计结束日期", "出厂日期"]
-        for col in date_columns:
-            if col in updated_df.columns:
-                updated_df[col] = updated_df[col].apply(
-                    lambda x: x.strftime('%Y-%m-%d') if pd.notna(x) else ""
-                )
+    if attachment_records:
+        attachment_page_count = (len(attachment_records) - 1) // ATTACHMENT_PAGE_SIZE + 1
+        attachment_page = st.number_input("附件列表页码", min_value=1, max_value=attachment_page_count, value=1,
+                                          step=1, help=f"共 {len(attachment_records)} 条记录有附件，"
+                                                       f"{attachment_page_count} 页")
+        page_start = (attachment_page - 1) * ATTACHMENT_PAGE_SIZE
+        page_records = attachment_records[page_start:page_start + ATTACHMENT_PAGE_SIZE]
+        page_attachments = FileManager.list_attachments_bulk(str(number) for _, number in page_records)
+
+        for idx, test_application_number in page_records:
+            attachments = page_attachments.get(str(test_application_number), [])
+            with st.expander(f"记录 {idx} ({test_application_number}) 的附件（{len(attachments)} 个）"):
+                for attachment in attachments:
+                    filename = attachment["name"]
+                    modified = datetime.fromtimestamp(attachment["mtime"]).strftime('%Y-%m-%d %H:%M')
+                    col_name, col_action = st.columns([3, 1])
+                    col_name.write(f"{filename}（{utils.format_file_size(attachment['size'])}，{modified}）")
+                    # 后台尚未保存完成或保存失败的附件不能下载
+                    if attachment["status"] == "pending":
+                        col_action.info("处理中")
+                        continue
+                    if attachment["status"] == "failed":
+                        col_action.error(f"保存失败：{attachment['error'] or '未知错误'}")
+                        continue
+                    if attachment["preview"] and col_name.checkbox("预览", key=f"preview_{idx}_{filename}"):
+                        utils.show_attachment_preview(
+                            FileManager.read_preview(test_application_number, filename), col_name)
+                    file_path = FileManager.resolve_attachment_path(test_application_number, filename)
+                    if not file_path or not os.path.isfile(file_path):
+                        col_action.warning("文件未找到")
+                        continue
+                    # 传入函数而不是文件内容：点击下载时才读取文件，页面重新运行时不读取附件
+                    col_action.download_button(
+                        label="下载",
+                        data=lambda number=test_application_number, name=filename:
+                            FileManager.download_attachment(number, name) or b"",
+                        file_name=filename,
+                        key=f"download_{idx}_{filename}"
+                    )
 
-        updated_data = updated_df.to_dict('records')
-        DataManager.save_data(updated_data)
-        show_success_message("数据已保存")
-        st.rerun()
+    checkpoint("manage.attachments")
+
+    # 保存更改
+    if st.button("保存本页更改"):
+        # 只提交本页中发生变化的行，日期由存储层统一格式化
+        inserted, updated, deleted, skipped = compute_changes(df_with_index, edited_df)
+        if skipped:
+            st.warning(f"记录 {', '.join(str(i) for i in skipped)} 缺少测试申请单编号，无法保存修改")
+        if inserted or updated or deleted:
+            requested_count = len(inserted) + len(updated) + len(deleted)
+            try:
+                affected = DataManager.apply_changes(inserted=inserted, updated=updated, deleted=deleted)
+            except DuplicateApplicationError:
+                show_error_message("保存失败：测试申请单编号与已有记录重复，所有更改均未写入")
+            else:
+                if affected < requested_count:
+                    # 其他会话可能已修改或删除了这些记录，不刷新页面，保留提示
+                    st.warning(f"已保存 {affected} 条，另有 {requested_count - affected} 条未匹配到记录"
+                               f"（可能已被修改编号或删除），请刷新后核对")
+                else:
+                    show_success_message(f"数据已保存（新增 {len(inserted)} 条，修改 {len(updated)} 条，删除 {len(deleted)} 条）")
+                    st.rerun()
+        elif not skipped:
+            st.info("没有需要保存的更改")
 
 else:
     st.info("暂无测试数据")
 
+if include_archive:
+    st.subheader("归档数据")
+    archived, archived_total = page_frame(DataManager.search_archive(search_term), 0, None, filters,
+                                          sort_by, ascending)
+    archive_page_count = max(1, (archived_total - 1) // page_size + 1)
+    archive_page = st.number_input(f"归档数据页码（共 {archive_page_count} 页，{archived_total} 条记录）",
+                                   min_value=1, max_value=archive_page_count, value=1, step=1)
+    start = (archive_page - 1) * page_size
+    st.dataframe(archived.iloc[start:start + page_size], use_container_width=True, hide_index=True)
+    total += archived_total
+    checkpoint("manage.archive")
+
 # 导出数据功能
 st.subheader("数据导出")
 
-if st.button("导出为Excel"):
-    if data:
-        df = pd.DataFrame(data)
-        # 创建字节流缓冲区
-        excel_buffer = io.BytesIO()
-        # 导出为Excel格式
-        df.to_excel(excel_buffer, index=False, engine='openpyxl')
-        excel_buffer.seek(0)
-
-        st.download_button(
-            label="下载Excel文件",
-            data=excel_buffer,
-            file_name="test_data.xlsx",
-            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-        )
+export_format = st.selectbox("导出格式", available_formats(), format_func=lambda fmt: EXPORT_FORMATS[fmt][0])
+export_label, export_extension, export_mime = EXPORT_FORMATS[export_format]
+# 传入函数而不是文件内容：点击时才生成导出文件，页面重新运行时不生成也不读取
+st.download_button(
+    label=f"导出{export_label}文件",
+    data=lambda: build_export(export_format, search_term, filters, include_archive),
+    file_name=f"test_data.{export_extension}",
+    mime=export_mime,
+    disabled=not total
+)
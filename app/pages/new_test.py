@@ -1,14 +1,15 @@
 # app/pages/new_test.py
 import streamlit as st
-import pandas as pd
-from datetime import datetime
+import os
+from app.core import startup
 from app.core.data_manager import DataManager
 from app.core.file_manager import FileManager
+from app.core.storage import DuplicateApplicationError
 from config.constants import DEPARTMENTS, TEST_PROGRESS
 from app import utils
 
-# 初始化数据
-DataManager.init_database()
+# 等待应用启动时的数据初始化完成
+startup.wait()
 
 st.title("New Application")
 st.markdown(
@@ -118,27 +119,34 @@ with st.form("new_test"):
                         "结算单": None
                     }
 
-                    # 保存记录到Excel
-                    data = DataManager.load_data()
-                    data.append(new_record)
-
-                    # 保存上传的文件
+                    # 上传的文件交给后台保存，记录中先写入附件路径，附件在处理完成前为"处理中"状态
                     if quote:
-                        file_path = FileManager.save_uploaded_file(quote, test_application, quote.name)
+                        file_path, _ = FileManager.submit_uploaded_file(quote, test_application, quote.name)
                         new_record["报价单"] = file_path
 
                     if test_data_report:
-                        file_path = FileManager.save_uploaded_file(test_data_report, test_application, test_data_report.name)
+                        file_path, _ = FileManager.submit_uploaded_file(test_data_report, test_application,
+                                                                        test_data_report.name)
                         new_record["测试数据/报告"] = file_path
 
                     if settlement_bill:
-                        file_path = FileManager.save_uploaded_file(settlement_bill, test_application, settlement_bill.name)
+                        file_path, _ = FileManager.submit_uploaded_file(settlement_bill, test_application,
+                                                                        settlement_bill.name)
                         new_record["结算单"] = file_path
 
-                    # 更新记录中的文件路径并保存到Excel
-                    data[-1] = new_record
-                    DataManager.save_data(data)
-
-                    utils.show_success_message("数据保存成功！")
-                    st.rerun()
+                    # 按行插入新记录（含文件路径），唯一索引兜底并发提交的重复编号
+                    try:
+                        DataManager.insert_record(new_record)
+                    except Exception as e:
+                        # 记录未写入时撤销已登记的附件，避免挂到同编号的已有申请单下；后台仍在保存的内容会随之丢弃
+                        for col in ["报价单", "测试数据/报告", "结算单"]:
+                            if new_record[col]:
+                                FileManager.delete_attachment(test_application, os.path.basename(new_record[col]))
+                        if not isinstance(e, DuplicateApplicationError):
+                            raise
+                        st.error(f"测试申请单编号 '{test_application}' 已存在，请使用不同的编号")
+                    else:
+                        has_attachments = any(new_record[col] for col in ["报价单", "测试数据/报告", "结算单"])
+                        utils.show_success_message("数据保存成功！" + ("附件正在后台保存。" if has_attachments else ""))
+                        st.rerun()
 
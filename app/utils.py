@@ -1,29 +1,53 @@
 # app/utils.py
 import streamlit as st
-import pandas as pd
+from config.constants import REQUIRED_FIELDS
 
 def validate_required_fields(fields):
     """验证必填字段"""
-    required_fields = {
-        "项目编号": fields["项目编号"],
-        "测试申请单编号": fields["测试申请单编号"],
-        "测试申请单飞书审批编号": fields["测试申请单飞书审批编号"],
-        "申请人": fields["申请人"],
-        "申请部门": fields["申请部门"],
-        "申请日期": fields["申请日期"],
-        "测试项目概述": fields["测试项目概述"],
-        "型号": fields["型号"],
-        "容量": fields["容量"],
-        "数量": fields["数量"],
-        "辅材/工装": fields["辅材/工装"],
-        "送样日期": fields["送样日期"],
-        "预计时长/天": fields["预计时长/天"],
-    }
+    required_fields = {field_name: fields[field_name] for field_name in REQUIRED_FIELDS}
 
     missing_fields = [field_name for field_name, field_value in required_fields.items()
                       if not field_value or (isinstance(field_value, (int, float)) and field_value == 0)]
     return missing_fields
 
+def format_file_size(size):
+    """将字节数格式化为易读的文件大小"""
+    for unit in ["B", "KB", "MB"]:
+        if size < 1024:
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GB"
+
+def show_metrics_panel(run, totals):
+    """在侧边栏显示本次页面运行的各阶段耗时、内存和进程内累计指标"""
+    with st.sidebar.expander("性能面板"):
+        if run is None:
+            st.caption("暂无本次运行的记录")
+            return
+        memory = f"，内存 {run['memory_mb']:.0f} MB" if run["memory_mb"] is not None else ""
+        st.caption(f"{run['page']}：本次运行 {run['total_ms']:.0f} ms{memory}")
+        if run["stages"]:
+            import pandas as pd
+
+            stages = pd.DataFrame(run["stages"]).sort_values(["offset_ms", "depth"])
+            stages["阶段"] = ["　" * depth + name for depth, name in zip(stages["depth"], stages["stage"])]
+            st.dataframe(stages[["阶段", "ms"]].rename(columns={"ms": "耗时(ms)"}).round(1),
+                         use_container_width=True, hide_index=True)
+        if totals["counters"]:
+            st.caption("累计计数")
+            st.json(totals["counters"], expanded=False)
+
+def show_attachment_preview(preview, container=st):
+    """显示附件的缩略图或文字摘录，preview为FileManager.read_preview的返回值"""
+    if preview is None:
+        container.caption("暂无预览")
+        return
+    kind, content = preview
+    if kind == "image":
+        container.image(content)
+    else:
+        container.text(content)
+
 def show_success_message(message):
     """显示成功消息"""
     st.success(message)
@@ -33,9 +57,3 @@ def show_error_message(message):
     """显示错误消息"""
     st.error(message)
     st.snow()
-
-@st.cache_data
-def load_data_cached():
-    """缓存版本的数据加载函数"""
-    from app.core.data_manager import DataManager
-    return DataManager.load_data()
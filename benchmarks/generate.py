@@ -0,0 +1,95 @@
+"""按EXCEL_FORMAT生成可复现的合成测试数据和附件目录，用于性能基准测试"""
+import os
+from datetime import date
+from typing import Any, Dict, Iterator, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from config.constants import EXCEL_FORMAT, DEPARTMENTS, TEST_PROGRESS
+
+SUPPLIERS = [f"供应商{chr(ord('A') + i)}" for i in range(20)]
+APPLICANTS = ["张伟", "王芳", "李娜", "刘洋", "陈静", "杨磊", "赵敏", "黄强", "周杰", "吴霞"]
+SUMMARY_WORDS = ["高温", "低温", "循环", "老化", "跌落", "振动", "盐雾", "湿热", "倍率", "安规", "寿命", "存储"]
+SUMMARY_KINDS = ["测试", "验证", "摸底", "认证", "对比测试"]
+MODELS = [f"{prefix}-{number}" for prefix in ["BT", "PK", "CL", "MX"] for number in range(100, 130)]
+ATTACHMENT_EXTENSIONS = [".pdf", ".xlsx", ".docx", ".png"]
+
+
+def generate_frame(rows: int, seed: int = 0) -> pd.DataFrame:
+    """生成rows行合成数据，列与EXCEL_FORMAT一致；日期为'YYYY-MM-DD'文本，与表单写入的格式相同"""
+    rng = np.random.default_rng(seed)
+    start = np.datetime64(date(2022, 1, 1), "D")
+    apply_offsets = rng.integers(0, 3 * 365, rows)
+    sample_delay = rng.integers(1, 20, rows)
+    start_delay = sample_delay + rng.integers(0, 10, rows)
+    durations = rng.integers(1, 60, rows)
+
+    def dates(offsets: np.ndarray) -> np.ndarray:
+        return (start + offsets.astype("timedelta64[D]")).astype(str)
+
+    summaries = [f"{a}{b}{c}" for a, b, c in zip(rng.choice(SUMMARY_WORDS, rows), rng.choice(SUMMARY_WORDS, rows),
+                                                rng.choice(SUMMARY_KINDS, rows))]
+    frame = pd.DataFrame({
+        "项目编号": [f"PRJ-{number:04d}" for number in rng.integers(1, max(rows // 20, 2), rows)],
+        "测试申请单编号": [f"TA{seed:02d}{index:07d}" for index in range(rows)],
+        "测试申请单飞书审批编号": rng.integers(10 ** 8, 10 ** 9, rows),
+        "申请人": rng.choice(APPLICANTS, rows),
+        "申请部门": rng.choice(DEPARTMENTS, rows),
+        "申请日期": dates(apply_offsets),
+        "测试项目概述": summaries,
+        "型号": rng.choice(MODELS, rows),
+        "容量": np.round(rng.uniform(0.5, 300, rows), 2),
+        "数量": rng.integers(1, 50, rows),
+        "辅材/工装": rng.choice(["无", "夹具", "工装板", "线束"], rows),
+        "送样日期": dates(apply_offsets + sample_delay),
+        "测试开始日期": dates(apply_offsets + start_delay),
+        "预计时长/天": durations,
+        "预计结束日期": dates(apply_offsets + start_delay + durations),
+        "测试进度": rng.choice(TEST_PROGRESS, rows, p=[0.15, 0.35, 0.45, 0.05]),
+        "成本中心": [f"CC{number:03d}" for number in rng.integers(1, 40, rows)],
+        "采购申请单飞书审批编号": rng.integers(10 ** 8, 10 ** 9, rows),
+        "报价单": None,
+        "预计费用": np.round(rng.lognormal(8, 1, rows), 2),
+        "供应商": rng.choice(SUPPLIERS, rows),
+        "出厂日期": dates(apply_offsets + start_delay + durations + 3),
+        "出门单": None,
+        "测试数据/报告": None,
+        "结算单": None,
+    })
+    return frame[EXCEL_FORMAT]
+
+
+def generate_records(rows: int, seed: int = 0) -> List[Dict[str, Any]]:
+    """生成rows条合成记录"""
+    frame = generate_frame(rows, seed)
+    return frame.astype(object).where(frame.notna(), None).to_dict("records")
+
+
+def generate_attachments(applications: List[str], files_per_application: int, seed: int = 0,
+                         duplicate_ratio: float = 0.3, max_size: int = 64 * 1024) -> Iterator[Tuple[str, str, bytes]]:
+    """为每个测试申请单生成附件 (编号, 文件名, 内容)；约duplicate_ratio比例的附件内容与其他附件相同"""
+    rng = np.random.default_rng(seed)
+    shared: List[bytes] = []
+    for application in applications:
+        for index in range(files_per_application):
+            extension = ATTACHMENT_EXTENSIONS[index % len(ATTACHMENT_EXTENSIONS)]
+            if shared and rng.random() < duplicate_ratio:
+                content = shared[int(rng.integers(0, len(shared)))]
+            else:
+                content = rng.bytes(int(rng.integers(1024, max_size)))
+                if len(shared) < 64:
+                    shared.append(content)
+            yield application, f"附件{index}{extension}", content
+
+
+def write_attachment_tree(root: str, attachments: Iterator[Tuple[str, str, bytes]]) -> int:
+    """按旧版目录结构（root/编号/文件名）把附件写到磁盘，返回写入的文件数"""
+    count = 0
+    for application, name, content in attachments:
+        folder = os.path.join(root, application)
+        os.makedirs(folder, exist_ok=True)
+        with open(os.path.join(folder, name), "wb") as f:
+            f.write(content)
+        count += 1
+    return count
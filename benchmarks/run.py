@@ -0,0 +1,272 @@
+"""性能基准测试
+
+用法（在项目根目录下运行）：
+    python -m benchmarks.run                                   # 1k/10k/100k 三档
+    python -m benchmarks.run --sizes 1000 10000 --repeat 3
+    python -m benchmarks.run --output benchmarks/baseline.json # 保存为基线
+    python -m benchmarks.run --compare benchmarks/baseline.json
+
+每档数据在独立的子进程和临时数据目录（TESTSYSTEM_DATA_DIR）中运行，不会读写 data/ 下的真实数据。
+结果为JSON：{"meta": {...}, "results": {"<行数>": {"<测试项>": {"min", "median", "mean", "repeat", "number"}}}}，
+单位为秒；number大于1的测试项记录的是执行number次的总耗时。
+比较模式下中位数变慢超过阈值的测试项记为回归，此时进程返回1。
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+import pandas as pd
+
+from benchmarks.generate import generate_records, generate_attachments, write_attachment_tree
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_SIZES = [1000, 10000, 100000]
+DEFAULT_OUTPUT = os.path.join("benchmarks", "results", "latest.json")
+SEARCH_QUERIES = ["高温", "供应商:供应商A", "PRJ-00*", "张伟 老化测试"]
+
+
+def measure(fn: Callable[[], Any], setup: Optional[Callable[[], Any]] = None, repeat: int = 5,
+            number: int = 1) -> Dict[str, float]:
+    """重复执行fn并统计耗时，setup在每次计时前执行且不计入耗时"""
+    times = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        times.append(time.perf_counter() - start)
+    return {"min": min(times), "median": statistics.median(times), "mean": statistics.fmean(times),
+            "repeat": repeat, "number": number}
+
+
+def filter_and_aggregate(df: pd.DataFrame, date_column: str, count_column: Optional[str]) -> Dict[str, pd.Series]:
+    """与结果汇总页面相同的筛选和聚合：按部门/进度/申请日期筛选，再按进度、部门和日期汇总"""
+    departments = df["申请部门"].dropna().unique().tolist()[:2]
+    progress = df["测试进度"].dropna().unique().tolist()
+    dates = pd.to_datetime(df[date_column], errors="coerce")
+    start, end = dates.min(), dates.max() - (dates.max() - dates.min()) / 4
+    df = df[df["申请部门"].isin(departments) & df["测试进度"].isin(progress) & (dates >= start) & (dates <= end)]
+    counts = df.groupby("测试进度", observed=True)[count_column].sum() if count_column \
+        else df["测试进度"].value_counts()
+    return {
+        "progress": counts,
+        "cost_trend": df.groupby(dates[df.index].dt.date)["预计费用"].sum(),
+        "departments": df.groupby("申请部门", observed=True).size(),
+    }
+
+
+def run_size(rows: int, repeat: int, seed: int = 0) -> Dict[str, Dict[str, float]]:
+    """在当前进程的数据目录中生成rows行数据并执行全部测试项"""
+    # 导入应用模块前，TESTSYSTEM_DATA_DIR已由父进程设置为临时目录
+    from app.core.data_manager import DataManager
+    from app.core.file_manager import FileManager
+    from app.core.storage import KEY_COLUMN
+    from config.settings import ATTACHMENTS_DIR
+
+    results: Dict[str, Dict[str, float]] = {}
+
+    def bench(name: str, fn: Callable[[], Any], setup: Optional[Callable[[], Any]] = None,
+              times: int = repeat, number: int = 1):
+        results[name] = measure(fn, setup, times, number)
+        print(f"  {rows:>7} {name:<36} {results[name]['median'] * 1000:10.2f} ms", flush=True)
+
+    DataManager.init_database()
+    records = generate_records(rows, seed)
+    keys = [record[KEY_COLUMN] for record in records]
+
+    # 数据读写
+    bench("save_data", lambda: DataManager.save_data(records), times=min(repeat, 3))
+    bench("load_data_cold", DataManager.load_data, setup=DataManager._cache.invalidate)
+    bench("load_data", DataManager.load_data)
+    projection = ["申请部门", "测试进度", "申请日期", "预计费用"]
+    bench("load_frame_projected_cold", lambda: DataManager.load_frame(columns=projection),
+          setup=DataManager._cache.invalidate)
+    lookups = keys[::max(len(keys) // 500, 1)][:500] + [f"MISSING{i}" for i in range(500)]
+    bench("check_duplicate_application_x1000",
+          lambda: [DataManager.check_duplicate_application(key) for key in lookups])
+
+    # 检索与分页
+    bench("search_index_build", lambda: DataManager.search(SEARCH_QUERIES[0]),
+          setup=DataManager._search_index.invalidate)
+    bench("search", lambda: [DataManager.search(query) for query in SEARCH_QUERIES])
+    bench("load_page", lambda: DataManager.load_page(1, 100))
+    bench("load_page_filtered_sorted",
+          lambda: DataManager.load_page(5, 100, {"申请部门": ["部门1", "部门2"]}, "预计费用", False))
+    bench("schedule_overdue_due_soon", lambda: (DataManager.overdue(limit=100), DataManager.due_within(7, limit=100)))
+
+    # 结果汇总页面的数据准备、筛选和聚合
+    bench("dashboard_rollup_cold", DataManager.load_rollup, setup=DataManager._rollup_cache.invalidate)
+    frame = DataManager.load_frame()
+    rollup = DataManager.load_rollup()
+    bench("dashboard_filter_aggregate_frame", lambda: filter_and_aggregate(frame, "申请日期", None))
+    bench("dashboard_filter_aggregate_rollup", lambda: filter_and_aggregate(rollup, "申请日期", "项目数"))
+    pivot = dict(dimensions=["申请部门"], measures=["预计费用"], aggregation="sum", time_bucket="month",
+                 pivot_columns=["申请日期"])
+    bench("query_pivot_cold", lambda: DataManager.query(**pivot), setup=DataManager._query_cache.invalidate)
+    bench("query_pivot_cached", lambda: DataManager.query(**pivot))
+    try:
+        from streamlit.testing.v1 import AppTest
+    except ImportError:
+        AppTest = None
+    if AppTest is not None:
+        for page in ["dashboard", "manage"]:
+            path = os.path.join(PROJECT_ROOT, "app", "pages", f"{page}.py")
+            bench(f"page_{page}", lambda: AppTest.from_file(path, default_timeout=600).run(), times=min(repeat, 3))
+
+    # 写入：经写队列的单条插入，以及多线程并发插入时的合并提交
+    counter = iter(range(10 ** 9))
+
+    def insert_batch(threads: int):
+        batch = [dict(records[0], **{KEY_COLUMN: f"NEW{next(counter)}"}) for _ in range(100)]
+        if threads == 1:
+            for record in batch:
+                DataManager.insert_record(record)
+            return
+        workers = [threading.Thread(target=lambda part: [DataManager.insert_record(r) for r in part],
+                                    args=(batch[i::threads],)) for i in range(threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+    bench("insert_record_x100", lambda: insert_batch(1), times=min(repeat, 3))
+    bench("insert_record_concurrent_x100", lambda: insert_batch(16), times=min(repeat, 3))
+
+    # 修改历史：单条记录的变更列表，以及从最近的快照重放增量重建当前数据
+    bench("history_record_x50", lambda: [DataManager.record_history(key) for key in keys[:50]])
+    bench("history_load_as_of", lambda: DataManager.load_as_of(datetime.now()), times=min(repeat, 3))
+    export_path = os.path.join(tempfile.gettempdir(), f"benchmark-export-{os.getpid()}.csv")
+    bench("export_csv", lambda: DataManager.export(export_path, "csv"), times=min(repeat, 3))
+    os.remove(export_path)
+
+    # 附件：按内容去重保存、批量查询、读取、扫描旧版目录和删除
+    applications = keys[:max(min(rows // 10, 500), 1)]
+    attachments = list(generate_attachments(applications, 3, seed))
+    bench("file_save_uploaded", lambda: [FileManager.save_uploaded_file(io.BytesIO(content), application, name)
+                                         for application, name, content in attachments], times=1)
+    bench("file_list_attachments_bulk", lambda: FileManager.list_attachments_bulk(applications))
+    bench("file_applications_with_attachments", FileManager.get_applications_with_attachments)
+    bench("file_read_all", lambda: [FileManager.download_attachment(application, name)
+                                    for application, name, _ in attachments])
+    write_attachment_tree(ATTACHMENTS_DIR, generate_attachments([f"LEGACY{i}" for i in range(len(applications))],
+                                                                2, seed + 1))
+    bench("file_rebuild_manifest", FileManager.rebuild_manifest, times=min(repeat, 3))
+    bench("file_delete", lambda: [FileManager.delete_attachment(application, name)
+                                  for application, name, _ in attachments], times=1)
+    return results
+
+
+def run(sizes: List[int], repeat: int) -> Dict[str, Any]:
+    """每档数据在独立的子进程和临时数据目录中运行，汇总结果"""
+    results = {}
+    for rows in sizes:
+        with tempfile.TemporaryDirectory(prefix="testsystem-bench-") as data_dir:
+            part = os.path.join(data_dir, "result.json")
+            env = dict(os.environ, TESTSYSTEM_DATA_DIR=data_dir, TESTSYSTEM_STORAGE_BACKEND="sqlite")
+            subprocess.run([sys.executable, "-m", "benchmarks.run", "--worker", str(rows), "--repeat", str(repeat),
+                            "--output", part], cwd=PROJECT_ROOT, env=env, check=True)
+            with open(part, encoding="utf-8") as f:
+                results[str(rows)] = json.load(f)
+    return {"meta": metadata(repeat), "results": results}
+
+
+def metadata(repeat: int) -> Dict[str, Any]:
+    """运行环境信息，便于判断两次结果是否可比"""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_ROOT, capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "platform": platform.platform(),
+        "repeat": repeat,
+    }
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float,
+            min_time: float) -> List[Dict[str, Any]]:
+    """按中位数与基线比较；变慢超过threshold且绝对差值超过min_time秒的记为回归"""
+    rows = []
+    for size, benches in current["results"].items():
+        for name, stats in benches.items():
+            base = baseline.get("results", {}).get(size, {}).get(name)
+            row = {"size": size, "name": name, "current": stats["median"], "baseline": None, "ratio": None,
+                   "status": "new"}
+            if base is not None:
+                ratio = stats["median"] / base["median"] if base["median"] else float("inf")
+                delta = stats["median"] - base["median"]
+                status = "ok"
+                if ratio > 1 + threshold and delta > min_time:
+                    status = "regression"
+                elif ratio < 1 / (1 + threshold) and -delta > min_time:
+                    status = "improved"
+                row.update(baseline=base["median"], ratio=ratio, status=status)
+            rows.append(row)
+    return rows
+
+
+def print_comparison(rows: List[Dict[str, Any]]):
+    print(f"{'行数':>8} {'测试项':<36} {'基线(ms)':>10} {'当前(ms)':>10} {'倍数':>7}  状态")
+    for row in rows:
+        baseline = f"{row['baseline'] * 1000:10.2f}" if row["baseline"] is not None else f"{'-':>10}"
+        ratio = f"{row['ratio']:7.2f}" if row["ratio"] is not None else f"{'-':>7}"
+        print(f"{row['size']:>8} {row['name']:<36} {baseline} {row['current'] * 1000:10.2f} {ratio}  {row['status']}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="测试管理系统性能基准测试")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="数据行数，可指定多档")
+    parser.add_argument("--repeat", type=int, default=5, help="每个测试项的重复次数")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="结果JSON文件路径")
+    parser.add_argument("--compare", metavar="BASELINE", help="与基线结果比较，出现回归时返回1")
+    parser.add_argument("--current", metavar="RESULTS", help="与--compare一起使用：比较已有的结果文件，不重新运行")
+    parser.add_argument("--threshold", type=float, default=0.2, help="判定回归的变慢比例，默认0.2即20%%")
+    parser.add_argument("--min-time", type=float, default=0.002, help="忽略小于该秒数的绝对差异")
+    parser.add_argument("--worker", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker is not None:
+        results = run_size(args.worker, args.repeat)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f)
+        return 0
+
+    if args.current:
+        with open(args.current, encoding="utf-8") as f:
+            report = json.load(f)
+    else:
+        report = run(args.sizes, args.repeat)
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"结果已写入 {args.output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        rows = compare(report, baseline, args.threshold, args.min_time)
+        print_comparison(rows)
+        regressions = [row for row in rows if row["status"] == "regression"]
+        if regressions:
+            print(f"发现 {len(regressions)} 项性能回归")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
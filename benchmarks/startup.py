@@ -0,0 +1,116 @@
+"""冷启动耗时测试
+
+用法（在项目根目录下运行）：
+    python -m benchmarks.startup                                        # 默认重复5次
+    python -m benchmarks.startup --output benchmarks/startup-baseline.json
+    python -m benchmarks.startup --compare benchmarks/startup-baseline.json
+
+每次测量都在新的子进程和临时数据目录中进行：先通过main.py渲染主页（应用启动后的第一次运行），
+再依次切换到其他页面，记录每个页面在该进程中第一次渲染的耗时，以及后台启动初始化（建目录、初始化数据库）的耗时。
+结果格式与 benchmarks.run 相同，测试项归在 "startup" 下，可以用同样的方式与基线比较。
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_OUTPUT = os.path.join("benchmarks", "results", "startup.json")
+MAIN_SCRIPT = os.path.join(PROJECT_ROOT, "main.py")
+
+
+def measure_once() -> Dict[str, float]:
+    """在当前进程中从主页开始依次首次渲染各页面，返回各项耗时（秒）"""
+    # AppTest本身的导入不计入应用的启动耗时
+    from streamlit.testing.v1 import AppTest
+
+    from config.settings import PAGES
+
+    timings = {}
+    start = time.perf_counter()
+    app = AppTest.from_file(MAIN_SCRIPT, default_timeout=600)
+    app.run()
+    timings["first_render_home"] = time.perf_counter() - start
+    try:
+        from app.core import startup
+    except ImportError:
+        # 没有启动钩子的旧版本没有后台初始化，便于与之前的版本对比
+        startup = None
+    if startup is not None:
+        # 用户从主页进入其他页面之前，后台初始化通常已经完成；其耗时单独记为startup_init
+        startup.wait()
+        timings["startup_init"] = startup.report()["init_seconds"]
+    for path in list(PAGES)[1:]:
+        name = os.path.splitext(os.path.basename(path))[0]
+        start = time.perf_counter()
+        app.switch_page(path).run()
+        timings[f"first_render_{name}"] = time.perf_counter() - start
+    timings["total"] = sum(seconds for name, seconds in timings.items() if name.startswith("first_render_"))
+    return timings
+
+
+def run(repeat: int) -> Dict[str, Any]:
+    """每次测量使用新的子进程，汇总各项耗时的统计值"""
+    # benchmarks.run会导入pandas，只在父进程中使用，测量子进程保持冷启动状态
+    from benchmarks.run import metadata
+
+    samples: Dict[str, List[float]] = {}
+    for _ in range(repeat):
+        with tempfile.TemporaryDirectory(prefix="testsystem-startup-") as data_dir:
+            part = os.path.join(data_dir, "result.json")
+            env = dict(os.environ, TESTSYSTEM_DATA_DIR=data_dir)
+            subprocess.run([sys.executable, "-m", "benchmarks.startup", "--worker", "--output", part],
+                           cwd=PROJECT_ROOT, env=env, check=True)
+            with open(part, encoding="utf-8") as f:
+                for name, seconds in json.load(f).items():
+                    samples.setdefault(name, []).append(seconds)
+    results = {name: {"min": min(times), "median": statistics.median(times), "mean": statistics.fmean(times),
+                      "repeat": len(times), "number": 1}
+               for name, times in samples.items()}
+    for name, stats in results.items():
+        print(f"  {name:<36} {stats['median'] * 1000:10.2f} ms")
+    return {"meta": metadata(repeat), "results": {"startup": results}}
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="测试管理系统冷启动耗时测试")
+    parser.add_argument("--repeat", type=int, default=5, help="测量次数，每次使用新的进程")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="结果JSON文件路径")
+    parser.add_argument("--compare", metavar="BASELINE", help="与基线结果比较，出现回归时返回1")
+    parser.add_argument("--threshold", type=float, default=0.2, help="判定回归的变慢比例，默认0.2即20%%")
+    parser.add_argument("--min-time", type=float, default=0.05, help="忽略小于该秒数的绝对差异")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(measure_once(), f)
+        return 0
+
+    report = run(args.repeat)
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"结果已写入 {args.output}")
+
+    if args.compare:
+        from benchmarks.run import compare, print_comparison
+
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        rows = compare(report, baseline, args.threshold, args.min_time)
+        print_comparison(rows)
+        regressions = [row for row in rows if row["status"] == "regression"]
+        if regressions:
+            print(f"发现 {len(regressions)} 项性能回归")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
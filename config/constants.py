@@ -8,6 +8,36 @@ TEST_PROGRESS = ["待启动", "进行中", "已完成", "取消"]
 # 文件上传配置
 ALLOWED_EXTENSIONS = ['.pdf', '.doc', '.docx', '.xls', '.xlsx', '.jpg', '.jpeg', '.png']
 MAX_FILE_SIZE = 10 * 1024 * 1024  # 10MB
+ATTACHMENT_CHUNK_SIZE = 1024 * 1024  # 附件分块读写大小 1MB
+ATTACHMENT_PAGE_SIZE = 10  # 附件列表每页显示的记录数
+PREVIEW_THUMBNAIL_SIZE = (320, 320)  # 附件缩略图的最大宽高
+PREVIEW_TEXT_LENGTH = 1000  # 附件文字预览的最大字数
+
+# 管理后台分页配置
+MANAGE_PAGE_SIZES = [50, 100, 200]
+
+# 结果汇总页明细表分页配置
+DETAIL_PAGE_SIZES = [50, 100, 200]
+# 结果汇总页透视分析最多显示的行数
+PIVOT_DISPLAY_ROWS = 500
+
+# 未结束的测试进度，进度提醒只关注这些申请单
+ACTIVE_STATUSES = ["待启动", "进行中"]
+
+# 进度提醒：默认提醒的天数、每个列表最多显示的行数和显示的列
+SCHEDULE_DUE_SOON_DAYS = 7
+SCHEDULE_PANEL_LIMIT = 100
+SCHEDULE_COLUMNS = ["测试申请单编号", "项目编号", "申请人", "申请部门", "测试项目概述", "测试进度"]
+
+# 修改历史的显示列，以及按日期查看历史数据时最多显示的行数
+HISTORY_COLUMNS = ["时间", "操作", "字段", "原值", "新值"]
+HISTORY_AS_OF_LIMIT = 500
+
+# 可以归档的测试进度
+ARCHIVE_STATUSES = ["已完成", "取消"]
+
+# 导出时每次从存储读取的行数
+EXPORT_CHUNK_SIZE = 5000
 
 # Excel列配置
 EXCEL_FORMAT = [
@@ -16,3 +46,40 @@ EXCEL_FORMAT = [
     "预计时长/天", "预计结束日期", "测试进度", "成本中心", "采购申请单飞书审批编号",
     "报价单", "预计费用", "供应商", "出厂日期", "出门单", "测试数据/报告", "结算单"
 ]
+
+# 必填字段配置（数值为0视为未填写）
+REQUIRED_FIELDS = [
+    "项目编号", "测试申请单编号", "测试申请单飞书审批编号", "申请人", "申请部门", "申请日期",
+    "测试项目概述", "型号", "容量", "数量", "辅材/工装", "送样日期", "预计时长/天"
+]
+
+# 以附件形式上传的列，批量导入时不接受这些列的值
+ATTACHMENT_COLUMNS = ["报价单", "测试数据/报告", "结算单"]
+
+# 批量导入时每次解析和校验的行数
+IMPORT_CHUNK_SIZE = 1000
+
+# 日期列配置
+DATE_COLUMNS = ["申请日期", "送样日期", "测试开始日期", "预计结束日期", "出厂日期"]
+
+# 列类型配置（与EXCEL_FORMAT一一对应）
+# text: 文本；category: 枚举（取值见CATEGORY_VALUES，另含数据中出现的其他值）；
+# date: 日期；int: 可空整数；float: 可空小数
+COLUMN_TYPES = {
+    "项目编号": "text", "测试申请单编号": "text", "测试申请单飞书审批编号": "int", "申请人": "text",
+    "申请部门": "category", "申请日期": "date", "测试项目概述": "text", "型号": "text", "容量": "float",
+    "数量": "int", "辅材/工装": "text", "送样日期": "date", "测试开始日期": "date", "预计时长/天": "int",
+    "预计结束日期": "date", "测试进度": "category", "成本中心": "text", "采购申请单飞书审批编号": "int",
+    "报价单": "text", "预计费用": "float", "供应商": "category", "出厂日期": "date", "出门单": "text",
+    "测试数据/报告": "text", "结算单": "text"
+}
+CATEGORY_VALUES = {
+    "申请部门": DEPARTMENTS,
+    "测试进度": TEST_PROGRESS,
+}
+
+# 全文检索字段配置
+SEARCH_FIELDS = [
+    "项目编号", "测试申请单编号", "测试申请单飞书审批编号", "申请人", "申请部门", "测试项目概述",
+    "型号", "辅材/工装", "测试进度", "成本中心", "采购申请单飞书审批编号", "供应商"
+]
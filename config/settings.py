@@ -4,14 +4,50 @@ import os
 # 项目根目录
 PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
-# 数据目录
-DATA_DIR = os.path.join(PROJECT_ROOT, "data")
-os.makedirs(DATA_DIR, exist_ok=True)
+# 数据目录，可通过环境变量指向其他位置（如基准测试使用的临时目录）
+# 目录由应用启动钩子（app/core/startup.py）创建，导入配置时没有副作用
+DATA_DIR = os.environ.get("TESTSYSTEM_DATA_DIR", os.path.join(PROJECT_ROOT, "data"))
 
 # 数据库配置
 DATABASE_FILE = os.path.join(DATA_DIR, "database.xlsx")
+SQLITE_DATABASE_FILE = os.path.join(DATA_DIR, "database.db")
+# 存储引擎: "sqlite"（默认，按行读写）或 "excel"（旧格式，整表重写）
+STORAGE_BACKEND = os.environ.get("TESTSYSTEM_STORAGE_BACKEND", "sqlite")
+# 记录缓存最多保留的数据版本数
+RECORD_CACHE_MAX_VERSIONS = 2
+# 结果汇总页筛选结果的缓存条数（按数据版本和筛选条件），最久未使用的先淘汰
+FILTER_CACHE_SIZE = int(os.environ.get("TESTSYSTEM_FILTER_CACHE_SIZE", "8"))
+# 聚合查询（透视、分组统计）结果的缓存条数，结果通常很小，可以多保留一些
+QUERY_CACHE_SIZE = int(os.environ.get("TESTSYSTEM_QUERY_CACHE_SIZE", "64"))
+# 冷数据分区目录；已完成或取消、结束超过该天数的记录在应用启动时移入冷分区，0表示不归档
+ARCHIVE_DIR = os.path.join(DATA_DIR, "archive")
+ARCHIVE_AFTER_DAYS = int(os.environ.get("TESTSYSTEM_ARCHIVE_AFTER_DAYS", "365"))
+# 修改历史：上次快照后变更的记录达到该条数时在后台保存一份新快照，按时间点重建时约撤销这么多条变更
+HISTORY_SNAPSHOT_EVERY = int(os.environ.get("TESTSYSTEM_HISTORY_SNAPSHOT_EVERY", "10000"))
+# 写队列：在该时间窗口（秒）内到达的写请求合并为一次提交，每批最多的请求数
+WRITE_BATCH_WINDOW = 0.02
+WRITE_BATCH_MAX = 200
 ATTACHMENTS_DIR = os.path.join(DATA_DIR, "attachments")
-os.makedirs(ATTACHMENTS_DIR, exist_ok=True)
+ATTACHMENT_MANIFEST_FILE = os.path.join(DATA_DIR, "attachments.db")
+# 按内容寻址的附件存储目录，相同内容只保存一份
+ATTACHMENT_BLOBS_DIR = os.path.join(ATTACHMENTS_DIR, ".blobs")
+# 附件预览（缩略图或文字摘录），按内容的校验和存放
+ATTACHMENT_PREVIEWS_DIR = os.path.join(ATTACHMENTS_DIR, ".previews")
+# 后台保存附件、计算校验和、生成预览的线程数，以及最多排队的附件数（超过时提交方等待）
+ATTACHMENT_WORKERS = int(os.environ.get("TESTSYSTEM_ATTACHMENT_WORKERS", "2"))
+ATTACHMENT_QUEUE_MAX = 16
+# 登记后超过该秒数仍未保存完成的附件视为处理被中断（进程退出），启动时标记为保存失败
+ATTACHMENT_PENDING_TIMEOUT = int(os.environ.get("TESTSYSTEM_ATTACHMENT_PENDING_TIMEOUT", "600"))
+
+# 结果汇总页每个图表最多绘制的点数，超过时按X轴汇总或降采样
+CHART_POINT_BUDGET = int(os.environ.get("TESTSYSTEM_CHART_POINT_BUDGET", "2000"))
+
+# 性能指标：TESTSYSTEM_METRICS=1 时记录各阶段耗时，并在侧边栏显示性能面板；未启用时几乎没有开销
+METRICS_ENABLED = os.environ.get("TESTSYSTEM_METRICS", "0") == "1"
+# 指标导出格式，逗号分隔，可选 prometheus（文本格式，每次页面运行后覆盖写）和 jsonl（每次页面运行追加一行）
+METRICS_EXPORT = [fmt.strip() for fmt in os.environ.get("TESTSYSTEM_METRICS_EXPORT", "").split(",") if fmt.strip()]
+METRICS_PROMETHEUS_FILE = os.path.join(DATA_DIR, "metrics.prom")
+METRICS_JSONL_FILE = os.path.join(DATA_DIR, "metrics.jsonl")
 
 # 应用配置
 APP_CONFIG = {
@@ -24,6 +60,7 @@ APP_CONFIG = {
 PAGES = {
     "app/pages/home.py": "主页",
     "app/pages/new_test.py": "新测试",
+    "app/pages/bulk_import.py": "批量导入",
     "app/pages/manage.py": "管理后台",
     "app/pages/dashboard.py": "结果汇总"
 }
@@ -8,8 +8,12 @@ project_root = os.path.dirname(os.path.abspath(__file__))
 sys.path.insert(0, project_root)
 
 from config.settings import APP_CONFIG, PAGES
+from app.core import metrics, startup
+from app import utils
 
 st.set_page_config(**APP_CONFIG)
+# 每个进程只执行一次的初始化在后台进行，主页不需要等待
+startup.start()
 
 pages = []
 for file_path, title in PAGES.items():
@@ -20,6 +24,13 @@ for file_path, title in PAGES.items():
 
 if pages:
     pg = st.navigation(pages=pages)
-    pg.run()
+    # 记录本次页面运行各阶段的耗时，未启用性能指标时不做任何事
+    metrics.begin_run(pg.title)
+    try:
+        pg.run()
+    finally:
+        metrics.end_run()
+    if metrics.enabled():
+        utils.show_metrics_panel(metrics.last_run(), metrics.snapshot())
 else:
     st.error("没有找到有效的页面文件")
@@ -0,0 +1,20 @@
+import pytest
+
+from app.core.storage import SQLiteStorage
+from config.constants import EXCEL_FORMAT
+
+
+def make_record(key, **fields):
+    """构造一条完整的记录，未指定的列为空"""
+    record = {col: None for col in EXCEL_FORMAT}
+    record.update({"测试申请单编号": key, "申请人": "张三", "测试进度": "进行中", "申请日期": "2024-01-01"})
+    record.update(fields)
+    return record
+
+
+@pytest.fixture
+def storage(tmp_path):
+    """临时目录中已初始化的SQLite存储"""
+    engine = SQLiteStorage(str(tmp_path / "database.db"))
+    engine.init_storage()
+    return engine
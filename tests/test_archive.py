@@ -0,0 +1,64 @@
+import pytest
+
+from app.core.archive import ArchiveStore, UNDATED_PARTITION
+from app.core.storage import DuplicateApplicationError, KEY_COLUMN
+from config.constants import ARCHIVE_STATUSES, EXCEL_FORMAT
+from tests.conftest import make_record
+
+
+@pytest.fixture
+def archive(tmp_path):
+    return ArchiveStore(str(tmp_path / "archive"), EXCEL_FORMAT)
+
+
+def _fill(storage):
+    storage.apply_changes([
+        make_record("A-1", 测试进度="已完成", 申请日期="2022-03-01", 预计结束日期="2022-04-01"),
+        make_record("A-2", 测试进度="取消", 申请日期="2023-05-01"),
+        make_record("A-3", 测试进度="进行中", 申请日期="2022-03-01", 预计结束日期="2022-04-01"),
+        make_record("A-4", 测试进度="已完成", 申请日期="2024-06-01", 预计结束日期="2024-12-01"),
+        make_record("A-5", 测试进度="已完成", 申请日期=None, 预计结束日期="2021-01-01"),
+    ], {}, [])
+
+
+def test_archive_records_moves_expired_rows(storage, archive):
+    _fill(storage)
+    moved = storage.archive_records("2024-01-01", ARCHIVE_STATUSES, archive.append)
+
+    assert moved == 3
+    assert list(storage.load_frame()[KEY_COLUMN]) == ["A-3", "A-4"]
+    assert archive.partitions() == ["2022", "2023", UNDATED_PARTITION]
+    assert sorted(archive.load_many()[KEY_COLUMN]) == ["A-1", "A-2", "A-5"]
+    assert list(storage.record_history("A-1")["op"])[-1] == "archive"
+    # 已归档的编号仍参与查重
+    assert storage.has_key("A-2")
+    assert storage.existing_keys(["A-1", "A-4", "B-1"]) == {"A-1", "A-4"}
+    with pytest.raises(DuplicateApplicationError):
+        storage.insert_record(make_record("A-1"))
+    with pytest.raises(DuplicateApplicationError):
+        storage.update_record("A-3", {KEY_COLUMN: "A-2"})
+
+
+def test_archive_records_keeps_rows_when_writing_fails(storage):
+    _fill(storage)
+
+    def fail(records):
+        raise OSError("磁盘已满")
+
+    with pytest.raises(OSError):
+        storage.archive_records("2024-01-01", ARCHIVE_STATUSES, fail)
+    assert len(storage.load_frame()) == 5
+    assert not storage.has_key("B-1")
+    storage.insert_record(make_record("B-1"))
+
+
+def test_archive_store_append_replaces_earlier_copy(storage, archive):
+    _fill(storage)
+    frame = storage.load_frame()
+    archive.append(frame.iloc[:2])
+    archive.append(frame.iloc[:1].assign(申请人="李四"))
+
+    loaded = archive.load("2022")
+    assert list(loaded[KEY_COLUMN]) == ["A-1"]
+    assert loaded.loc[0, "申请人"] == "李四"
+    assert archive.load("1999").empty
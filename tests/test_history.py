@@ -0,0 +1,108 @@
+import time
+from datetime import datetime
+
+import pytest
+
+from app.core.history import HISTORY_TABLE
+from app.core.storage import DuplicateApplicationError, Replacement, KEY_COLUMN, KEY_INDEX
+from tests.conftest import make_record
+
+
+def _now():
+    # 与日志时间同样格式的当前时间，前后留出间隔使变更时间与之可区分
+    time.sleep(0.01)
+    ts = datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f')[:23]
+    time.sleep(0.01)
+    return ts
+
+
+def _log_size(storage):
+    with storage.connect() as conn:
+        return conn.execute(f"SELECT COUNT(*) FROM {HISTORY_TABLE}").fetchone()[0]
+
+
+def _rows(frame):
+    return frame.astype(str).values.tolist()
+
+
+def test_state_as_of_across_snapshots(storage):
+    states = []
+    storage.apply_changes([make_record(f"A-{i}") for i in range(5)], {}, [])
+    states.append((_now(), storage.load_frame()))
+    storage.apply_changes([], {"A-1": {"申请人": "李四", "预计费用": 12.5}}, ["A-2"])
+    assert storage.snapshot_history(1) == 4
+    states.append((_now(), storage.load_frame()))
+    storage.apply_changes([make_record("A-9")], {"A-1": {"测试申请单编号": "B-1"}}, [])
+    states.append((_now(), storage.load_frame()))
+    storage.apply_changes([], {"A-3": {"测试进度": "已完成"}}, [])
+    storage.snapshot_history(1)
+
+    for ts, frame in states:
+        assert _rows(storage.frame_as_of(ts)) == _rows(frame)
+
+
+def test_state_as_of_keeps_records_without_unique_key(storage):
+    # 编号为空或重复的记录也按rowid记录历史，重建时不会丢失或合并
+    storage.apply_changes([make_record(None, 申请人="甲"), make_record("A-1"), make_record(None, 申请人="乙")], {}, [])
+    with storage.connect() as conn:
+        # 迁移的旧数据中有重复编号时，编号索引为普通索引
+        conn.execute(f"DROP INDEX {KEY_INDEX}")
+        conn.execute(f"CREATE INDEX {KEY_INDEX} ON records ({KEY_COLUMN})")
+    storage.insert_record(make_record("A-1", 申请人="丙"))
+    before = _now()
+    expected = storage.load_frame()
+    storage.replace_all([make_record("A-2")])
+
+    assert len(storage.frame_as_of(before)) == 4
+    assert _rows(storage.frame_as_of(before)) == _rows(expected)
+    history = storage.record_history("A-1")
+    assert history[history["field"] == "申请人"]["value"].tolist() == ["张三", "丙"]
+    assert (history["op"] == "delete").sum() == 2
+
+
+def test_replace_all_logs_only_changed_rows(storage):
+    records = [make_record(f"A-{i}") for i in range(100)]
+    storage.replace_all(records)
+    assert _log_size(storage) == 100
+
+    records[5] = make_record("A-5", 申请人="李四")
+    storage.replace_all(records)
+    assert _log_size(storage) == 101
+
+    storage.replace_all(records[:-1] + [make_record("B-1")])
+    assert _log_size(storage) == 103
+    assert list(storage.record_history("A-5")[["field", "old", "value"]].iloc[-1]) == ["申请人", "张三", "李四"]
+    assert list(storage.load_frame()[KEY_COLUMN])[-2:] == ["A-98", "B-1"]
+
+
+def test_failed_replacement_is_rolled_back(storage):
+    storage.replace_all([make_record("A-1")])
+    results = storage.apply_batch([Replacement([make_record("B-1"), make_record("B-1")]),
+                                   Replacement([make_record("C-1")])])
+
+    assert isinstance(results[0], DuplicateApplicationError)
+    assert results[1] == 1
+    assert list(storage.load_frame()[KEY_COLUMN]) == ["C-1"]
+
+
+def test_record_history_of_renamed_record(storage):
+    storage.insert_record(make_record("A-1"))
+    storage.update_record("A-1", {"申请人": "李四"})
+    storage.update_record("A-1", {KEY_COLUMN: "B-1"})
+    storage.update_record("B-1", {"申请人": "王五"})
+
+    old = storage.record_history("A-1")
+    assert list(old["op"].drop_duplicates()) == ["insert", "update", "delete"]
+    assert old[old["op"] == "update"][["old", "value"]].values.tolist() == [["张三", "李四"]]
+    new = storage.record_history("B-1")
+    assert new[new["op"] == "insert"].set_index("field")["value"]["申请人"] == "李四"
+    assert new[new["op"] == "update"][["old", "value"]].values.tolist() == [["李四", "王五"]]
+
+
+@pytest.mark.parametrize("snapshot_every", [0, 1])
+def test_no_op_update_is_not_logged(storage, snapshot_every):
+    storage.insert_record(make_record("A-1"))
+    if snapshot_every:
+        storage.snapshot_history(snapshot_every)
+    storage.update_record("A-1", {"申请人": "张三"})
+    assert _log_size(storage) == 1
@@ -0,0 +1,117 @@
+import os
+import sqlite3
+
+import pandas as pd
+import pytest
+
+from app.core.storage import (SQLiteStorage, ExcelStorage, DuplicateApplicationError, Replacement, KEY_COLUMN,
+                              KEY_INDEX, RECORDS_TABLE, key_value)
+from tests.conftest import make_record
+
+
+def _key_index_unique(storage):
+    with storage.connect() as conn:
+        indexes = {row[1]: row[2] for row in conn.execute(f"PRAGMA index_list({RECORDS_TABLE})")}
+    return indexes[KEY_INDEX]
+
+
+def test_migrate_from_excel(tmp_path):
+    excel_path = str(tmp_path / "database.xlsx")
+    pd.DataFrame([make_record("A-1"), make_record("A-2", 测试进度="待启动")]).to_excel(excel_path, index=False)
+    storage = SQLiteStorage(str(tmp_path / "database.db"))
+    storage.migrate_from_excel(excel_path)
+
+    assert list(storage.load_frame()[KEY_COLUMN]) == ["A-1", "A-2"]
+    assert _key_index_unique(storage)
+    assert int(storage.load_rollup()["项目数"].sum()) == 2
+    assert storage.version()[1] == 1
+
+
+def test_migrate_from_excel_with_duplicate_keys(tmp_path):
+    # 旧的编辑器允许重复编号：迁移成功，编号索引退化为普通索引
+    excel_path = str(tmp_path / "database.xlsx")
+    records = [make_record("A-1"), make_record("A-1", 申请人="李四"), make_record("A-2")]
+    pd.DataFrame(records).to_excel(excel_path, index=False)
+    storage = SQLiteStorage(str(tmp_path / "database.db"))
+    storage.migrate_from_excel(excel_path)
+
+    assert list(storage.load_frame()[KEY_COLUMN]) == ["A-1", "A-1", "A-2"]
+    assert not _key_index_unique(storage)
+    assert not os.path.exists(storage.path + ".migrating")
+    storage.init_storage()
+    assert storage.has_key("A-1")
+
+
+def test_migrate_from_excel_failure_removes_temp_file(tmp_path, monkeypatch):
+    excel_path = str(tmp_path / "database.xlsx")
+    pd.DataFrame([make_record("A-1")]).to_excel(excel_path, index=False)
+    storage = SQLiteStorage(str(tmp_path / "database.db"))
+
+    def fail(self, conn):
+        raise sqlite3.OperationalError("disk I/O error")
+
+    monkeypatch.setattr(SQLiteStorage, "create_schema", fail)
+    with pytest.raises(sqlite3.OperationalError):
+        storage.migrate_from_excel(excel_path)
+    assert not os.path.exists(storage.path + ".migrating")
+    assert not storage.exists()
+
+
+def test_apply_batch_isolates_failed_changesets(storage):
+    storage.apply_changes([make_record("A-1")], {}, [])
+    results = storage.apply_batch([
+        ([make_record("A-2")], {}, []),
+        ([make_record("A-1")], {}, []),  # 编号重复
+        ([make_record("A-3"), make_record("A-4", 申请人={"无法写入": 1})], {}, []),  # 值无法转换
+        ([], {"A-1": {"申请人": "李四"}}, []),
+    ])
+
+    assert results[0] == 1
+    assert isinstance(results[1], DuplicateApplicationError)
+    assert isinstance(results[2], sqlite3.Error) and not isinstance(results[2], DuplicateApplicationError)
+    assert results[3] == 1
+    frame = storage.load_frame()
+    assert list(frame[KEY_COLUMN]) == ["A-1", "A-2"]
+    assert frame.loc[0, "申请人"] == "李四"
+
+
+def test_apply_batch_replacement(storage):
+    storage.apply_changes([make_record("A-1"), make_record("A-2")], {}, [])
+    results = storage.apply_batch([Replacement([make_record("B-1")]), ([make_record("B-2")], {}, [])])
+
+    assert results == [1, 1]
+    assert list(storage.load_frame()[KEY_COLUMN]) == ["B-1", "B-2"]
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("A-1", "A-1"), (123, "123"), (123.0, "123"), (12.5, "12.5"), ("", None), ("  ", None), (None, None),
+    (float("nan"), None),
+])
+def test_key_value(value, expected):
+    assert key_value(value) == expected
+
+
+def test_duplicate_detection(storage):
+    storage.apply_changes([make_record("A-1"), make_record(123)], {}, [])
+
+    assert storage.has_key("A-1") and storage.has_key("123") and storage.has_key(123.0)
+    assert not storage.has_key("A-2")
+    assert storage.existing_keys(["A-1", 123.0, "A-2", None]) == {"A-1", "123"}
+    with pytest.raises(DuplicateApplicationError):
+        storage.insert_record(make_record(123.0))
+    # 编号为空的记录不参与唯一约束
+    storage.apply_changes([make_record(None), make_record("")], {}, [])
+    assert len(storage.load_frame()) == 4
+
+
+def test_excel_storage_matches_numeric_keys(tmp_path):
+    # xlsx中含空值的数字列读出为浮点数，按编号修改和删除时仍能匹配
+    storage = ExcelStorage(str(tmp_path / "database.xlsx"))
+    storage.replace_all([make_record(101), make_record(102), make_record(None)])
+
+    assert storage.get_record("101")["申请人"] == "张三"
+    assert storage.apply_changes([], {"101": {"申请人": "李四"}}, ["102"]) == 2
+    frame = storage.load_frame()
+    assert len(frame) == 2
+    assert frame.loc[0, "申请人"] == "李四"
+    assert storage.has_key(101) and not storage.has_key(102)
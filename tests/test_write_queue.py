@@ -0,0 +1,103 @@
+import threading
+
+import pytest
+
+from app.core.data_manager import DataManager
+from app.core.storage import SQLiteStorage, DuplicateApplicationError, KEY_COLUMN
+from app.core.write_queue import WriteQueue
+from tests.conftest import make_record
+
+
+@pytest.fixture
+def data_manager(storage, monkeypatch):
+    """让DataManager使用临时存储，并使用新的写队列和空缓存"""
+    monkeypatch.setattr(DataManager, "_storage", storage)
+    monkeypatch.setattr(DataManager, "_write_queue", None)
+    for cache in (DataManager._cache, DataManager._rollup_cache, DataManager._filter_cache,
+                  DataManager._query_cache):
+        cache.invalidate()
+    DataManager._search_index.invalidate()
+    return DataManager
+
+
+def test_requests_in_window_are_committed_together():
+    batches = []
+    release = threading.Event()
+
+    def apply_batch(changesets):
+        release.wait(5)
+        batches.append(list(changesets))
+        return [len(inserted) for inserted, _, _ in changesets]
+
+    queue = WriteQueue(apply_batch, window=0.2, max_batch=10)
+    futures = [queue.submit(([{"n": i}] * i, {}, [])) for i in range(1, 4)]
+    release.set()
+
+    assert [future.result(5) for future in futures] == [1, 2, 3]
+    assert sum(len(batch) for batch in batches) == 3
+    assert len(batches) <= 2
+
+
+def test_failed_batch_fails_every_request():
+    def apply_batch(changesets):
+        raise RuntimeError("磁盘已满")
+
+    queue = WriteQueue(apply_batch, window=0.05, max_batch=10)
+    futures = [queue.submit(([], {}, [])) for _ in range(2)]
+    for future in futures:
+        with pytest.raises(RuntimeError):
+            future.result(5)
+
+
+def test_failed_changeset_does_not_affect_others(data_manager):
+    data_manager.insert_record(make_record("A-1"))
+    queue = data_manager.get_write_queue()
+    futures = [
+        queue.submit(([make_record("A-2")], {}, [])),
+        queue.submit(([make_record("A-1")], {}, [])),
+        queue.submit(([], {"A-1": {"申请人": "李四"}}, [])),
+    ]
+
+    assert futures[0].result(5) == 1
+    with pytest.raises(DuplicateApplicationError):
+        futures[1].result(5)
+    assert futures[2].result(5) == 1
+    assert sorted(data_manager.load_frame()[KEY_COLUMN]) == ["A-1", "A-2"]
+
+
+def test_save_data_goes_through_write_queue(data_manager, monkeypatch):
+    data_manager.insert_record(make_record("A-1"))
+    assert len(data_manager.search("A-1")) == 1
+    writer_threads = []
+    replace = SQLiteStorage._replace
+
+    def record_thread(self, conn, records):
+        writer_threads.append(threading.current_thread().name)
+        return replace(self, conn, records)
+
+    monkeypatch.setattr(SQLiteStorage, "_replace", record_thread)
+    data_manager.save_data([make_record("B-1"), make_record("B-2")])
+
+    assert writer_threads == ["data-writer"]
+    assert list(data_manager.load_frame()[KEY_COLUMN]) == ["B-1", "B-2"]
+    assert data_manager.search("A-1").empty
+    assert list(data_manager.search("B-2")[KEY_COLUMN]) == ["B-2"]
+
+
+def test_search_index_includes_writes_from_other_processes(data_manager, storage, monkeypatch):
+    data_manager.insert_record(make_record("A-1"))
+    assert len(data_manager.search("A-1")) == 1
+    other_process = SQLiteStorage(storage.path)
+    apply_batch = SQLiteStorage.apply_batch
+
+    def commit_elsewhere_first(self, changesets):
+        # 模拟另一个进程在本批读取版本之后、提交之前写入
+        monkeypatch.setattr(SQLiteStorage, "apply_batch", apply_batch)
+        other_process.insert_record(make_record("C-1", 供应商="外部写入"))
+        return apply_batch(self, changesets)
+
+    monkeypatch.setattr(SQLiteStorage, "apply_batch", commit_elsewhere_first)
+    data_manager.insert_record(make_record("A-2"))
+
+    assert list(data_manager.search("外部写入")[KEY_COLUMN]) == ["C-1"]
+    assert sorted(data_manager.search("A-")[KEY_COLUMN]) == ["A-1", "A-2"]